@@ -0,0 +1,34 @@
+"""Indexes for transaction queries
+
+Revision ID: 5e0c6f2b9a41
+Revises: 8ddf70116347
+Create Date: 2026-10-18 14:03:27.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c6f2b9a41'
+down_revision = '8ddf70116347'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "ix_transaction_datetime_type_uniqueid",
+        "transaction",
+        ["datetime", "type", "uniqueid"],
+    )
+    op.create_index(
+        "ix_transaction_fiaccount_id_security_id_datetime",
+        "transaction",
+        ["fiaccount_id", "security_id", "datetime"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transaction_fiaccount_id_security_id_datetime", "transaction")
+    op.drop_index("ix_transaction_datetime_type_uniqueid", "transaction")
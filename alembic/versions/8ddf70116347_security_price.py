@@ -0,0 +1,50 @@
+"""Security price
+
+Revision ID: 8ddf70116347
+Revises: 14ebf3e155ab
+Create Date: 2026-10-18 09:12:41.302215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '8ddf70116347'
+down_revision = '14ebf3e155ab'
+branch_labels = None
+depends_on = None
+
+
+#  currency_type was already created by b8823b40217c
+CURRENCY_ENUM_TYPE = postgresql.ENUM(name="currency_type", create_type=False)
+
+
+def upgrade():
+    op.create_table(
+        "securityprice",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "security_id", sa.Integer(), nullable=False, comment="FK security.id"
+        ),
+        sa.Column("date", sa.Date(), nullable=False),
+        sa.Column(
+            "price", sa.Numeric(), nullable=False, comment="Unit price of security"
+        ),
+        sa.Column(
+            "currency",
+            CURRENCY_ENUM_TYPE,
+            nullable=False,
+            comment="Currency denomination of price",
+        ),
+        sa.CheckConstraint("price >= 0", name="price_not_negative"),
+        sa.ForeignKeyConstraint(["security_id"], ["security.id"], onupdate="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("security_id", "date"),
+        comment="Market Prices for Securities",
+    )
+
+
+def downgrade():
+    op.drop_table("securityprice")
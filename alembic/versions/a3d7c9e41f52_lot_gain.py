@@ -0,0 +1,136 @@
+"""Persisted Lots and Gains
+
+Revision ID: a3d7c9e41f52
+Revises: 5e0c6f2b9a41
+Create Date: 2026-10-18 16:40:12.884107
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3d7c9e41f52'
+down_revision = '5e0c6f2b9a41'
+branch_labels = None
+depends_on = None
+
+
+#  currency_type was already created by b8823b40217c
+CURRENCY_ENUM_TYPE = postgresql.ENUM(name="currency_type", create_type=False)
+
+
+def upgrade():
+    op.add_column(
+        "transaction",
+        sa.Column(
+            "booked",
+            sa.Boolean(),
+            server_default=sa.false(),
+            nullable=False,
+            comment="Applied to persisted inventory (lot & gain tables)",
+        ),
+    )
+    op.create_index(
+        "ix_transaction_booked_datetime_type_uniqueid",
+        "transaction",
+        ["booked", "datetime", "type", "uniqueid"],
+    )
+
+    op.create_table(
+        "lot",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "fiaccount_id",
+            sa.Integer(),
+            nullable=False,
+            comment="Pocket FI account - FK fiaccount.id",
+        ),
+        sa.Column(
+            "security_id",
+            sa.Integer(),
+            nullable=False,
+            comment="Pocket security - FK security.id",
+        ),
+        sa.Column(
+            "opentransaction_id",
+            sa.Integer(),
+            nullable=False,
+            comment="Transaction beginning holding period - FK transaction.id",
+        ),
+        sa.Column(
+            "createtransaction_id",
+            sa.Integer(),
+            nullable=False,
+            comment="Transaction booking Lot into its pocket - FK transaction.id",
+        ),
+        sa.Column(
+            "units",
+            sa.Numeric(),
+            nullable=False,
+            comment="Amount of security comprising the Lot",
+        ),
+        sa.Column("price", sa.Numeric(), nullable=False, comment="Per-unit cost basis"),
+        sa.Column(
+            "currency",
+            CURRENCY_ENUM_TYPE,
+            nullable=False,
+            comment="Currency denomination of price",
+        ),
+        sa.CheckConstraint("units <> 0", name="units_nonzero"),
+        sa.CheckConstraint("price >= 0", name="price_not_negative"),
+        sa.ForeignKeyConstraint(
+            ["fiaccount_id"], ["fiaccount.id"], onupdate="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["security_id"], ["security.id"], onupdate="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["opentransaction_id"], ["transaction.id"], onupdate="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["createtransaction_id"], ["transaction.id"], onupdate="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        comment="Inventory Lots",
+    )
+    op.create_index(
+        "ix_lot_fiaccount_id_security_id", "lot", ["fiaccount_id", "security_id"]
+    )
+
+    op.create_table(
+        "gain",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "lot_id", sa.Integer(), nullable=False, comment="Lot realized - FK lot.id"
+        ),
+        sa.Column(
+            "transaction_id",
+            sa.Integer(),
+            nullable=False,
+            comment="Transaction realizing gain - FK transaction.id",
+        ),
+        sa.Column(
+            "price",
+            sa.Numeric(),
+            nullable=False,
+            comment="Per-unit cash amount of realizing Transaction",
+        ),
+        sa.ForeignKeyConstraint(["lot_id"], ["lot.id"], onupdate="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["transaction_id"], ["transaction.id"], onupdate="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        comment="Realized Gains",
+    )
+    op.create_index("ix_gain_lot_id", "gain", ["lot_id"])
+    op.create_index("ix_gain_transaction_id", "gain", ["transaction_id"])
+
+
+def downgrade():
+    op.drop_index("ix_gain_transaction_id", "gain")
+    op.drop_index("ix_gain_lot_id", "gain")
+    op.drop_table("gain")
+    op.drop_index("ix_lot_fiaccount_id_security_id", "lot")
+    op.drop_table("lot")
+    op.drop_index("ix_transaction_booked_datetime_type_uniqueid", "transaction")
+    op.drop_column("transaction", "booked")
@@ -0,0 +1,64 @@
+"""Imported data files
+
+Revision ID: d41b7e2c9f08
+Revises: a3d7c9e41f52
+Create Date: 2026-10-18 18:05:37.412960
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7e2c9f08'
+down_revision = 'a3d7c9e41f52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_file",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "sha256",
+            sa.String(),
+            nullable=False,
+            comment="SHA-256 hex digest of contents",
+        ),
+        sa.Column("size", sa.BigInteger(), nullable=False, comment="File size in bytes"),
+        sa.Column(
+            "format",
+            sa.String(),
+            nullable=False,
+            comment="Import format (file extension e.g. ofx, xml)",
+        ),
+        sa.Column(
+            "brokerid",
+            sa.String(),
+            nullable=True,
+            comment="OFX <INVACCTFROM><BROKERID> of imported transactions' FIs",
+        ),
+        sa.Column(
+            "path", sa.String(), nullable=True, comment="Filesystem path as last imported"
+        ),
+        sa.Column(
+            "transactions",
+            sa.Integer(),
+            nullable=False,
+            comment="# of transactions read from file",
+        ),
+        sa.Column(
+            "dtimported",
+            sa.DateTime(),
+            nullable=False,
+            comment="Date/time of last import",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("sha256", name="uq_import_file_sha256"),
+        comment="Imported Data Files",
+    )
+
+
+def downgrade():
+    op.drop_table("import_file")
@@ -0,0 +1,40 @@
+"""Row modification stamps
+
+Revision ID: f2a8c61d0b37
+Revises: d41b7e2c9f08
+Create Date: 2026-10-18 21:12:48.305116
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a8c61d0b37'
+down_revision = 'd41b7e2c9f08'
+branch_labels = None
+depends_on = None
+
+
+#  Tables of models.Tracked subclasses
+TABLES = ("fi", "fiaccount", "security", "securityid", "transaction", "currencyrate")
+
+
+def upgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(
+                sa.Column(
+                    "modified",
+                    sa.DateTime(),
+                    server_default=sa.func.now(),
+                    nullable=False,
+                    comment="Date/time row was last inserted or updated",
+                )
+            )
+
+
+def downgrade():
+    for table in reversed(TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("modified")
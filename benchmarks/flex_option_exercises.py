@@ -0,0 +1,130 @@
+# coding: utf-8
+"""Benchmark pairing Flex OptionEAE rows with their Trades in flex.parser.
+
+Builds a synthetic statement of Trades, some of which are the option & underlying
+legs of exercises/assignments (marked as such in their notes), with a matching pair
+of OptionEAE rows for each exercise.  Times flex.parser.parse_optionEAE(), which
+holds the marked Trades in an OptionEAEWindow keyed by tradeID and pairs each leg
+with its Trade as it arrives; unmarked Trades pass straight through.
+
+Pass --naive to also time the previous approach (a scan of the Trades plus
+list.pop() for every OptionEAE row) for comparison.  It's quadratic, so expect it to
+take minutes at the default sizes.
+
+Usage:
+    python benchmarks/flex_option_exercises.py [--trades 50000] [--exercises 10000]
+"""
+# stdlib imports
+import argparse
+import datetime
+import time
+from decimal import Decimal
+
+
+# 3rd party imports
+import ibflex
+
+
+# local imports
+from capgains.flex import Types, parser
+
+
+DTTRADE = datetime.datetime(2011, 8, 5, 16, 20)
+ASSIGNMENT = (ibflex.enums.Code.ASSIGNMENT,)
+
+
+def make_trade(tradeid, conid, units, notes=()):
+    return Types.Trade(
+        fitid=str(tradeid),
+        dttrade=DTTRADE,
+        memo=f"SEC{conid}",
+        uniqueidtype="CONID",
+        uniqueid=str(conid),
+        units=units,
+        currency="USD",
+        total=Decimal("-1000"),
+        reportdate=DTTRADE.date(),
+        orig_tradeid=None,
+        notes=notes,
+    )
+
+
+def make_optionEAE(trade, transactionType):
+    return ibflex.Types.OptionEAE(
+        transactionType=transactionType,
+        tradeID=trade.fitid,
+        date=trade.dttrade.date(),
+        description=trade.memo,
+        conid=trade.uniqueid,
+        quantity=trade.units,
+    )
+
+
+def make_statement(num_trades, num_exercises):
+    """Return Trades & OptionEAEs, with exercise legs spread among other Trades.
+    """
+    assert 2 * num_exercises <= num_trades
+    trades = [
+        make_trade(n, n, Decimal("100")) for n in range(num_trades - 2 * num_exercises)
+    ]
+    optionEAEs = []
+    stride = len(trades) // num_exercises + 2
+    for n in range(num_exercises):
+        option = make_trade(f"O{n}", f"O{n}", Decimal("10"), ASSIGNMENT)
+        underlying = make_trade(f"U{n}", f"U{n}", Decimal("-1000"), ASSIGNMENT)
+        trades[n * stride:n * stride] = [option, underlying]
+        optionEAEs.extend(
+            [
+                make_optionEAE(option, ibflex.enums.OptionAction.ASSIGN),
+                make_optionEAE(underlying, ibflex.enums.OptionAction.SELL),
+            ]
+        )
+    return trades, optionEAEs
+
+
+def naive_parse_optionEAE(report, trades):
+    """Previous pairing: scan Trades for each leg, then list.pop() the hit.
+    """
+    exercises = 0
+    for optionEAE in report:
+        hits = [
+            index for index, tx in enumerate(trades) if tx.fitid == optionEAE.tradeID
+        ]
+        assert len(hits) == 1
+        trades.pop(hits.pop())
+        exercises += optionEAE.transactionType is ibflex.enums.OptionAction.SELL
+    return exercises
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--trades", type=int, default=50000)
+    argparser.add_argument("--exercises", type=int, default=10000)
+    argparser.add_argument("--repeat", type=int, default=3)
+    argparser.add_argument(
+        "--naive", action="store_true", help="Also time the previous algorithm"
+    )
+    args = argparser.parse_args()
+
+    trades, optionEAEs = make_statement(args.trades, args.exercises)
+    print(f"{len(trades)} trades, {len(optionEAEs)} OptionEAE rows")
+
+    timings = []
+    for _ in range(args.repeat):
+        trades_ = list(trades)
+        start = time.perf_counter()
+        exercises = parser.parse_optionEAE(optionEAEs, trades_)
+        timings.append(time.perf_counter() - start)
+    assert len(exercises) == args.exercises
+    assert len(trades_) == len(trades) - 2 * args.exercises
+    print(f"  windowed: {min(timings) * 1000:.1f} ms")
+
+    if args.naive:
+        trades_ = list(trades)
+        start = time.perf_counter()
+        assert naive_parse_optionEAE(optionEAEs, trades_) == args.exercises
+        print(f"  naive: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
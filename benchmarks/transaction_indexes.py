@@ -0,0 +1,199 @@
+# coding: utf-8
+"""Benchmark the hot Transaction/CurrencyRate queries with & without their indexes.
+
+Populates a scratch database with synthetic transactions and currency rates, then
+for each query prints its plan and best-of-N timing - first with the indexes
+added by migration 5e0c6f2b9a41 dropped, then again after creating them.
+
+Merge signature and get_rate() lookups are included for comparison; they're served
+by the unique constraints on transaction.uniqueid and currencyrate
+(date, fromcurrency, tocurrency) both before and after.
+
+Usage:
+    python benchmarks/transaction_indexes.py [--rows 1000000] [--db sqlite:///bench.db]
+
+The default database is a temporary SQLite file.  A PostgreSQL URI may be given
+instead; its tables are dropped & recreated, so don't point it at real data.
+"""
+# stdlib imports
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+
+# 3rd party imports
+import sqlalchemy
+from sqlalchemy import text
+
+
+# local imports
+from capgains import models
+from capgains.database import Base
+
+
+INDEXES = list(models.Transaction.__table__.indexes)
+
+NUM_ACCOUNTS = 10
+NUM_SECURITIES = 2000
+DTSTART = datetime.datetime(2000, 1, 1)
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CAD"]
+
+QUERIES = {
+    "between (1 month)": (
+        'SELECT * FROM "transaction" '
+        "WHERE datetime >= :dtstart AND datetime < :dtend "
+        "ORDER BY datetime, type, uniqueid"
+    ),
+    "pocket history": (
+        'SELECT * FROM "transaction" '
+        "WHERE fiaccount_id = :fiaccount_id AND security_id = :security_id "
+        "AND datetime < :dtend ORDER BY datetime"
+    ),
+    "merge signature": (
+        'SELECT * FROM "transaction" '
+        "WHERE fiaccount_id = :fiaccount_id AND uniqueid = :uniqueid"
+    ),
+    "get_rate": (
+        "SELECT rate FROM currencyrate "
+        "WHERE fromcurrency = :fromcurrency AND tocurrency = :tocurrency "
+        "AND date = :date"
+    ),
+}
+
+
+def populate(engine, rows):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for index in INDEXES:
+            index.drop(bind=conn)
+
+        fi_id = conn.execute(
+            models.Fi.__table__.insert().values(brokerid="bench")
+        ).inserted_primary_key[0]
+        conn.execute(
+            models.FiAccount.__table__.insert(),
+            [{"fi_id": fi_id, "number": str(n)} for n in range(NUM_ACCOUNTS)],
+        )
+        conn.execute(
+            models.Security.__table__.insert(),
+            [{"ticker": f"SEC{n}"} for n in range(NUM_SECURITIES)],
+        )
+
+        rng = random.Random(0)
+        chunk = []
+        for n in range(rows):
+            chunk.append(
+                {
+                    "type": models.TransactionType.TRADE,
+                    "uniqueid": str(n),
+                    "datetime": DTSTART + datetime.timedelta(minutes=10 * n),
+                    "fiaccount_id": rng.randint(1, NUM_ACCOUNTS),
+                    "security_id": rng.randint(1, NUM_SECURITIES),
+                    "units": Decimal(rng.choice([100, -100, 50])),
+                    "currency": models.Currency.USD,
+                    "cash": Decimal("-1000"),
+                }
+            )
+            if len(chunk) == 50000:
+                conn.execute(models.Transaction.__table__.insert(), chunk)
+                chunk = []
+        if chunk:
+            conn.execute(models.Transaction.__table__.insert(), chunk)
+
+        conn.execute(
+            models.CurrencyRate.__table__.insert(),
+            [
+                {
+                    "date": DTSTART.date() + datetime.timedelta(days=day),
+                    "fromcurrency": getattr(models.Currency, fromcurrency),
+                    "tocurrency": models.Currency.USD,
+                    "rate": Decimal("1.1"),
+                }
+                for day in range(rows // 144 + 1)
+                for fromcurrency in CURRENCIES[1:]
+            ],
+        )
+
+
+def make_params(rows, rng):
+    dtend = DTSTART + datetime.timedelta(minutes=10 * rows)
+    dtstart = DTSTART + (dtend - DTSTART) / 2
+    return {
+        "between (1 month)": {
+            "dtstart": dtstart,
+            "dtend": dtstart + datetime.timedelta(days=30),
+        },
+        "pocket history": {
+            "fiaccount_id": rng.randint(1, NUM_ACCOUNTS),
+            "security_id": rng.randint(1, NUM_SECURITIES),
+            "dtend": dtend,
+        },
+        "merge signature": {
+            "fiaccount_id": rng.randint(1, NUM_ACCOUNTS),
+            "uniqueid": str(rng.randrange(rows)),
+        },
+        "get_rate": {
+            "fromcurrency": rng.choice(CURRENCIES[1:]),
+            "tocurrency": "USD",
+            "date": dtstart.date(),
+        },
+    }
+
+
+def run_queries(engine, rows, repeat):
+    explain = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    params = make_params(rows, random.Random(1))
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = conn.execute(text(explain + sql), params[name]).fetchall()
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(text(sql), params[name]).fetchall()
+                timings.append(time.perf_counter() - start)
+            print(f"  {name}: {min(timings) * 1000:.2f} ms")
+            for line in plan:
+                print(f"      {line[-1]}")
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rows", type=int, default=1000000)
+    argparser.add_argument("--db", help="Database URI (default: temp SQLite file)")
+    argparser.add_argument("--repeat", type=int, default=5)
+    args = argparser.parse_args()
+
+    tmpdir = None
+    db_uri = args.db
+    if db_uri is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        db_uri = "sqlite:///" + os.path.join(tmpdir.name, "bench.db")
+    engine = sqlalchemy.create_engine(db_uri)
+
+    start = time.perf_counter()
+    populate(engine, args.rows)
+    print(f"Populated {args.rows} transactions in {time.perf_counter() - start:.1f} s")
+
+    print("Without indexes:")
+    run_queries(engine, args.rows, args.repeat)
+
+    with engine.begin() as conn:
+        for index in INDEXES:
+            index.create(bind=conn)
+        conn.execute(text("ANALYZE"))
+
+    print("With indexes:")
+    run_queries(engine, args.rows, args.repeat)
+
+    engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import itertools
+
 from . import etfc
 from . import local
 
@@ -5,16 +7,34 @@ from . import local
 ReaderClasses = [local.CsvTransactionReader, etfc.CsvTransactionReader]
 
 
-def read(session, filename):
-    transactions = None
+def sniff(firstrow: str):
+    """Choose the reader class for a CSV file from its first row.
+
+    Returns:
+        Member of ReaderClasses, or None if the format isn't recognized.
+    """
     for ReaderClass in ReaderClasses:
-        if transactions is None:
-            try:
-                with open(filename) as csvfile:
-                    reader = ReaderClass(session, csvfile)
-                    transactions = reader.read()
-            except:
-                continue
-    if transactions is None:
-        raise ValueError("Can't read CSV file {}".format(filename))
-    return transactions
+        if ReaderClass.sniff(firstrow):
+            return ReaderClass
+    return None
+
+
+def read(session, filename):
+    with open(filename) as csvfile:
+        firstrow = csvfile.readline()
+        ReaderClass = sniff(firstrow)
+        if ReaderClass is None:
+            raise ValueError(
+                "Can't read CSV file {}: unrecognized first row {!r}".format(
+                    filename, firstrow
+                )
+            )
+        #  Hand the reader the row we've already consumed, then the rest.
+        return ReaderClass.read_csv(session, itertools.chain([firstrow], csvfile))
+
+
+def parse(filename):
+    """CSV readers resolve securities against the DB row by row, so there's
+    nothing to do out of process; pass the filename through to ``read()``.
+    """
+    return filename
@@ -53,6 +53,16 @@ class CsvTransactionReader(csv.DictReader, ofx.reader.OfxStatementReader):
         self.securities = {}
         self.transactions = []
 
+    @staticmethod
+    def sniff(firstrow: str) -> bool:
+        """Is this the first row of an E*Trade CSV file (giving the account#)?
+        """
+        return firstrow.split(",")[0] == "For Account:"
+
+    @classmethod
+    def read_csv(cls, session, csvfile) -> List[models.Transaction]:
+        return cls(csvfile).read(session)
+
     @staticmethod
     def read_default_currency(statement: ofx.reader.Statement) -> str:
         return "USD"
@@ -3,7 +3,7 @@ CSV readers/writers for internal use by capgains,
 not to import data from external sources.
 
 This module provides the ability to dump/load Transactions, Lots, and Gains
-to & from CSV files.
+to & from CSV files, and to load security prices from CSV files.
 """
 # stdlib imports
 import csv
@@ -25,6 +25,9 @@ from typing import (
     Optional,
 )
 
+# 3rd party imports
+from sqlalchemy.orm import joinedload
+
 
 # local imports
 from capgains import models, inventory, CONFIG
@@ -47,15 +50,29 @@ class CsvTransactionReader(csv.DictReader):
         self.session = session
         super(CsvTransactionReader, self).__init__(csvfile)
 
+    @staticmethod
+    def sniff(firstrow: str) -> bool:
+        """Is this the header row of a CsvTransactionWriter dump?
+        """
+        return next(csv.reader([firstrow]), None) == CsvTransactionWriter.csvFields
+
+    @classmethod
+    def read_csv(cls, session, csvfile) -> Sequence[models.Transaction]:
+        return cls(session, csvfile).read()
+
     def read(self):
-        return [self.read_row(row) for row in self]
+        return models.Transaction.merge_all(
+            self.session, [self.convert_row(row) for row in self]
+        )
 
     def read_row(self, row: Mapping[str, Optional[str]]) -> models.Transaction:
+        return models.Transaction.merge(self.session, **self.convert_row(row))
+
+    def convert_row(self, row: Mapping[str, Optional[str]]) -> Mapping[str, Any]:
         row = {k: v or None for k, v in row.items()}
-        attrs = {
+        return {
             attr: converter(row, attr) for attr, converter in self.converters.items()
         }
-        return models.Transaction.merge(self.session, **attrs)
 
     def convertString(self, row: CsvDictRowRead, attr: str) -> Optional[str]:
         return row[attr.lower()] or None
@@ -125,6 +142,99 @@ class CsvTransactionReader(csv.DictReader):
     }
 
 
+class CsvPriceReader(csv.DictReader):
+    """Bulk loader for CSV files of security prices.
+
+    Columns are given by `csvFields`; `date` is ISO format.  Securities are resolved
+    and existing prices looked up with one query apiece for the whole file, rather
+    than per row.  A price already in the DB for the same (security, date) is
+    overwritten with the value from the file.
+    """
+
+    csvFields = [
+        "date",
+        "uniqueidtype",
+        "uniqueid",
+        "ticker",
+        "secname",
+        "price",
+        "currency",
+    ]
+
+    def __init__(self, session, csvfile):
+        self.session = session
+        super(CsvPriceReader, self).__init__(csvfile)
+
+    def read(self) -> Sequence[models.SecurityPrice]:
+        rows = [{k: v or None for k, v in row.items()} for row in self]
+        if not rows:
+            return []
+
+        securities = self.read_securities(rows)
+        # Assign primary keys to any newly-created Securities
+        self.session.flush()
+
+        dates = [date.fromisoformat(row["date"]) for row in rows]
+        existing = {
+            (price.security_id, price.date): price
+            for price in self.session.query(models.SecurityPrice).filter(
+                models.SecurityPrice.security_id.in_(
+                    {sec.id for sec in securities.values()}
+                ),
+                models.SecurityPrice.date.between(min(dates), max(dates)),
+            )
+        }
+
+        prices = []
+        for row, dt in zip(rows, dates):
+            security = securities[(row["uniqueidtype"], row["uniqueid"])]
+            attrs = {
+                "price": Decimal(row["price"]),
+                "currency": getattr(models.Currency, row["currency"]),
+            }
+            price = existing.get((security.id, dt))
+            if price is None:
+                price = models.SecurityPrice(security=security, date=dt, **attrs)
+                existing[(security.id, dt)] = price
+            else:
+                for attr, value in attrs.items():
+                    setattr(price, attr, value)
+            prices.append(price)
+
+        self.session.add_all(prices)
+        return prices
+
+    def read_securities(
+        self, rows: Sequence[CsvDictRowRead]
+    ) -> Mapping[Tuple[str, str], models.Security]:
+        """Map each (uniqueidtype, uniqueid) in the file to a Security.
+
+        Known SecurityIds are fetched in one query; only unknown ones fall back to
+        Security.merge().
+        """
+        keys = {(row["uniqueidtype"], row["uniqueid"]): row for row in rows}
+        secids = (
+            self.session.query(models.SecurityId)
+            .options(joinedload(models.SecurityId.security))
+            .filter(models.SecurityId.uniqueid.in_({uniqueid for _, uniqueid in keys}))
+        )
+        securities = {
+            (secid.uniqueidtype, secid.uniqueid): secid.security
+            for secid in secids
+            if (secid.uniqueidtype, secid.uniqueid) in keys
+        }
+        for (uniqueidtype, uniqueid), row in keys.items():
+            if (uniqueidtype, uniqueid) not in securities:
+                securities[(uniqueidtype, uniqueid)] = models.Security.merge(
+                    self.session,
+                    uniqueidtype=uniqueidtype,
+                    uniqueid=uniqueid,
+                    ticker=row["ticker"],
+                    name=row["secname"],
+                )
+        return securities
+
+
 class CsvTransactionWriter(csv.DictWriter):
     csvFields = [
         "uniqueid",
@@ -0,0 +1,101 @@
+# coding: utf-8
+"""Local on-disk cache for expensive results, keyed by a fingerprint of their inputs.
+
+Entries are opaque byte strings stored one per file under a cache directory.  Reading
+an entry refreshes its modification time; when the total size of the directory exceeds
+its limit, the least recently used entries are evicted first.
+
+Callers are responsible for choosing keys that change whenever the cached result
+would; e.g. a hash over every input that affects the output.
+"""
+
+__all__ = ["DiskCache", "fingerprint"]
+
+
+# stdlib imports
+import hashlib
+import os
+import tempfile
+from typing import Any, Iterable, Optional
+
+
+class DiskCache:
+    """Directory of cache entries with least-recently-used eviction.
+
+    Args:
+        directory: path of cache directory (created if necessary).
+        maxsize: total size in bytes above which old entries are evicted.
+    """
+
+    def __init__(self, directory: str, maxsize: int):
+        self.directory = directory
+        self.maxsize = maxsize
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached value for key (or None if absent), marking it recently used.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        """Store value for key, then evict old entries as needed to stay under limit.
+        """
+        #  Write to a temporary file & rename, so readers never see partial entries.
+        fd, tmppath = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmppath, self.path(key))
+        except BaseException:
+            os.unlink(tmppath)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until total size is within limit.
+        """
+        entries = [
+            entry
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(".tmp")
+        ]
+        stats = {}
+        for entry in entries:
+            #  Another process sharing the cache may have evicted it already.
+            try:
+                stats[entry.path] = entry.stat()
+            except FileNotFoundError:
+                pass
+        total = sum(stat.st_size for stat in stats.values())
+        for path in sorted(stats, key=lambda path: stats[path].st_mtime):
+            if total <= self.maxsize:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= stats[path].st_size
+
+
+def fingerprint(*parts: Iterable[Any]) -> str:
+    """Hash a series of iterables (e.g. DB query rows, settings) into a cache key.
+
+    Each item is hashed by its repr(), so items must have a stable repr.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        for item in part:
+            hasher.update(repr(item).encode())
+            hasher.update(b"\0")
+        hasher.update(b"\1")
+    return hasher.hexdigest()
@@ -6,6 +6,14 @@ import configparser
 
 CONFIG_DIR = os.path.join(os.path.expanduser("~"), ".config", "capgains")
 CONFIG_PATH = os.path.join(CONFIG_DIR, "capgains.cfg")
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "capgains")
+#  Applied to each connection when [db] dialect = sqlite
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": str(256 * 1024 ** 2),
+    "cache_size": str(-64 * 1024),  # negative => KiB
+}
 
 
 class CapgainsConfig(configparser.SafeConfigParser):
@@ -23,6 +31,12 @@ class CapgainsConfig(configparser.SafeConfigParser):
         self["data"] = {"default_dir": ""}
         self["work"] = {"default_dir": ""}
         self["books"] = {"functional_currency": "USD"}
+        self["cache"] = {
+            "dir": CACHE_DIR,
+            "report_maxsize": str(64 * 1024 ** 2),
+            "parse_maxsize": str(256 * 1024 ** 2),
+        }
+        self["sqlite"] = dict(SQLITE_PRAGMAS)
 
     @property
     def db_uri(self):
@@ -32,6 +46,25 @@ class CapgainsConfig(configparser.SafeConfigParser):
     def test_db_uri(self):
         return self._make_db_uri(**self["test"])
 
+    @property
+    def sqlite_pragmas(self):
+        pragmas = dict(SQLITE_PRAGMAS)
+        if self.has_section("sqlite"):
+            pragmas.update(self["sqlite"])
+        return pragmas
+
+    @property
+    def cache_dir(self):
+        return self.get("cache", "dir", fallback=None) or CACHE_DIR
+
+    @property
+    def report_cache_maxsize(self):
+        return self.getint("cache", "report_maxsize", fallback=64 * 1024 ** 2)
+
+    @property
+    def parse_cache_maxsize(self):
+        return self.getint("cache", "parse_maxsize", fallback=256 * 1024 ** 2)
+
     def _make_db_uri(self, **kwargs):
         schema = "{dialect}"
         if kwargs.get("driver", None):
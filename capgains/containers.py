@@ -9,13 +9,17 @@
     .reduce(netTransactions)
     .filter(operator.attrgetter("total"))
     .map(sum)
+
+GroupedList applies each step eagerly, copying the data.  LazyGroupedList offers the
+same interface, but only records the steps; they're run when the pipeline is
+materialized, fused into a single pass over each group.
 """
 from __future__ import annotations
 
 import functools
 import itertools
 from dataclasses import dataclass
-from typing import Callable, Iterable, Optional, Any
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple, Any
 
 
 @dataclass(frozen=True, init=False)
@@ -96,21 +100,26 @@ class GroupedList(list):
     def __repr__(self):
         return f"GroupedList({list(self)}, grouped={self.grouped}, key={self.key})"
 
-    def groupby(self, func: Callable) -> GroupedList:
+    def groupby(self, func: Callable, sort: bool = True) -> GroupedList:
         """Group bottom-level data items with function, preserving structure above.
 
         Increases nesting depth by 1,
+
+        Args:
+            func: function returning the group key of a data item.
+            sort: if True, groups are ordered by key.  Otherwise keys need only be
+                  hashable; groups are ordered by first appearance.
         """
         if self.grouped:
             return self.__class__(
-                [item.groupby(func) for item in self],
+                [item.groupby(func, sort) for item in self],
                 grouped=self.grouped,
                 key=self.key,
             )
         else:
             items = [
                 self.__class__(v, grouped=False, key=k)
-                for k, v in itertools.groupby(sorted(self, key=func), key=func)
+                for k, v in _groupby(self, func, sort)
             ]
             return self.__class__(items, grouped=True, key=self.key)
 
@@ -160,3 +169,154 @@ class GroupedList(list):
         return self.bind(
             lambda items: [functools.reduce(func, items)] if items else []
         )
+
+
+class LazyGroupedList:
+    """Deferred GroupedList pipeline.
+
+    Has the same fluent interface as GroupedList, but each method just records its
+    step & returns a new LazyGroupedList.  Indexing/iterating runs the pipeline
+    (cf. collect()): the steps between groupby()/flatten() are fused into a chain of
+    iterators, so each group is processed in a single pass without intermediate
+    lists.  The pipeline runs only once; its result is kept for later access, so
+    `items` may be a one-shot iterator.
+
+    Unlike GroupedList.bind(), functions passed to bind() receive an iterator over
+    the group's data items, not a list.
+
+    >>> grp = LazyGroupedList(range(8)).groupby(lambda x: x % 2)
+    >>> grp.map(lambda x: x * 10).filter(lambda x: x > 20).reduce(max)[:]
+    [GroupedList([60], grouped=False, key=0), GroupedList([70], grouped=False, key=1)]
+    """
+
+    def __init__(self, items: Iterable = (), steps: Tuple = ()):
+        self.items = items
+        self.steps = steps
+        self._collected: Optional[GroupedList] = None
+
+    def __repr__(self):
+        return f"LazyGroupedList({self.items!r}, steps={len(self.steps)})"
+
+    def _step(self, *step) -> LazyGroupedList:
+        return self.__class__(self.items, self.steps + (step, ))
+
+    def groupby(self, func: Callable, sort: bool = True) -> LazyGroupedList:
+        """Group bottom-level data items; cf. GroupedList.groupby().
+        """
+        return self._step("groupby", func, sort)
+
+    def flatten(self) -> LazyGroupedList:
+        return self._step("flatten")
+
+    def bind(self, func: Callable[[Iterable], Iterable]) -> LazyGroupedList:
+        return self._step("bind", func)
+
+    def sort(self, func: Optional[Callable] = None) -> LazyGroupedList:
+        return self.bind(functools.partial(sorted, key=func))
+
+    def filter(self, func: Optional[Callable[[Any], bool]] = None) -> LazyGroupedList:
+        return self.bind(functools.partial(filter, func))
+
+    def map(self, func: Callable[[Any], Any]) -> LazyGroupedList:
+        return self.bind(functools.partial(map, func))
+
+    def reduce(self, func: Callable[[Any, Any], Any]) -> LazyGroupedList:
+        return self.bind(functools.partial(_reduce, func))
+
+    def collect(self) -> GroupedList:
+        """Run the pipeline; return the results as a GroupedList.
+
+        Only the first call runs the pipeline; later calls return the same
+        GroupedList.
+        """
+        if self._collected is None:
+            self._collected = self._run()
+        return self._collected
+
+    def _run(self) -> GroupedList:
+        #  Groups are (key, items) pairs; `items` is an iterator over data items,
+        #  or a list of groups at higher nesting levels.
+        group: Tuple[Any, Any] = (None, iter(self.items))
+        depth = 0
+        for name, *args in self.steps:
+            if name == "groupby":
+                func, sort = args
+                group = _map_leaves(
+                    group,
+                    depth,
+                    lambda items: [
+                        (key, iter(values))
+                        for key, values in _groupby(items, func, sort)
+                    ],
+                )
+                depth += 1
+            elif name == "flatten":
+                group = (None, _chain_leaves(group, depth))
+                depth = 0
+            else:
+                (func, ) = args
+                group = _map_leaves(group, depth, func)
+        return _materialize(group, depth)
+
+    def __getitem__(self, index):
+        return self.collect()[index]
+
+    def __iter__(self) -> Iterator:
+        return iter(self.collect())
+
+    def __len__(self) -> int:
+        return len(self.collect())
+
+
+def _groupby(
+    items: Iterable, func: Callable, sort: bool
+) -> Iterable[Tuple[Any, List]]:
+    """Group items by key function, either by sorting or by hashing the keys.
+    """
+    if sort:
+        return (
+            (key, list(values))
+            for key, values in itertools.groupby(sorted(items, key=func), key=func)
+        )
+    groups: dict = {}
+    for item in items:
+        groups.setdefault(func(item), []).append(item)
+    return groups.items()
+
+
+def _reduce(func: Callable[[Any, Any], Any], items: Iterable) -> List:
+    """functools.reduce() returning a list of 1 result, or [] for no items.
+    """
+    items = iter(items)
+    for first in items:
+        return [functools.reduce(func, items, first)]
+    return []
+
+
+def _map_leaves(group: Tuple[Any, Any], depth: int, func: Callable) -> Tuple[Any, Any]:
+    """Apply function to the data items of every bottom-level group.
+    """
+    key, items = group
+    if depth == 0:
+        return key, func(items)
+    return key, [_map_leaves(child, depth - 1, func) for child in items]
+
+
+def _chain_leaves(group: Tuple[Any, Any], depth: int) -> Iterator:
+    """Chain the data items of all bottom-level groups.
+    """
+    key, items = group
+    if depth == 0:
+        return iter(items)
+    return itertools.chain.from_iterable(
+        _chain_leaves(child, depth - 1) for child in items
+    )
+
+
+def _materialize(group: Tuple[Any, Any], depth: int) -> GroupedList:
+    key, items = group
+    if depth == 0:
+        return GroupedList(items, grouped=False, key=key)
+    return GroupedList(
+        [_materialize(child, depth - 1) for child in items], grouped=True, key=key
+    )
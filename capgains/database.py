@@ -5,23 +5,272 @@ SQLAlchemy declarative base for model classes in this package.
 
 # stdlib imports
 from contextlib import contextmanager
+import decimal
+import hashlib
 import itertools
+import os
+import sqlite3
+import tempfile
 
 
 # 3rd party imports
-from sqlalchemy import create_engine
+import sqlalchemy
+from sqlalchemy import create_engine, event, String
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql.functions import FunctionElement
 from sqlalchemy.sql.schema import MetaData
+from sqlalchemy.types import TypeDecorator
 
 
 def init_db(db_uri, **kwargs):
-    engine = create_engine(db_uri, **kwargs)
-    Base.metadata.create_all(bind=engine)
+    engine = make_engine(db_uri, **kwargs)
+    create_schema(engine)
     Session.configure(bind=engine)
     return engine
 
 
+def make_engine(db_uri, pragmas=None, **kwargs):
+    """Create an Engine; for SQLite, set PRAGMAs on every new DBAPI connection.
+
+    SQLite connections also get the SQL functions behind numeric_sum() and
+    numeric_mul().
+
+    Args:
+        db_uri: database URI.
+        pragmas: mapping of SQLite PRAGMA name to value, e.g.
+                 {"journal_mode": "WAL", "synchronous": "NORMAL"}.
+                 Ignored for other databases.
+        kwargs: passed through to sqlalchemy.create_engine().
+    """
+    engine = create_engine(db_uri, **kwargs)
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    statements = [f"PRAGMA {name}={value}" for name, value in (pragmas or {}).items()]
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+        dbapi_connection.create_function(
+            "numeric_mul", 2, _sqlite_numeric_mul, deterministic=True
+        )
+        dbapi_connection.create_aggregate("numeric_sum", 1, _SqliteNumericSum)
+
+    return engine
+
+
+def schema_version():
+    """Hash the DDL for all tables & indexes into a positive 31-bit integer.
+    """
+    dialect = sqlite.dialect()
+    digest = hashlib.sha256()
+    for table in Base.metadata.sorted_tables:
+        digest.update(str(CreateTable(table).compile(dialect=dialect)).encode())
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            digest.update(str(CreateIndex(index).compile(dialect=dialect)).encode())
+    return int.from_bytes(digest.digest()[:4], "big") & 0x7FFFFFFF or 1
+
+
+def create_schema(engine):
+    """Create tables for all models that don't exist yet.
+
+    SQLite databases record schema_version() in PRAGMA user_version, and creation is
+    skipped entirely while it's current.  Other databases are managed by alembic
+    migrations; here we just make sure the tables exist.
+    """
+    if engine.dialect.name != "sqlite":
+        Base.metadata.create_all(bind=engine)
+        return
+
+    version = schema_version()
+    with engine.begin() as connection:
+        if connection.exec_driver_sql("PRAGMA user_version").scalar() == version:
+            return
+        Base.metadata.create_all(bind=connection)
+        connection.exec_driver_sql(f"PRAGMA user_version={version}")
+
+
+def drop_schema(engine):
+    """DROP all tables defined by models.
+    """
+    with engine.begin() as connection:
+        Base.metadata.drop_all(bind=connection)
+        if engine.dialect.name == "sqlite":
+            connection.exec_driver_sql("PRAGMA user_version=0")
+
+
+class Numeric(TypeDecorator):
+    """sqlalchemy.Numeric that round-trips decimal.Decimal exactly on SQLite.
+
+    SQLite has no decimal storage class; sqlalchemy.Numeric stores floating point
+    there.  On SQLite this type stores Decimals in a TEXT column, encoded so that
+    text comparison orders them numerically (cf. encode_decimal()).  SQL comparisons,
+    ORDER BY, MIN()/MAX() and CHECK constraints against zero therefore work as they
+    do on a NUMERIC column.  SQL arithmetic doesn't; use numeric_sum() and
+    numeric_mul() instead.
+
+    Values are stored normalized, so e.g. Decimal("1.50") comes back as
+    Decimal("1.5").  Other databases get a plain NUMERIC column.
+    """
+
+    impl = sqlalchemy.Numeric
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(String())
+        return dialect.type_descriptor(sqlalchemy.Numeric())
+
+    def process_bind_param(self, value, dialect):
+        if dialect.name == "sqlite" and value is not None:
+            return encode_decimal(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if dialect.name == "sqlite" and value is not None:
+            return decode_decimal(value)
+        return value
+
+
+#  Bias & width of the base 10 exponent in encode_decimal().
+EXPONENT_BIAS = 5000
+EXPONENT_WIDTH = 4
+
+
+def encode_decimal(value):
+    """Encode a number as text that sorts in numeric order.
+
+    Zero is "0".  Other values are a sign character ("P" for positive, which sorts
+    after "0"; "-" for negative, which sorts before it), then the biased exponent
+    of the most significant digit, then the significant digits without trailing
+    zeros.  Negative values have exponent & digits complemented (9 - digit), and a
+    terminating "~", so that larger magnitudes sort first.
+
+    >>> values = ("-10", "-9.5", "0", "0.5", "9", "10")
+    >>> [encode_decimal(decimal.Decimal(value)) for value in values]
+    ['-49988~', '-499904~', '0', 'P49995', 'P50009', 'P50011']
+
+    Raises:
+        ValueError: if value isn't finite, or its exponent is out of range.
+    """
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value))
+    if not value.is_finite():
+        raise ValueError(f"Can't store {value}")
+    if value.is_zero():
+        return "0"
+
+    sign, digits, exponent = value.as_tuple()
+    digits = "".join(map(str, digits)).rstrip("0")
+    adjusted = value.adjusted() + EXPONENT_BIAS
+    if not 0 <= adjusted < 10 ** EXPONENT_WIDTH:
+        raise ValueError(f"Exponent of {value} out of range")
+
+    if not sign:
+        return f"P{adjusted:0{EXPONENT_WIDTH}d}{digits}"
+    return "-{:0{}d}{}~".format(
+        10 ** EXPONENT_WIDTH - 1 - adjusted,
+        EXPONENT_WIDTH,
+        digits.translate(_COMPLEMENT),
+    )
+
+
+def decode_decimal(text):
+    """Inverse of encode_decimal().
+    """
+    if text == "0":
+        return decimal.Decimal(0)
+
+    sign = text[0]
+    adjusted, digits = text[1:1 + EXPONENT_WIDTH], text[1 + EXPONENT_WIDTH:]
+    if sign == "P":
+        adjusted = int(adjusted)
+    elif sign == "-" and digits.endswith("~"):
+        adjusted = 10 ** EXPONENT_WIDTH - 1 - int(adjusted)
+        digits = digits[:-1].translate(_COMPLEMENT)
+    else:
+        raise ValueError(f"Invalid encoded decimal {text!r}")
+
+    #  Exponent of the least significant digit; write integers without one.
+    exponent = adjusted - EXPONENT_BIAS - len(digits) + 1
+    digits = tuple(map(int, digits)) + (0,) * max(exponent, 0)
+    return decimal.Decimal((sign == "-", digits, min(exponent, 0)))
+
+
+_COMPLEMENT = str.maketrans("0123456789", "9876543210")
+
+
+class numeric_sum(FunctionElement):
+    """SQL SUM() of a Numeric expression.
+
+    SQLite would sum Numeric columns as floating point; there it's computed by a
+    Python aggregate function over Decimal instead (registered by make_engine()).
+    """
+
+    type = Numeric()
+    name = "numeric_sum"
+    inherit_cache = True
+
+
+@compiles(numeric_sum)
+def _compile_numeric_sum(element, compiler, **kw):
+    return "sum(%s)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(numeric_sum, "sqlite")
+def _compile_numeric_sum_sqlite(element, compiler, **kw):
+    return "numeric_sum(%s)" % compiler.process(element.clauses, **kw)
+
+
+class numeric_mul(FunctionElement):
+    """SQL product of two Numeric expressions; Decimal arithmetic on SQLite.
+    """
+
+    type = Numeric()
+    name = "numeric_mul"
+    inherit_cache = True
+
+
+@compiles(numeric_mul)
+def _compile_numeric_mul(element, compiler, **kw):
+    left, right = element.clauses
+    return "(%s * %s)" % (compiler.process(left, **kw), compiler.process(right, **kw))
+
+
+@compiles(numeric_mul, "sqlite")
+def _compile_numeric_mul_sqlite(element, compiler, **kw):
+    return "numeric_mul(%s)" % compiler.process(element.clauses, **kw)
+
+
+def _sqlite_numeric_mul(left, right):
+    if left is None or right is None:
+        return None
+    return encode_decimal(decode_decimal(left) * decode_decimal(right))
+
+
+class _SqliteNumericSum:
+    """SQLite aggregate function adding Numeric values as Decimal; NULLs are skipped.
+    """
+
+    def __init__(self):
+        self.total = None
+
+    def step(self, value):
+        if value is not None:
+            value = decode_decimal(value)
+            self.total = value if self.total is None else self.total + value
+
+    def finalize(self):
+        return None if self.total is None else encode_decimal(self.total)
+
+
 Session = sessionmaker()
 
 
@@ -39,6 +288,91 @@ def sessionmanager(**kwargs):
         session.close()
 
 
+@contextmanager
+def snapshot(engine, readonly=True):
+    """Provide a Session reading a consistent snapshot of the database.
+
+    For long-running reports, so they neither block nor are blocked by concurrent
+    imports.  Nothing done in the Session is committed.
+
+    PostgreSQL gets a REPEATABLE READ transaction.  A SQLite database file in WAL
+    mode gets a read transaction on the live file, which WAL keeps consistent
+    without blocking writers; the Session can't write.  If the Session needs to
+    write (`readonly` is False), or the file isn't in WAL mode, the file is first
+    copied with the online backup API, and the Session works on the copy.
+    Otherwise (e.g. in-memory SQLite) the Session just reads the database.
+
+    Args:
+        engine: a sqlalchemy.engine.Engine instance representing a database connection.
+        readonly: if True, the Session only reads (i.e. PostgreSQL READ ONLY, SQLite
+                  query_only).
+    """
+    dialect = engine.dialect.name
+    if dialect == "postgresql":
+        bind = engine.execution_options(
+            isolation_level="REPEATABLE READ", postgresql_readonly=readonly
+        )
+        with _scratch_session(bind=bind) as session:
+            yield session
+    elif dialect == "sqlite" and engine.url.database not in (None, "", ":memory:"):
+        if readonly:
+            with engine.connect() as connection:
+                if connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal":
+                    with _sqlite_read_transaction(connection):
+                        with _scratch_session(bind=connection) as session:
+                            yield session
+                    return
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "snapshot.db")
+            copy = sqlite3.connect(path)
+            source = engine.raw_connection()
+            try:
+                #  One step copies all pages under a single read transaction.
+                source.driver_connection.backup(copy)
+            finally:
+                source.close()
+                copy.close()
+
+            bind = make_engine(f"sqlite:///{path}")
+            try:
+                with _scratch_session(bind=bind) as session:
+                    yield session
+            finally:
+                bind.dispose()
+    else:
+        with _scratch_session(bind=engine) as session:
+            yield session
+
+
+@contextmanager
+def _sqlite_read_transaction(connection):
+    """Hold a SQLite read transaction open on a Connection, refusing writes.
+    """
+    execute = connection.exec_driver_sql
+    execute("PRAGMA query_only=ON")
+    try:
+        #  pysqlite doesn't BEGIN before a SELECT, and the WAL snapshot is only
+        #  taken at the first read.
+        execute("BEGIN")
+        execute("SELECT count(*) FROM sqlite_master")
+        yield
+    finally:
+        connection.rollback()
+        execute("PRAGMA query_only=OFF")
+        connection.rollback()
+
+
+@contextmanager
+def _scratch_session(**kwargs):
+    session = Session(**kwargs)
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
+
+
 #  Naming convention for constraints - important for database migrations
 #  https://docs.sqlalchemy.org/en/13/core/constraints.html#configuring-constraint-naming-conventions
 convention = {
@@ -65,10 +399,9 @@ class Base(object):
         """
         Lists all non-NULL instance attributes.
         """
-        # Last 4 classes in __mro__ are sqlalchemy.ext.declarative.api.Base,
-        # capgains.database.Base, capgains.models.Mergeable, and object...
-        # don't want those!
-        mro = list(self.__class__.__mro__)[:-4]
+        # Skip the declarative bases, mixins (e.g. capgains.models.Mergeable)
+        # and object; only mapped classes have their own __table__.
+        mro = [cls for cls in self.__class__.__mro__ if "__table__" in vars(cls)]
         # Order from ancestor to descendant
         mro.reverse()
         # Collect all column names from ancestry, flatten, and remove dupes
@@ -10,11 +10,31 @@ from . import Types
 from . import regexes
 
 
+def parse(source):
+    """Parse a Flex XML file into picklable ``Types.FlexStatement`` instances.
+
+    The file is streamed (cf. parser.iterparse()), so memory is bounded by the
+    converted transactions of the largest FlexStatement, not by the XML.  Doesn't
+    touch the DB, so it's safe to run in a worker process.
+    """
+    return parser.parse(source)
+
+
 def read(session, source):
-    statements = parser.parse(source)
-    rdr = reader.FlexResponseReader(statements)
-    rdr.read(session)
+    """Stream statements from a Flex XML file, reading/merging each one in turn.
+
+    Each statement is dropped once read, so memory is bounded by the converted
+    transactions of the largest FlexStatement in the file, plus the Transactions
+    returned.
+    """
+    return read_statements(session, parser.iterparse(source))
+
+
+def read_statements(session, statements):
+    """Read/merge statements returned by ``parse()``; return Transactions."""
     transactions = []
-    for stmt in rdr.statements:
-        transactions.extend(stmt.transactions)
+    for stmt in statements:
+        rdr = reader.FlexStatementReader(stmt)
+        rdr.read(session)
+        transactions.extend(rdr.transactions)
     return transactions
@@ -102,9 +102,23 @@ ConversionRate:
     rate
 """
 from datetime import datetime
+import io
 import itertools
-import functools
-from typing import Tuple, List, Optional, Union, Iterable, cast
+import warnings
+import xml.etree.ElementTree as ET
+from typing import (
+    Any,
+    Tuple,
+    List,
+    Dict,
+    NoReturn,
+    Optional,
+    Set,
+    Union,
+    Iterable,
+    Iterator,
+    cast,
+)
 
 import ibflex
 
@@ -116,42 +130,128 @@ from capgains.flex import BROKERID, Types, regexes
 # PARSE STATEMENT
 ###############################################################################
 def parse(source) -> List[Types.FlexStatement]:
-    statements = []
-    response = ibflex.parser.parse(source)
-    for stmt in response.FlexStatements:
-        assert stmt.AccountInformation is not None
-
-        # First parse trades, so they can be associated with options activity
-        trades = parse_trades(stmt.Trades)
-        exercises = parse_optionEAE(stmt.OptionEAE, trades)
-        transactions = (
-            cast(List[Types.Transaction], trades)
-            + cast(List[Types.Transaction], exercises)
-        )
-        # Then process the rest of the transactions
-        for transactionType in [
-            "TradeTransfers",
-            "CashTransactions",
-            "CorporateActions",
-            "Transfers",
-        ]:
-            report = getattr(stmt, transactionType)
-            if report:
-                subparser = SUBPARSERS[transactionType]
-                transactions.extend(subparser(report))  # type: ignore
-
-        statements.append(
-            Types.FlexStatement(
-                account=parse_acctinfo(stmt.AccountInformation),
-                securities=parse_securities(stmt.SecuritiesInfo),
-                transactions=transactions,
-                #  Data with no analog in OFX is appended unchanged
-                changeInDividendAccruals=stmt.ChangeInDividendAccruals,
-                conversionRates=stmt.ConversionRates,
-            )
-        )
+    return list(iterparse(source))
+
+
+def iterparse(source) -> Iterator[Types.FlexStatement]:
+    """Stream FlexStatements from Flex XML, one at a time.
+
+    Unlike ibflex.parser.parse(), this holds neither the whole document nor a whole
+    FlexStatement's worth of XML or ibflex data.  Each data element is converted to
+    flex.Types as soon as it's closed (cf. StatementBuilder) & then dropped from the
+    XML tree, and sections that aren't read (positions, performance summaries etc.)
+    aren't converted at all.  Memory is bounded by the converted transactions of the
+    largest FlexStatement, plus the OptionEAEWindow.
+
+    Args:
+        source: file name, file object, or bytes.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    #  Stack of open XML elements; depth 1 is <FlexQueryResponse>, 2 is
+    #  <FlexStatements>, 3 is <FlexStatement>, 4 its sections, 5 their data.
+    stack: List[ET.Element] = []
+    builder = StatementBuilder()
+    count = 0
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append(elem)
+            if len(stack) == 1 and elem.tag != "FlexQueryResponse":
+                raise ibflex.parser.FlexParserError("Not a FlexQueryResponse")
+            if len(stack) == 3:
+                builder = StatementBuilder()
+            continue
+
+        depth = len(stack)
+        stack.pop()
+        if depth == 5 and stack[3].tag in SECTIONS:
+            data = ibflex.parser.parse_data_element(elem)
+            if data is not None:
+                builder.add(stack[3].tag, data)
+        elif depth == 4 and elem.tag == "AccountInformation":
+            builder.add(elem.tag, ibflex.parser.parse_data_element(elem))
+        elif depth == 3:
+            yield builder.build()
+            count += 1
+        elif depth == 2:
+            if elem.get("count") != str(count):
+                raise ibflex.parser.FlexParserError(
+                    f"Wrong FlexStatements.count={elem.get('count')} vs. {count}"
+                )
+
+        #  Drop processed elements.  Children are removed as they close, so
+        #  `elem` is always its parent's first child.
+        if stack:
+            elem.clear()
+            stack[-1].remove(elem)
+
+
+def parse_statement(stmt: ibflex.Types.FlexStatement) -> Types.FlexStatement:
+    """Convert a FlexStatement from ibflex.parser.parse() of a whole document.
+    """
+    assert stmt.AccountInformation is not None
+
+    builder = StatementBuilder()
+    builder.add("AccountInformation", stmt.AccountInformation)
+    for section in SECTIONS:
+        for data in getattr(stmt, section) or ():
+            builder.add(section, data)
+    return builder.build()
+
+
+class StatementBuilder:
+    """Assemble a Types.FlexStatement from the data elements of its sections.
+
+    Each data element is converted as it's added, so the ibflex data needn't be
+    kept.  Trades and OptionEAE legs booking options exercise are paired through an
+    OptionEAEWindow; other transactions are kept in the order they're added.
+    """
+
+    def __init__(self) -> None:
+        self.account: Optional[Types.Account] = None
+        self.securities: List[Types.Security] = []
+        self.transactions: List[Types.Transaction] = []
+        self.changeInDividendAccruals: List[ibflex.Types.ChangeInDividendAccrual] = []
+        self.conversionRates: List[ibflex.Types.ConversionRate] = []
+        self.exercises = OptionEAEWindow()
 
-    return statements
+    def add(self, section: str, data: Any) -> None:
+        """Convert a data element of a FlexStatement section.
+
+        Args:
+            section: tag of the section, e.g. "Trades".
+            data: ibflex.Types instance parsed from the data element.
+        """
+        if section == "AccountInformation":
+            self.account = parse_acctinfo(data)
+        elif section == "SecuritiesInfo":
+            self.securities.extend(parse_security(data))
+        elif section == "Trades":
+            self.transactions.extend(self.exercises.add_trade(parse_trade(data)))
+        elif section == "OptionEAE":
+            self.transactions.extend(self.exercises.add_optionEAE(data))
+        elif section == "ChangeInDividendAccruals":
+            self.changeInDividendAccruals.append(data)
+        elif section == "ConversionRates":
+            self.conversionRates.append(data)
+        else:
+            subparser = SUBPARSERS[section]
+            self.transactions.extend(subparser((data, )))  # type: ignore
+
+    def build(self) -> Types.FlexStatement:
+        """Return the FlexStatement, once all its data elements have been added.
+        """
+        assert self.account is not None
+        self.transactions.extend(self.exercises.flush())
+        return Types.FlexStatement(
+            account=self.account,
+            securities=self.securities,
+            transactions=self.transactions,
+            #  Data with no analog in OFX is appended unchanged
+            changeInDividendAccruals=tuple(self.changeInDividendAccruals),
+            conversionRates=tuple(self.conversionRates),
+        )
 
 
 def parse_acctinfo(acctinfo: ibflex.Types.AccountInformation) -> Types.Account:
@@ -470,11 +570,22 @@ def parse_transfer(tx: ibflex.Types.Transfer) -> Types.Transfer:
 ########################################################################################
 # OPTIONS EXERCISE/ASSIGNMENT/EXPIRATION
 ########################################################################################
-def parse_optionEAE(
-    report: Iterable[ibflex.Types.OptionEAE],
-    trades: List[Types.Trade]
-) -> List[Types.Exercise]:
-    """Map Flex OptionEAE to OFX CLOSUREOPT interface.
+#: Notes codes of the Trades booking options exercise/assignment (both legs).
+EXERCISE_CODES = frozenset(
+    {
+        ibflex.enums.Code.ASSIGNMENT,
+        ibflex.enums.Code.EXERCISE,
+        ibflex.enums.Code.AUTOEXERCISE,
+    }
+)
+
+#: Default number of Trades & pairs of OptionEAE legs an OptionEAEWindow holds.
+OPTIONEAE_WINDOW = 10000
+
+
+class OptionEAEWindow:
+    """Map Flex OptionEAE to OFX CLOSUREOPT interface, pairing OptionEAE legs with
+    their Trades as either one arrives.
 
     Inside the <OptionEAE> container, each assignment/exercise is represented
     by a pair of consecutive <OptionEAE> data elements - the first books out
@@ -491,78 +602,234 @@ def parse_optionEAE(
 
     Note:
         parse_trade() can't recognize trades representing options exercise
-        in-band.  First parse all ibflex.Types.Trade instances to get a
-        consistent interface, then pass the resulting Types.Trade
-        instances in here to remove Trades representing options exercise.
-
-    Returns:
-        A list of Types.Exercise instance joining the options/underlying legs.
-
-    Side effect:
-        Modifies input list of Trades in place, removing Trades representing
-        options exercise so FlexStatementReader won't try to process them.
+        in-band, and <Trades> may come before or after <OptionEAE>.  Trades whose
+        notes carry one of EXERCISE_CODES are held (keyed by tradeID) until their
+        OptionEAE leg arrives, and pairs of legs are held until both their Trades
+        arrive; all other Trades pass straight through.  Paired Trades are consumed
+        by the Exercise, so FlexStatementReader won't try to process them.
+
+        At most `size` Trades & pairs of legs are held.  Beyond that, the oldest
+        held Trade (or failing that, the oldest pair of legs) falls out of the
+        window and is flushed as ordinary Trades.  Trades still held at the end of
+        the statement are likewise flushed as ordinary Trades, but legs that are
+        still unpaired there are an error.
+
+    Args:
+        size: most Trades & pairs of legs to hold unpaired; None for no limit.
     """
-    transactions = []
-    wip = None
-    for optionEAE in report:
+
+    def __init__(self, size: Optional[int] = OPTIONEAE_WINDOW) -> None:
+        self.size = size
+        #  Trades marked with EXERCISE_CODES awaiting their leg, by tradeID.
+        self.trades: Dict[str, Types.Trade] = {}
+        #  Option leg awaiting the underlying leg that follows it.
+        self.option: Optional[ibflex.Types.OptionEAE] = None
+        #  [option leg, underlying leg, option Trade, underlying Trade] awaiting
+        #  Trades, by tradeID of the option leg (i.e. oldest first).
+        self.pairs: Dict[str, List[Any]] = {}
+        #  Entries of `pairs`, by tradeID of each leg still awaiting its Trade.
+        self.waiting: Dict[str, List[Any]] = {}
+        #  tradeIDs of Trades flushed from the window, whose legs are ignored.
+        self.flushed: Set[str] = set()
+
+    def add_trade(self, trade: Types.Trade) -> List[Types.Transaction]:
+        """Returns:
+            Transactions completed by the Trade: the Trade itself, unless held;
+            an Exercise, if it completes a pair of legs; or Trades flushed from
+            the window.
+        """
+        assert trade.fitid is not None
+        pair = self.waiting.pop(trade.fitid, None)
+        if pair is not None:
+            index = 2 if pair[0].tradeID == trade.fitid else 3
+            pair[index] = match_trade(pair[index - 2], trade)
+            if pair[2] is None or pair[3] is None:
+                return []
+            del self.pairs[pair[0].tradeID]
+            return [make_exercise(*pair)]
+
+        if EXERCISE_CODES.isdisjoint(trade.notes):
+            return [trade]
+
+        assert trade.fitid not in self.trades
+        self.trades[trade.fitid] = trade
+        return cast(List[Types.Transaction], self.evict())
+
+    def add_optionEAE(
+        self, optionEAE: ibflex.Types.OptionEAE
+    ) -> List[Types.Transaction]:
+        """Returns:
+            Transactions completed by the OptionEAE leg: an Exercise, if it
+            completes a pair of legs; or Trades flushed from the window.
+        """
         transactionType = optionEAE.transactionType
         if transactionType is ibflex.enums.OptionAction.EXPIRE:
             #  FIXME need to realize capital loss if options expire worthless.
-            wip = None
-            continue
-
-        tx = pluck_trade(optionEAE, trades)
+            return []
 
         if transactionType in (
             ibflex.enums.OptionAction.ASSIGN,
             ibflex.enums.OptionAction.EXERCISE
         ):
-            assert wip is None
-            wip = functools.partial(
-                Types.Exercise,
-                fitid=tx.fitid,
-                dttrade=tx.dttrade,
-                memo=f"{transactionType.name.capitalize()} {tx.units} {tx.memo}",
-                uniqueidtypeFrom=tx.uniqueidtype,
-                uniqueidFrom=tx.uniqueid,
-                unitsfrom=tx.units,
-                reportdate=tx.reportdate,
-            )
-        else:
-            assert wip is not None
-            transactions.append(
-                wip(
-                    uniqueidtype=tx.uniqueidtype,
-                    uniqueid=tx.uniqueid,
-                    units=tx.units,
-                    currency=tx.currency,
-                    total=tx.total,
-                    notes=tx.notes,
+            if self.option is not None:
+                self.unpaired(self.option, "no underlying leg")
+            self.option = optionEAE
+            return []
+
+        if self.option is None:
+            self.unpaired(optionEAE, "no option leg")
+        pair: List[Any] = [self.option, optionEAE, None, None]
+        self.option = None
+
+        for index, leg in enumerate(pair[:2]):
+            tradeID = leg.tradeID
+            assert tradeID is not None
+            if tradeID in self.waiting:
+                raise ibflex.parser.FlexParserError(
+                    f"More than one OptionEAE with tradeID={tradeID}"
                 )
-            )
-            wip = None
-    assert wip is None
-    return transactions
+            trade = self.trades.pop(tradeID, None)
+            if trade is not None:
+                pair[index + 2] = match_trade(leg, trade)
+
+        if pair[2] is not None and pair[3] is not None:
+            return [make_exercise(*pair)]
+
+        if not self.flushed.isdisjoint(leg.tradeID for leg in pair[:2]):
+            #  The other Trade already fell out of the window.
+            return cast(List[Types.Transaction], self.drop(pair))
+
+        for leg, trade in zip(pair[:2], pair[2:]):
+            if trade is None:
+                self.waiting[leg.tradeID] = pair
+        self.pairs[pair[0].tradeID] = pair
+        return cast(List[Types.Transaction], self.evict())
+
+    def evict(self) -> List[Types.Trade]:
+        """Flush the oldest held Trades, then the oldest pairs of legs, while the
+        window is over size.
+        """
+        trades: List[Types.Trade] = []
+        if self.size is None:
+            return trades
+        while len(self.trades) + len(self.pairs) > self.size:
+            if self.trades:
+                tradeID = next(iter(self.trades))
+                self.flushed.add(tradeID)
+                trades.append(self.trades.pop(tradeID))
+            else:
+                pair = self.pairs.pop(next(iter(self.pairs)))
+                for leg in pair[:2]:
+                    self.waiting.pop(leg.tradeID, None)
+                trades.extend(self.drop(pair))
+        return trades
+
+    def drop(self, pair: List[Any]) -> List[Types.Trade]:
+        """Give up on pairing legs with their Trades.
+
+        Returns:
+            Trades already matched to the legs, as ordinary Trades.  Trades that
+            arrive later are held until the end of the statement, then likewise
+            flushed as ordinary Trades.
+        """
+        warnings.warn(
+            f"OptionEAE tradeID={pair[0].tradeID} wasn't paired within "
+            f"{self.size} Trades/OptionEAE; treating it as ordinary Trades"
+        )
+        return [trade for trade in pair[2:] if trade is not None]
+
+    def flush(self) -> List[Types.Trade]:
+        """End the statement, returning held Trades that weren't paired.
+
+        Raises:
+            ibflex.parser.FlexParserError, if any OptionEAE leg wasn't paired.
+        """
+        if self.option is not None:
+            self.unpaired(self.option, "no underlying leg")
+        for pair in self.pairs.values():
+            self.unpaired(pair[0], "no Trade")
+        trades = list(self.trades.values())
+        self.trades.clear()
+        self.flushed.clear()
+        return trades
+
+    @staticmethod
+    def unpaired(optionEAE: ibflex.Types.OptionEAE, what: str) -> NoReturn:
+        raise ibflex.parser.FlexParserError(
+            f"OptionEAE tradeID={optionEAE.tradeID} has {what}"
+        )
+
+
+def make_exercise(
+    option: ibflex.Types.OptionEAE,
+    underlying: ibflex.Types.OptionEAE,
+    tx0: Types.Trade,
+    tx1: Types.Trade,
+) -> Types.Exercise:
+    """Join the Trades paired with the option & underlying legs of an OptionEAE.
+    """
+    transactionType = option.transactionType
+    assert transactionType in (
+        ibflex.enums.OptionAction.ASSIGN,
+        ibflex.enums.OptionAction.EXERCISE
+    )
+    assert underlying.transactionType not in (
+        ibflex.enums.OptionAction.ASSIGN,
+        ibflex.enums.OptionAction.EXERCISE
+    )
+    return Types.Exercise(
+        fitid=tx0.fitid,
+        dttrade=tx0.dttrade,
+        memo=f"{transactionType.name.capitalize()} {tx0.units} {tx0.memo}",
+        uniqueidtypeFrom=tx0.uniqueidtype,
+        uniqueidFrom=tx0.uniqueid,
+        unitsfrom=tx0.units,
+        reportdate=tx0.reportdate,
+        uniqueidtype=tx1.uniqueidtype,
+        uniqueid=tx1.uniqueid,
+        units=tx1.units,
+        currency=tx1.currency,
+        total=tx1.total,
+        notes=tx1.notes,
+    )
 
 
-def pluck_trade(
+def parse_optionEAE(
+    report: Iterable[ibflex.Types.OptionEAE],
+    trades: List[Types.Trade]
+) -> List[Types.Exercise]:
+    """Pair a whole OptionEAE section with a whole list of Trades.
+
+    Cf. OptionEAEWindow, which iterparse() feeds one data element at a time.  Here
+    the whole section is already in memory, so the window isn't bounded.
+
+    Returns:
+        A list of Types.Exercise instance joining the options/underlying legs.
+
+    Side effect:
+        Modifies input list of Trades in place, removing Trades representing
+        options exercise so FlexStatementReader won't try to process them.
+    """
+    window = OptionEAEWindow(size=None)
+    transactions = [tx for trade in trades for tx in window.add_trade(trade)]
+    for optionEAE in report:
+        transactions.extend(window.add_optionEAE(optionEAE))
+    transactions.extend(window.flush())
+
+    trades[:] = [tx for tx in transactions if isinstance(tx, Types.Trade)]
+    return [tx for tx in transactions if isinstance(tx, Types.Exercise)]
+
+
+def match_trade(
     optionEAE: ibflex.Types.OptionEAE,
-    trades: List[Types.Trade],
+    trade: Types.Trade,
 ) -> Types.Trade:
-    """Find Trade referred to by OptionEAE and remove it from list of Trades.
+    """Check that a Trade is the one referred to by an OptionEAE leg.
 
     Returns:
-        Trade that matches input OptionEAE
-
-    Side Effect:
-        Modies input list of Trades (removes matching Trade)
+        The Trade.
     """
-    hits = [
-        index for index, tx in enumerate(trades)
-        if tx.fitid == optionEAE.tradeID
-    ]
-    assert len(hits) == 1
-    trade = trades.pop(hits.pop())
+    assert trade.fitid == optionEAE.tradeID
 
     dttrade = trade.dttrade
     date = optionEAE.date
@@ -585,6 +852,17 @@ SUBPARSERS = {
     "Transfers": parse_transfers,
 }
 
+#  FlexStatement sections converted by StatementBuilder; the rest are skipped.
+#  parse_statement() adds them in this order.
+SECTIONS = (
+    "SecuritiesInfo",
+    "Trades",
+    "OptionEAE",
+    *SUBPARSERS,
+    "ChangeInDividendAccruals",
+    "ConversionRates",
+)
+
 #  MEMO_SIGNATURES infer CorporateAction type for data from before FlexQuery
 #  schema included the `type` attribute.  Order is significant; higher
 #  confidence matches come first.  Since 'SPINOFF' is sometimes used in the
@@ -630,8 +908,7 @@ def main():
 
     for file in args.file:
         print(file)
-        response = parse(file)
-        for stmt in response:
+        for stmt in iterparse(file):
             for tx in stmt.transactions:
                 if isinstance(tx, Types.Trade):
                     #  print(f"{tx.dttrade} {tx.units} {tx.memo}")
@@ -32,7 +32,8 @@ from capgains import ofx, models, utils
 from capgains.ofx.reader import SecuritiesMap, Statement
 from capgains.flex import BROKERID, Types, regexes
 from capgains.database import Base, sessionmanager
-from capgains.containers import GroupedList, FirstResult
+from capgains.containers import GroupedList, LazyGroupedList, FirstResult
+from capgains.instrument import stage
 
 
 class ParsedCorpAct(NamedTuple):
@@ -175,6 +176,7 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
         self.transactions: List[models.Transaction] = []
         self.dividendsPaid: DividendsPaid = {}
 
+    @stage("read")
     def read(
         self,
         session: sqlalchemy.orm.session.Session,
@@ -219,21 +221,24 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
         statement: Statement,
         session: sqlalchemy.orm.session.Session,
     ) -> None:
-        """Persist currency conversion rates to DB.
+        """Persist currency conversion rates to DB in bulk.
 
         Used in reporting, to translate inventory.Gain instances to
         functional currency.
         """
         assert isinstance(statement, Types.FlexStatement)
-        rates = statement.conversionRates
-        for rate in rates:
-            models.CurrencyRate.merge(
-                session,
-                date=rate.reportDate,
-                fromcurrency=rate.fromCurrency,
-                tocurrency=rate.toCurrency,
-                rate=rate.rate,
-            )
+        models.CurrencyRate.merge_rates(
+            session,
+            (
+                {
+                    "date": rate.reportDate,
+                    "fromcurrency": rate.fromCurrency,
+                    "tocurrency": rate.toCurrency,
+                    "rate": rate.rate,
+                }
+                for rate in statement.conversionRates
+            ),
+        )
 
     def read_securities(
         self,
@@ -302,6 +307,24 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
 
         return match
 
+    @staticmethod
+    def trade_cancel_key(canceler: ofx.reader.Trade) -> Any:
+        """Hash key for the trade canceled by a trade cancellation.
+
+        Overrides OfxStatementReader superclass method.
+        """
+        if canceler.orig_tradeid not in (None, "", "0"):
+            return ("fitid", canceler.orig_tradeid)
+        return ("units", -1 * canceler.units)
+
+    @staticmethod
+    def trade_cancel_original_keys(canceled: ofx.reader.Trade) -> Tuple[Any, ...]:
+        """Hash keys by which a trade cancellation may find this trade.
+
+        Overrides OfxStatementReader superclass method.
+        """
+        return (("fitid", canceled.fitid), ("units", canceled.units))
+
     @staticmethod
     def sort_trades_to_cancel(transaction: ofx.reader.Trade) -> Any:
         """Determines order in which trades are canceled.
@@ -392,6 +415,7 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
 
         return transaction
 
+    @stage("doTransfers", rows="transactions")
     def doTransfers(
         self,
         transactions: Iterable[ofx.reader.Transfer],
@@ -408,12 +432,13 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
             account=account,
         )
         transactions = (
-            GroupedList(transactions)
+            LazyGroupedList(transactions)
             .filter(attrgetter("uniqueid"))
             .map(_merge_acct_transfer)
         )[:]
         return [tx for tx in transactions if tx is not None]
 
+    @stage("doCorporateActions", rows="transactions")
     def doCorporateActions(
         self,
         transactions: Iterable[Types.CorporateAction],
@@ -496,6 +521,8 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
             filterfunc=is_corpact_cancel,
             matchfunc=are_corpact_cancel_pair,
             sortfunc=lambda corpact: corpact.reportdate,
+            cancelkey=lambda corpact: -1 * corpact.units,
+            originalkeys=lambda corpact: (corpact.units,),
         )
 
         parse_memo = functools.partial(
@@ -505,7 +532,7 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
         )
 
         group = (
-            GroupedList(transactions)
+            LazyGroupedList(transactions)
             .groupby(fingerprint_corpact)
             .bind(apply_cancels)
             .reduce(net_corpacts)
@@ -513,10 +540,11 @@ class FlexStatementReader(ofx.reader.OfxStatementReader):
             .map(parse_memo)  # Transform contents from CorporateAction to ParsedCorpAct
             .groupby(fingerprint_parsed_corpact)
             .sort(sort_parsed_corpacts)
-        )
+        ).collect()
 
         return group
 
+    @stage("doOptionsExercises", rows="transactions")
     def doOptionsExercises(
         self,
         transactions: Iterable[Types.Exercise],
@@ -609,6 +637,7 @@ def net_corpacts(
     )
 
 
+@stage("parseCorporateActionMemo")
 def parseCorporateActionMemo(
     session: sqlalchemy.orm.session.Session,
     securities: SecuritiesMap,
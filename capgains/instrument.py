@@ -0,0 +1,244 @@
+# coding: utf-8
+"""Per-stage timing & query counts for imports.
+
+Functions making up the import pipeline (parse, read, do*, merge) are decorated with
+stage(); blocks of code can be measured with measure().  Both are no-ops unless a
+Collector is active, e.g.
+
+    with Collector() as collector:
+        ...
+    print(collector.table())
+
+For each stage, a Collector tallies calls, wall time, rows in & out, and SQL
+statements executed (counted by a SQLAlchemy engine event hook).  Stages nest, so
+a stage's figures include those of the stages it calls; a stage reentered while
+already active (e.g. a subclass method calling its superclass method) is counted once.
+"""
+
+__all__ = ["StageStats", "Collector", "current", "stage", "measure", "collected"]
+
+
+# stdlib imports
+from contextlib import contextmanager
+import functools
+import inspect
+import json
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# 3rd party imports
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class StageStats:
+    """Running totals for one stage."""
+
+    __slots__ = ("calls", "seconds", "rows_in", "rows_out", "queries")
+
+    def __init__(self, calls=0, seconds=0.0, rows_in=0, rows_out=0, queries=0):
+        self.calls = calls
+        self.seconds = seconds
+        self.rows_in = rows_in
+        self.rows_out = rows_out
+        self.queries = queries
+
+    def add(self, other: "StageStats") -> None:
+        for attr in self.__slots__:
+            setattr(self, attr, getattr(self, attr) + getattr(other, attr))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
+    def __eq__(self, other):
+        return isinstance(other, StageStats) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        attrs = ", ".join(f"{k}={v!r}" for k, v in self.as_dict().items())
+        return f"StageStats({attrs})"
+
+
+#  Collector receiving measurements; None when instrumentation is off.
+_collector: Optional["Collector"] = None
+
+
+class Collector:
+    """Accumulates StageStats by stage name while active (as a context manager).
+    """
+
+    def __init__(self) -> None:
+        #  Stage names in order of first call.
+        self.stages: Dict[str, StageStats] = {}
+        self.queries = 0
+        self.active: List[str] = []
+        self._previous: Optional[Collector] = None
+
+    def __enter__(self) -> "Collector":
+        global _collector
+        self._previous = _collector
+        _collector = self
+        event.listen(Engine, "before_cursor_execute", self._count_query)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        global _collector
+        event.remove(Engine, "before_cursor_execute", self._count_query)
+        _collector = self._previous
+
+    def _count_query(self, *args, **kwargs) -> None:
+        self.queries += 1
+
+    def merge(self, stages: Dict[str, StageStats]) -> None:
+        """Add StageStats gathered elsewhere (e.g. in a worker process).
+        """
+        for name, stats in stages.items():
+            self.stages.setdefault(name, StageStats()).add(stats)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats.as_dict() for name, stats in self.stages.items()}
+
+    def json(self) -> str:
+        return json.dumps(self.as_dict(), indent=2)
+
+    def table(self) -> str:
+        """Format stats as a plain text table, one row per stage.
+        """
+        header = ("stage", "calls", "seconds", "rows in", "rows out", "queries")
+        rows = [
+            (
+                name,
+                str(stats.calls),
+                f"{stats.seconds:.3f}",
+                str(stats.rows_in),
+                str(stats.rows_out),
+                str(stats.queries),
+            )
+            for name, stats in self.stages.items()
+        ]
+        widths = [max(len(row[i]) for row in [header] + rows) for i in range(6)]
+        lines = [
+            "  ".join(
+                [row[0].ljust(widths[0])]
+                + [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            )
+            for row in [header] + rows
+        ]
+        lines.insert(1, "  ".join("-" * width for width in widths))
+        return "\n".join(lines)
+
+
+def current() -> Optional[Collector]:
+    """Return the active Collector, if any.
+    """
+    return _collector
+
+
+@contextmanager
+def measure(name: str, rows_in: int = 0):
+    """Measure a block of code as a stage.
+
+    Yields:
+        StageStats for this call (or None if instrumentation is off); the block
+        may set its rows_out.
+    """
+    collector = _collector
+    if collector is None or name in collector.active:
+        yield None
+        return
+
+    total = collector.stages.setdefault(name, StageStats())
+    call = StageStats(calls=1, rows_in=rows_in)
+    collector.active.append(name)
+    queries = collector.queries
+    start = time.perf_counter()
+    try:
+        yield call
+    finally:
+        call.seconds = time.perf_counter() - start
+        call.queries = collector.queries - queries
+        collector.active.pop()
+        total.add(call)
+
+
+class _Counter:
+    """Iterator passing items through from an iterable, counting them.
+    """
+
+    __slots__ = ("iterator", "count")
+
+    def __init__(self, iterable: Iterable) -> None:
+        self.iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self) -> "_Counter":
+        return self
+
+    def __next__(self) -> Any:
+        item = next(self.iterator)
+        self.count += 1
+        return item
+
+
+def stage(name: str, rows: Optional[str] = None) -> Callable:
+    """Decorator measuring calls to a function as a stage.
+
+    Rows out are the length of the function's return value if it's a list or
+    tuple, else 1 (or 0 for None).
+
+    Args:
+        name: stage name.
+        rows: name of the function's parameter holding input rows, if any, to count
+              rows in.  While measuring, an iterator passed there is wrapped to count
+              the items the function reads from it by the time it returns.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _collector is None:
+                return func(*args, **kwargs)
+
+            rows_in = 0
+            counter = None
+            if rows is not None:
+                bound = signature.bind(*args, **kwargs)
+                value = bound.arguments[rows]
+                if isinstance(value, (list, tuple)):
+                    rows_in = len(value)
+                else:
+                    counter = bound.arguments[rows] = _Counter(value)
+                args, kwargs = bound.args, bound.kwargs
+
+            with measure(name, rows_in) as call:
+                try:
+                    result = func(*args, **kwargs)
+                finally:
+                    if call is not None and counter is not None:
+                        call.rows_in = counter.count
+                if call is not None:
+                    call.rows_out = (
+                        len(result)
+                        if isinstance(result, (list, tuple))
+                        else int(result is not None)
+                    )
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def collected(
+    func: Callable, *args, **kwargs
+) -> Tuple[Any, Dict[str, StageStats]]:
+    """Call a function under a new Collector, e.g. in a worker process.
+
+    Returns:
+        (function result, Collector.stages)
+    """
+    with Collector() as collector:
+        result = func(*args, **kwargs)
+    return result, collector.stages
@@ -4,3 +4,4 @@ from .api import *
 from .predicates import *
 from .sortkeys import *
 from .functions import *
+from .harvest import *
@@ -0,0 +1,144 @@
+# coding: utf-8
+"""Scan a Portfolio for Lots that could be sold to realize a capital loss.
+
+Given a market price for each Security, every open Lot in the Portfolio is valued at
+once.  Lot attributes are gathered into columns (units, cost, market price, holding
+period start), and the arithmetic is done column-wise across the whole Portfolio
+rather than by walking positions Lot by Lot.
+
+Harvesting a loss is undone by a wash sale, i.e. acquiring substantially identical
+securities within 30 days before or after the sale.  Candidates are flagged where some
+other Lot of the same Security (in any account) was acquired within that window
+before the valuation date.
+"""
+
+__all__ = ["WASH_SALE_WINDOW", "HarvestCandidate", "Harvest", "scan_losses"]
+
+
+# stdlib imports
+from collections import Counter
+from decimal import Decimal
+import datetime as _datetime
+import heapq
+import itertools
+import operator
+from typing import Any, Tuple, List, NamedTuple, Mapping, Optional
+
+
+# local imports
+from capgains import utils
+from .types import Lot
+from .api import PortfolioType
+
+
+WASH_SALE_WINDOW = _datetime.timedelta(days=30)
+
+
+class HarvestCandidate(NamedTuple):
+    """An open Lot whose sale at market would realize a loss.
+
+    Attributes:
+        pocket: (FI account, security) holding the Lot.
+        lot: the Lot instance.
+        loss: amount of loss that would be realized (positive number).
+        longterm: if True, the loss would receive long-term treatment.
+        washsale: if True, a recent acquisition of the same security would cause
+                  the loss to be disallowed as a wash sale.
+    """
+
+    pocket: Tuple[Any, Any]
+    lot: Lot
+    loss: Decimal
+    longterm: bool
+    washsale: bool
+
+
+class Harvest(NamedTuple):
+    """Result of scan_losses().
+
+    Attributes:
+        shortterm: short-term loss candidates, largest loss first.
+        longterm: long-term loss candidates, largest loss first.
+    """
+
+    shortterm: List[HarvestCandidate]
+    longterm: List[HarvestCandidate]
+
+
+def scan_losses(
+    portfolio: PortfolioType,
+    prices: Mapping[Any, Decimal],
+    asof: _datetime.datetime,
+    limit: Optional[int] = None,
+) -> Harvest:
+    """Find the open Lots with the largest harvestable losses.
+
+    Note:
+        Prices are assumed to be denominated in the same currency as the Lots.
+        Pockets whose Security has no price are skipped.
+
+    Args:
+        portfolio: a mapping of (FiAccount, Security) to a sequence of Lot instances.
+        prices: map of Security (as used in Portfolio keys) to market price.
+        asof: valuation date/time, i.e. when the Lots would be sold.
+        limit: if set, return at most this many candidates of each character.
+
+    Returns:
+        Harvest instance holding short-term & long-term candidates.
+    """
+    pockets: List[Tuple[Any, Any]] = []
+    lots: List[Lot] = []
+    marks: List[Decimal] = []
+    for pocket, position in portfolio.items():
+        mark = prices.get(pocket[1])
+        if mark is None:
+            continue
+        pockets.extend(itertools.repeat(pocket, len(position)))
+        lots.extend(position)
+        marks.extend(itertools.repeat(mark, len(position)))
+
+    units = [lot.units for lot in lots]
+    opendts = [lot.opentransaction.datetime for lot in lots]
+    spreads = map(operator.sub, marks, (lot.price for lot in lots))
+    gains = list(map(operator.mul, units, spreads))
+    longterms = list(
+        map(utils.realize_longterm, units, opendts, itertools.repeat(asof))
+    )
+
+    #  Long Lots acquired within the wash sale window, counted by Security
+    #  across all accounts.
+    window_start = asof - WASH_SALE_WINDOW
+    recents = [
+        unit > 0 and window_start <= opendt <= asof
+        for unit, opendt in zip(units, opendts)
+    ]
+    recent_counts = Counter(
+        pocket[1] for pocket, recent in zip(pockets, recents) if recent
+    )
+    #  A Lot's own acquisition doesn't wash its own sale.
+    washsales = [
+        recent_counts[pocket[1]] - recent > 0
+        for pocket, recent in zip(pockets, recents)
+    ]
+
+    losers = [index for index, gain in enumerate(gains) if gain < 0]
+    shortterm = [index for index in losers if not longterms[index]]
+    longterm = [index for index in losers if longterms[index]]
+
+    def rank(indices: List[int]) -> List[HarvestCandidate]:
+        if limit is None:
+            ranked = sorted(indices, key=gains.__getitem__)
+        else:
+            ranked = heapq.nsmallest(limit, indices, key=gains.__getitem__)
+        return [
+            HarvestCandidate(
+                pocket=pockets[index],
+                lot=lots[index],
+                loss=-gains[index],
+                longterm=longterms[index],
+                washsale=washsales[index],
+            )
+            for index in ranked
+        ]
+
+    return Harvest(shortterm=rank(shortterm), longterm=rank(longterm))
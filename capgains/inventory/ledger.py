@@ -0,0 +1,448 @@
+# coding: utf-8
+"""Book Transactions incrementally into inventory persisted in the database.
+
+Booking results (Lots and Gains) are stored in the `lot` and `gain` tables
+(models.Lot, models.Gain), and each Transaction is flagged once it's been booked.
+Booking newly imported Transactions then starts from the stored open Lots, rather
+than replaying the whole Transaction history.
+
+Lots are immutable, so the persisted inventory mirrors inventory.api: a Lot changed
+by a Transaction is stored as a new row.  Rows realized by a Gain are kept for the
+Gain to refer to; superseded rows that no Gain refers to are deleted.  The open Lots
+are therefore the rows that no Gain refers to.
+
+Transactions must be booked in order.  If an unbooked Transaction sorts before the
+latest booked Transaction (e.g. after backfilling history), the persisted inventory
+is discarded and rebuilt from the beginning.
+
+Booked Gains for any period can be read back with Ledger.gains(), which selects them
+by realizing Transaction date through the indexes on gain.transaction_id and
+transaction.datetime.
+
+Consolidated reports (cf. report.consolidate_lots(), report.consolidate_gains()) are
+summed by the database: Ledger.consolidate_lots() and Ledger.consolidate_gains() only
+bring back one row per group.  Gains that need translation to functional currency
+are the exception; they're flattened & translated in Python, then added in.  Sums use
+Decimal arithmetic even on SQLite (cf. database.numeric_sum()), so they match the
+Python path exactly.
+"""
+
+__all__ = ["Ledger"]
+
+
+# stdlib imports
+import datetime as _datetime
+import itertools
+from decimal import Decimal
+from typing import Any, Dict, List, Tuple
+
+
+# 3rd party imports
+import sqlalchemy
+from sqlalchemy import and_, or_, not_, exists, func, tuple_
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+
+
+# local imports
+from capgains import models
+from capgains.database import numeric_sum, numeric_mul
+from . import report
+from .types import Lot, Gain
+from .api import Portfolio
+
+
+class Ledger:
+    """Books Transactions into the lot & gain tables; reads them back.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        chunksize: # of Transactions booked between writes to the DB.
+    """
+
+    def __init__(self, session: sqlalchemy.orm.session.Session, chunksize: int = 1000):
+        self.session = session
+        self.chunksize = chunksize
+        #  Open Lots persisted so far, keyed by id() of the Lot instance in the
+        #  Portfolio being booked.  Values hold a reference to the Lot, keeping its
+        #  id() from being reused.
+        self._open: Dict[int, Tuple[Lot, int]] = {}
+
+    def book(self, rebuild: bool = False) -> int:
+        """Book all unbooked Transactions against the persisted open Lots.
+
+        Args:
+            rebuild: if True, discard persisted inventory and book all Transactions
+                     from the beginning.
+
+        Returns:
+            # of Transactions booked.
+        """
+        if rebuild or self.backdated():
+            self.clear()
+
+        session = self.session
+        portfolio = self._load_portfolio()
+
+        Transaction = models.Transaction
+        query = (
+            session.query(Transaction)
+            .filter(Transaction.booked == sqlalchemy.false())
+            .order_by(Transaction.datetime, Transaction.type, Transaction.uniqueid)
+            .options(
+                selectinload(Transaction.fiaccount),
+                selectinload(Transaction.security),
+                selectinload(Transaction.fromfiaccount),
+                selectinload(Transaction.fromsecurity),
+            )
+            .limit(self.chunksize)
+        )
+
+        count = 0
+        while True:
+            transactions = query.all()
+            if not transactions:
+                break
+
+            gains: List[Gain] = []
+            for transaction in transactions:
+                gains.extend(portfolio.book(transaction))
+                transaction.booked = True
+
+            self._write(portfolio, gains)
+            #  Lots keep references to their Transactions, but only their ids are
+            #  written to the DB from here on.
+            for transaction in transactions:
+                session.expunge(transaction)
+            count += len(transactions)
+
+        return count
+
+    def backdated(self) -> bool:
+        """Return True if some unbooked Transaction sorts before the latest booked one.
+        """
+        Transaction = models.Transaction
+        key = (Transaction.datetime, Transaction.type, Transaction.uniqueid)
+        latest = (
+            self.session.query(*key)
+            .filter(Transaction.booked == sqlalchemy.true())
+            .order_by(*(column.desc() for column in key))
+            .first()
+        )
+        if latest is None:
+            return False
+
+        latest = tuple_(
+            *(
+                sqlalchemy.literal(value, column.type)
+                for column, value in zip(key, latest)
+            )
+        )
+        return self.session.query(
+            exists().where(
+                and_(Transaction.booked == sqlalchemy.false(), tuple_(*key) < latest)
+            )
+        ).scalar()
+
+    def clear(self) -> None:
+        """Delete all persisted Lots & Gains; mark all Transactions unbooked.
+        """
+        session = self.session
+        session.query(models.Gain).delete(synchronize_session=False)
+        session.query(models.Lot).delete(synchronize_session=False)
+        session.query(models.Transaction).update(
+            {models.Transaction.booked: False}, synchronize_session=False
+        )
+        self._open = {}
+
+    def portfolio(self) -> Portfolio:
+        """Return the persisted open Lots as a Portfolio.
+        """
+        portfolio = Portfolio()
+        for row in self._query_open():
+            portfolio[(row.fiaccount, row.security)].append(make_lot(row))
+        return portfolio
+
+    def gains(
+        self, dtstart: _datetime.datetime, dtend: _datetime.datetime, *criteria
+    ) -> List[Gain]:
+        """Return persisted Gains realized during a period.
+
+        Args:
+            dtstart: return Gains realized on/after this date/time.
+            dtend: return Gains realized before this date/time.
+            criteria: additional SQL filter criteria on models.Gain, models.Lot
+                      or models.Transaction (realizing Transaction).
+
+        Returns:
+            Gain instances, ordered by realizing Transaction as booked.
+        """
+        Gain_, Lot_, Transaction = models.Gain, models.Lot, models.Transaction
+        query = (
+            self.session.query(Gain_)
+            .join(Gain_.transaction)
+            .join(Gain_.lot)
+            .filter(Transaction.datetime >= dtstart, Transaction.datetime < dtend)
+            .filter(*criteria)
+            .order_by(
+                Transaction.datetime, Transaction.type, Transaction.uniqueid, Gain_.id
+            )
+            .options(
+                contains_eager(Gain_.transaction),
+                contains_eager(Gain_.lot).joinedload(Lot_.opentransaction),
+                contains_eager(Gain_.lot).joinedload(Lot_.createtransaction),
+            )
+        )
+        return [
+            Gain(lot=make_lot(row.lot), transaction=row.transaction, price=row.price)
+            for row in query
+        ]
+
+    def consolidate_lots(self) -> List[report.FlatLot]:
+        """Sum persisted open Lots by (account, security) in the database.
+
+        Returns:
+            Same as report.consolidate_lots() applied to each position of
+            portfolio(), in order of first Lot.
+        """
+        Lot_ = models.Lot
+        rows = (
+            self.session.query(
+                Lot_.fiaccount_id,
+                Lot_.security_id,
+                Lot_.currency,
+                numeric_sum(Lot_.units),
+                numeric_sum(numeric_mul(Lot_.units, Lot_.price)),
+            )
+            .filter(~Lot_.gains.any())
+            .group_by(Lot_.fiaccount_id, Lot_.security_id, Lot_.currency)
+            .order_by(func.min(Lot_.id))
+            .all()
+        )
+        accounts = self._load(models.FiAccount, {row[0] for row in rows})
+        securities = self._load(models.Security, {row[1] for row in rows})
+
+        flatlots = []
+        for fiaccount_id, security_id, currency, units, cost in rows:
+            account, security = accounts[fiaccount_id], securities[security_id]
+            flatlots.append(
+                report.FlatLot(
+                    brokerid=account.fi.brokerid,
+                    acctid=account.number,
+                    ticker=security.ticker,
+                    secname=security.name,
+                    opendt=None,
+                    opentxid=None,
+                    units=units,
+                    cost=cost,
+                    currency=currency,
+                    **{secid.uniqueidtype: secid.uniqueid for secid in security.ids},
+                )
+            )
+        return flatlots
+
+    def consolidate_gains(
+        self, dtstart: _datetime.datetime, dtend: _datetime.datetime
+    ) -> List[report.FlatGain]:
+        """Sum persisted Gains realized during a period by (account, security).
+
+        Gains whose Lot & realizing Transaction are both denominated in functional
+        currency are summed in the database; the rest are translated in Python.
+
+        Args:
+            dtstart: sum Gains realized on/after this date/time.
+            dtend: sum Gains realized before this date/time.
+
+        Returns:
+            Same as report.consolidate_gains() applied to gains(), in order of
+            first Gain.
+        """
+        Gain_, Lot_, Transaction = models.Gain, models.Lot, models.Transaction
+        functional = and_(
+            Lot_.currency == report.FUNCTIONAL_CURRENCY,
+            or_(
+                Transaction.currency.is_(None),
+                Transaction.currency == report.FUNCTIONAL_CURRENCY,
+            ),
+        )
+        rows = (
+            self.session.query(
+                Transaction.fiaccount_id,
+                Transaction.security_id,
+                func.min(Transaction.datetime),
+                numeric_sum(Lot_.units),
+                numeric_sum(numeric_mul(Lot_.units, Gain_.price)),
+                numeric_sum(numeric_mul(Lot_.units, Lot_.price)),
+            )
+            .select_from(Gain_)
+            .join(Gain_.transaction)
+            .join(Gain_.lot)
+            .filter(Transaction.datetime >= dtstart, Transaction.datetime < dtend)
+            .filter(functional)
+            .group_by(Transaction.fiaccount_id, Transaction.security_id)
+        )
+        totals = {
+            (fiaccount_id, security_id): (dtfirst, units, proceeds, cost)
+            for fiaccount_id, security_id, dtfirst, units, proceeds, cost in rows
+        }
+
+        for gain in self.gains(dtstart, dtend, not_(functional)):
+            flatgain = report.flatten_gain(self.session, gain)
+            transaction = gain.transaction
+            key = (transaction.fiaccount_id, transaction.security_id)
+            dtfirst, units, proceeds, cost = totals.get(
+                key, (transaction.datetime, Decimal(0), Decimal(0), Decimal(0))
+            )
+            totals[key] = (
+                min(dtfirst, transaction.datetime),
+                units + flatgain.units,
+                proceeds + flatgain.proceeds,
+                cost + flatgain.cost,
+            )
+
+        securities = self._load(models.Security, {key[1] for key in totals})
+        return [
+            report.FlatGain(
+                brokerid=None,
+                acctid=None,
+                ticker=securities[security_id].ticker,
+                secname=securities[security_id].name,
+                opendt=None,
+                opentxid=None,
+                gaindt=None,
+                gaintxid=None,
+                units=units,
+                proceeds=proceeds,
+                cost=cost,
+                currency=report.FUNCTIONAL_CURRENCY,
+                longterm=None,
+                disallowed=None,
+            )
+            for (fiaccount_id, security_id), (dtfirst, units, proceeds, cost) in sorted(
+                totals.items(), key=lambda item: item[1][0]
+            )
+        ]
+
+    def _load(self, model, ids) -> Dict[int, Any]:
+        """Map ids to FiAccount/Security instances, with what reports need loaded.
+        """
+        if model is models.FiAccount:
+            option = joinedload(models.FiAccount.fi)
+        else:
+            option = selectinload(models.Security.ids)
+        instances = {}
+        ids = sorted(ids)
+        for start in range(0, len(ids), models.MAX_BOUND_PARAMETERS):
+            chunk = ids[start:start + models.MAX_BOUND_PARAMETERS]
+            for instance in (
+                self.session.query(model).filter(model.id.in_(chunk)).options(option)
+            ):
+                instances[instance.id] = instance
+        return instances
+
+    def _query_open(self):
+        Lot_ = models.Lot
+        return (
+            self.session.query(Lot_)
+            .filter(~Lot_.gains.any())
+            .order_by(Lot_.id)
+            .options(
+                joinedload(Lot_.fiaccount),
+                joinedload(Lot_.security),
+                joinedload(Lot_.opentransaction),
+                joinedload(Lot_.createtransaction),
+            )
+        )
+
+    def _load_portfolio(self) -> Portfolio:
+        """Load persisted open Lots to book against, remembering their rows.
+        """
+        portfolio = Portfolio()
+        self._open = {}
+        for row in self._query_open():
+            lot = make_lot(row)
+            portfolio[(row.fiaccount, row.security)].append(lot)
+            self._open[id(lot)] = (lot, row.id)
+        return portfolio
+
+    def _write(self, portfolio: Portfolio, gains: List[Gain]) -> None:
+        """Persist changes to open Lots, and new Gains, since the last write.
+        """
+        session = self.session
+
+        held = {
+            id(lot): (pocket, lot)
+            for pocket, position in portfolio.items()
+            for lot in position
+        }
+        #  A realized Lot has already left its pocket, which is the pocket of the
+        #  realizing Transaction.
+        realized = {}
+        for gain in gains:
+            transaction = gain.transaction
+            pocket = (transaction.fiaccount, transaction.security)
+            realized[id(gain.lot)] = (pocket, gain.lot)
+
+        new: Dict[int, Tuple[Lot, models.Lot]] = {}
+        for key, (pocket, lot) in itertools.chain(held.items(), realized.items()):
+            if key not in self._open and key not in new:
+                new[key] = (lot, make_row(pocket, lot))
+        session.add_all(row for lot, row in new.values())
+        session.flush()
+
+        rowids = {key: rowid for key, (lot, rowid) in self._open.items()}
+        for key, (lot, row) in new.items():
+            rowids[key] = row.id
+            session.expunge(row)
+
+        session.bulk_insert_mappings(
+            models.Gain,
+            [
+                {
+                    "lot_id": rowids[id(gain.lot)],
+                    "transaction_id": gain.transaction.id,
+                    "price": gain.price,
+                }
+                for gain in gains
+            ],
+        )
+
+        superseded = [
+            rowid
+            for key, (lot, rowid) in self._open.items()
+            if key not in held and key not in realized
+        ]
+        for start in range(0, len(superseded), models.MAX_BOUND_PARAMETERS):
+            chunk = superseded[start:start + models.MAX_BOUND_PARAMETERS]
+            session.query(models.Lot).filter(models.Lot.id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+
+        self._open = {key: (lot, rowids[key]) for key, (pocket, lot) in held.items()}
+        session.flush()
+
+
+def make_lot(row: models.Lot) -> Lot:
+    """Convert a persisted models.Lot to an inventory.types.Lot.
+    """
+    return Lot(
+        opentransaction=row.opentransaction,
+        createtransaction=row.createtransaction,
+        units=row.units,
+        price=row.price,
+        currency=row.currency,
+    )
+
+
+def make_row(pocket: Tuple[Any, Any], lot: Lot) -> models.Lot:
+    """Convert an inventory.types.Lot held in a pocket to a models.Lot.
+    """
+    fiaccount, security = pocket
+    return models.Lot(
+        fiaccount_id=fiaccount.id,
+        security_id=security.id,
+        opentransaction_id=lot.opentransaction.id,
+        createtransaction_id=lot.createtransaction.id,
+        units=lot.units,
+        price=lot.price,
+        currency=lot.currency,
+    )
@@ -0,0 +1,339 @@
+# coding: utf-8
+"""Load Transactions from the database directly as inventory NamedTuples.
+
+Booking doesn't need ORM instances; the NamedTuple transaction types in
+inventory.types implement all the attributes it reads.  load_transactions() runs a
+single joined SQLAlchemy Core SELECT over transactions with their accounts and
+securities, and builds Trade/Split/Transfer/etc. instances straight from result rows.
+
+Accounts & securities are interned as lightweight NamedTuple keys (FiAccountKey,
+SecurityKey) that implement the parts of the models.FiAccount/models.Security
+interface used for booking & reporting (`fi.brokerid`, `number`, `ticker`, `name`,
+`ids`, `id`).  There's exactly one key instance per DB row, so they can be used as
+Portfolio pockets just like ORM instances.
+
+Portfolios holding ORM instances as pocket keys (e.g. loaded from a Lot dumpfile by
+report.unflatten_portfolio()) must be converted by Loader.intern_portfolio() before
+booking loaded Transactions against them.
+"""
+
+__all__ = [
+    "FiKey",
+    "FiAccountKey",
+    "SecurityIdKey",
+    "SecurityKey",
+    "Loader",
+]
+
+
+# stdlib imports
+import datetime as _datetime
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+
+# 3rd party imports
+import sqlalchemy
+from sqlalchemy import select, and_
+
+
+# local imports
+from capgains import models
+from .types import (
+    TransactionType,
+    Trade,
+    ReturnOfCapital,
+    Split,
+    Transfer,
+    Spinoff,
+    Exercise,
+)
+from .api import Portfolio, PortfolioType
+
+
+class FiKey(NamedTuple):
+    """Stand-in for models.Fi.
+    """
+
+    id: int
+    brokerid: str
+    name: Optional[str]
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FiAccountKey(NamedTuple):
+    """Stand-in for models.FiAccount.
+    """
+
+    id: int
+    fi: FiKey
+    number: str
+    name: Optional[str]
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class SecurityIdKey(NamedTuple):
+    """Stand-in for models.SecurityId.
+    """
+
+    uniqueidtype: str
+    uniqueid: str
+
+
+class SecurityKey(NamedTuple):
+    """Stand-in for models.Security.
+    """
+
+    id: int
+    name: Optional[str]
+    ticker: Optional[str]
+    ids: Tuple[SecurityIdKey, ...]
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+#  Transaction columns read from the DB, in order.  Keys for the related accounts &
+#  securities are appended to each row after these.
+TRANSACTION_COLUMNS = (
+    "type",
+    "uniqueid",
+    "datetime",
+    "units",
+    "currency",
+    "cash",
+    "fromunits",
+    "numerator",
+    "denominator",
+    "memo",
+    "dtsettle",
+    "sort",
+    "securityprice",
+    "fromsecurityprice",
+)
+RELATED_ATTRIBUTES = ("fiaccount", "security", "fromfiaccount", "fromsecurity")
+
+
+TRANSACTION_TYPES = {
+    models.TransactionType.TRADE: Trade,
+    models.TransactionType.RETURNCAP: ReturnOfCapital,
+    models.TransactionType.SPLIT: Split,
+    models.TransactionType.TRANSFER: Transfer,
+    models.TransactionType.SPINOFF: Spinoff,
+    models.TransactionType.EXERCISE: Exercise,
+}
+
+
+#  For each NamedTuple type, indices of its fields within a row of
+#  TRANSACTION_COLUMNS + RELATED_ATTRIBUTES.
+FIELD_INDICES = {
+    type_: [
+        (TRANSACTION_COLUMNS + RELATED_ATTRIBUTES).index(field)
+        for field in cls._fields
+    ]
+    for type_, cls in TRANSACTION_TYPES.items()
+}
+
+
+class Loader:
+    """Interns accounts & securities for one report run; loads Transactions.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+    """
+
+    def __init__(self, session: sqlalchemy.orm.session.Session):
+        self.session = session
+        self.fis: Dict[int, FiKey] = {}
+        self.accounts: Dict[int, FiAccountKey] = {}
+        self.securities: Dict[int, SecurityKey] = {}
+        self._securityids: Optional[Dict[int, List[SecurityIdKey]]] = None
+
+    @property
+    def securityids(self) -> Dict[int, List[SecurityIdKey]]:
+        """Map of security_id to all its SecurityIdKeys, read once.
+        """
+        if self._securityids is None:
+            secid = models.SecurityId.__table__
+            securityids: Dict[int, List[SecurityIdKey]] = {}
+            for security_id, uniqueidtype, uniqueid in self.session.execute(
+                select(secid.c.security_id, secid.c.uniqueidtype, secid.c.uniqueid)
+            ):
+                securityids.setdefault(security_id, []).append(
+                    SecurityIdKey(uniqueidtype, uniqueid)
+                )
+            self._securityids = securityids
+        return self._securityids
+
+    def intern_fi(self, id: int, brokerid: str, name: Optional[str]) -> FiKey:
+        fi = self.fis.get(id)
+        if fi is None:
+            fi = self.fis[id] = FiKey(id, brokerid, name)
+        return fi
+
+    def intern_account(
+        self, id: Optional[int], fi: Optional[FiKey], number: str, name: Optional[str]
+    ) -> Optional[FiAccountKey]:
+        if id is None:
+            return None
+        account = self.accounts.get(id)
+        if account is None:
+            assert fi is not None
+            account = self.accounts[id] = FiAccountKey(id, fi, number, name)
+        return account
+
+    def intern_security(
+        self, id: Optional[int], name: Optional[str], ticker: Optional[str]
+    ) -> Optional[SecurityKey]:
+        if id is None:
+            return None
+        security = self.securities.get(id)
+        if security is None:
+            ids = tuple(self.securityids.get(id, ()))
+            security = self.securities[id] = SecurityKey(id, name, ticker, ids)
+        return security
+
+    def intern_portfolio(self, portfolio: PortfolioType) -> Portfolio:
+        """Replace ORM pocket keys (FiAccount, Security) with interned keys.
+
+        Args:
+            portfolio: map of (models.FiAccount, models.Security) to list of Lots,
+                       whose instances have been flushed to the DB.
+        """
+        interned = Portfolio()
+        for (account, security), position in portfolio.items():
+            fi = account.fi
+            pocket = (
+                self.intern_account(
+                    account.id,
+                    self.intern_fi(fi.id, fi.brokerid, fi.name),
+                    account.number,
+                    account.name,
+                ),
+                self.intern_security(security.id, security.name, security.ticker),
+            )
+            interned[pocket].extend(position)
+        return interned
+
+    def load_transactions(
+        self,
+        dtstart: _datetime.datetime,
+        dtend: _datetime.datetime,
+        chunksize: int = 10000,
+    ) -> Iterator[TransactionType]:
+        """Yield Transactions as inventory NamedTuples, in models.Transaction.between()
+        order.
+
+        Args:
+            dtstart: load Transactions occurring on/after this date/time.
+            dtend: load Transactions occurring before this date/time.
+            chunksize: # of rows to fetch from the DB at a time (with a server-side
+                       cursor where the DB supports it), so memory stays flat
+                       however many Transactions are loaded.
+        """
+        transaction = models.Transaction.__table__
+        account = models.FiAccount.__table__.alias("account")
+        fi = models.Fi.__table__.alias("fi")
+        security = models.Security.__table__.alias("security")
+        fromaccount = models.FiAccount.__table__.alias("fromaccount")
+        fromfi = models.Fi.__table__.alias("fromfi")
+        fromsecurity = models.Security.__table__.alias("fromsecurity")
+
+        joins = (
+            transaction.join(account, transaction.c.fiaccount_id == account.c.id)
+            .join(fi, account.c.fi_id == fi.c.id)
+            .join(security, transaction.c.security_id == security.c.id)
+            .outerjoin(
+                fromaccount, transaction.c.fromfiaccount_id == fromaccount.c.id
+            )
+            .outerjoin(fromfi, fromaccount.c.fi_id == fromfi.c.id)
+            .outerjoin(
+                fromsecurity, transaction.c.fromsecurity_id == fromsecurity.c.id
+            )
+        )
+        stmt = (
+            select(
+                *(transaction.c[column] for column in TRANSACTION_COLUMNS),
+                account.c.id,
+                account.c.number,
+                account.c.name,
+                fi.c.id,
+                fi.c.brokerid,
+                fi.c.name,
+                security.c.id,
+                security.c.name,
+                security.c.ticker,
+                fromaccount.c.id,
+                fromaccount.c.number,
+                fromaccount.c.name,
+                fromfi.c.id,
+                fromfi.c.brokerid,
+                fromfi.c.name,
+                fromsecurity.c.id,
+                fromsecurity.c.name,
+                fromsecurity.c.ticker,
+            )
+            .select_from(joins)
+            .where(
+                and_(
+                    transaction.c.datetime >= dtstart,
+                    transaction.c.datetime < dtend,
+                )
+            )
+            .order_by(
+                transaction.c.datetime, transaction.c.type, transaction.c.uniqueid
+            )
+            .execution_options(yield_per=chunksize)
+        )
+
+        ncolumns = len(TRANSACTION_COLUMNS)
+        intern_fi = self.intern_fi
+        intern_account = self.intern_account
+        intern_security = self.intern_security
+        fields = FIELD_INDICES
+        types = TRANSACTION_TYPES
+
+        for row in self.session.execute(stmt):
+            values: List[Any] = list(row[:ncolumns])
+            (
+                acct_id, acct_number, acct_name, fi_id, fi_brokerid, fi_name,
+                sec_id, sec_name, sec_ticker,
+                fromacct_id, fromacct_number, fromacct_name,
+                fromfi_id, fromfi_brokerid, fromfi_name,
+                fromsec_id, fromsec_name, fromsec_ticker,
+            ) = row[ncolumns:]
+
+            values.append(
+                intern_account(
+                    acct_id,
+                    intern_fi(fi_id, fi_brokerid, fi_name),
+                    acct_number,
+                    acct_name,
+                )
+            )
+            values.append(intern_security(sec_id, sec_name, sec_ticker))
+            values.append(
+                intern_account(
+                    fromacct_id,
+                    None
+                    if fromfi_id is None
+                    else intern_fi(fromfi_id, fromfi_brokerid, fromfi_name),
+                    fromacct_number,
+                    fromacct_name,
+                )
+            )
+            values.append(intern_security(fromsec_id, fromsec_name, fromsec_ticker))
+
+            type_ = values[0]
+            yield types[type_]._make([values[index] for index in fields[type_]])
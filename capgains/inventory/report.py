@@ -28,12 +28,19 @@ __all__ = [
     "flatten_lot",
     "unflatten_lot",
     "export_flatlot",
+    "export_flatlots",
     "import_flatlot",
     "flatten_gains",
     "flatten_gain",
     "export_flatgain",
+    "export_flatgains",
     "translate_gain",
     "translate_transaction",
+    "FlatUnrealizedGain",
+    "flatten_unrealized",
+    "mark_to_market",
+    "consolidate_unrealized",
+    "export_flatunrealized",
 ]
 
 # stdlib imports
@@ -41,7 +48,9 @@ from decimal import Decimal
 import datetime as _datetime
 from datetime import date
 import functools
+import itertools
 import operator
+import warnings
 from typing import (
     Any,
     Tuple,
@@ -52,6 +61,8 @@ from typing import (
     Callable,
     Iterable,
     Optional,
+    List,
+    Hashable,
 )
 
 # 3rd part imports
@@ -145,17 +156,30 @@ def flatten_portfolio(
         portfolio: a mapping of (FiAccount, Security) to a sequence of Lot instances.
         consolidate: if True, sum all Lots for each (account, security) position.
     """
+    flatlots = itertools.chain.from_iterable(
+        consolidate_lots(acc, sec, position)
+        if consolidate
+        else (flatten_lot(acc, sec, lot) for lot in position)
+        for (acc, sec), position in portfolio.items()
+    )
+    return export_flatlots(flatlots)
+
+
+def export_flatlots(flatlots: Iterable[FlatLot]) -> tablib.Dataset:
+    """Export FlatLots into tablib.Dataset prepared for serialization.
+
+    Columns are the fields of FlatLot; FlatLots with zero units (after rounding)
+    are omitted.
+
+    Args:
+        flatlots: sequence of fully-populated FlatLot instances.
+    """
     dataset = tablib.Dataset(headers=FlatLot._fields)
-    for (acc, sec), position in portfolio.items():
-        if consolidate:
-            flatlots = consolidate_lots(acc, sec, position)
-        else:
-            flatlots = [flatten_lot(acc, sec, lot) for lot in position]
-        for flatlot in flatlots:
-            row = export_flatlot(flatlot)
-            units = row[6]
-            if units != 0:
-                dataset.append(row)
+    for flatlot in flatlots:
+        row = export_flatlot(flatlot)
+        units = row[6]
+        if units != 0:
+            dataset.append(row)
     return dataset
 
 
@@ -164,21 +188,163 @@ def unflatten_portfolio(
 ) -> inventory.api.Portfolio:
     """Convert a freshly-deserialized tablib.Dataset into a Portfolio.
 
+    All rows are parsed first; the distinct accounts and security identifiers are
+    then resolved with a few set-based queries, rather than merging each row against
+    the DB as unflatten_lot() does.  Missing Fi/FiAccount/Security/SecurityId rows are
+    inserted in one batch, before any Lots are built.
+
     Args:
         session: a sqlalchemy.Session instance bound to a database engine.
         dataset: a tablib.Dataset with headers set to FlatLot._fields,
                  and all values as strings.
     """
+    flatlots = [flatlot for flatlot in map(import_flatlot, dataset) if flatlot.units]
+
+    accounts = _resolve_accounts(
+        session, {(flatlot.brokerid, flatlot.acctid) for flatlot in flatlots}
+    )
+    securities = _resolve_securities(session, flatlots)
+    session.flush()
+
     portfolio = inventory.api.Portfolio()
-    for row in dataset:
-        flatlot = import_flatlot(row)
-        if flatlot.units:
-            account, security, lot = unflatten_lot(session, flatlot)
-            portfolio[(account, security)].append(lot)
+    for flatlot, security in zip(flatlots, securities):
+        account = accounts[(flatlot.brokerid, flatlot.acctid)]
+        portfolio[(account, security)].append(_make_lot(flatlot))
 
     return portfolio
 
 
+def _resolve_accounts(
+    session: sqlalchemy.orm.session.Session, keys: Iterable[Tuple[str, str]]
+) -> MutableMapping[Tuple[str, str], models.FiAccount]:
+    """Map (brokerid, acctid) pairs to FiAccounts, creating any that are missing.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        keys: (brokerid, acctid) pairs.
+    """
+    keys = set(keys)
+    brokerids = {brokerid for brokerid, acctid in keys}
+
+    fis = {
+        fi.brokerid: fi
+        for fi in session.query(models.Fi).filter(models.Fi.brokerid.in_(brokerids))
+    }
+    accounts = {
+        (account.fi.brokerid, account.number): account
+        for account in session.query(models.FiAccount)
+        .join(models.Fi)
+        .options(sqlalchemy.orm.contains_eager(models.FiAccount.fi))
+        .filter(models.Fi.brokerid.in_(brokerids))
+    }
+
+    for brokerid, acctid in keys - accounts.keys():
+        fi = fis.get(brokerid)
+        if fi is None:
+            fi = fis[brokerid] = models.Fi(brokerid=brokerid)
+            session.add(fi)
+        account = accounts[(brokerid, acctid)] = models.FiAccount(fi=fi, number=acctid)
+        session.add(account)
+
+    return accounts
+
+
+def _resolve_securities(
+    session: sqlalchemy.orm.session.Session, flatlots: Sequence[FlatLot]
+) -> List[models.Security]:
+    """Find the Security for each FlatLot, creating any that are missing.
+
+    Matches the semantics of calling models.Security.merge() for each of a FlatLot's
+    unique identifiers in turn (keeping the last result), but looks up all identifiers
+    and tickers with one query apiece.  A blank ticker is taken as NULL; such
+    FlatLots match existing Securities by name, never by ticker alone.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        flatlots: FlatLot instances holding the import()ed Lot data.
+
+    Returns:
+        Securities in the same order as the input FlatLots.
+    """
+    uniqueidtypes = ("CUSIP", "ISIN", "CONID", "TICKER")
+    lot_ids = [
+        [
+            (uniqueidtype, getattr(flatlot, uniqueidtype))
+            for uniqueidtype in uniqueidtypes
+            if getattr(flatlot, uniqueidtype)
+        ]
+        for flatlot in flatlots
+    ]
+    all_ids = set(itertools.chain.from_iterable(lot_ids))
+
+    by_id = {
+        (secid.uniqueidtype, secid.uniqueid): secid.security
+        for secid in session.query(models.SecurityId)
+        .options(sqlalchemy.orm.joinedload(models.SecurityId.security))
+        .filter(models.SecurityId.uniqueid.in_({uniqueid for _, uniqueid in all_ids}))
+        if (secid.uniqueidtype, secid.uniqueid) in all_ids
+    }
+
+    #  Candidates for matching by ticker/name when an identifier is unknown.
+    by_ticker_name: MutableMapping[Tuple, List[models.Security]] = {}
+    by_ticker: MutableMapping[Optional[str], List[models.Security]] = {}
+
+    def register(security: models.Security) -> None:
+        by_ticker_name.setdefault((security.ticker, security.name), []).append(security)
+        by_ticker.setdefault(security.ticker, []).append(security)
+
+    #  CSV doesn't distinguish a blank ticker from a missing one; both are NULL.
+    lot_tickers = [flatlot.ticker or None for flatlot in flatlots]
+    tickers = {
+        ticker
+        for ticker, ids in zip(lot_tickers, lot_ids)
+        if any(id_ not in by_id for id_ in ids)
+    }
+    if tickers:
+        #  IN never matches NULL.
+        criteria = [models.Security.ticker.in_(tickers - {None})]
+        if None in tickers:
+            criteria.append(models.Security.ticker.is_(None))
+        for security in session.query(models.Security).filter(
+            sqlalchemy.or_(*criteria)
+        ):
+            register(security)
+
+    def match(candidates: Optional[List[models.Security]]) -> Optional[models.Security]:
+        if not candidates:
+            return None
+        if len(candidates) > 1:
+            raise sqlalchemy.orm.exc.MultipleResultsFound(
+                f"Multiple securities match: {candidates}"
+            )
+        return candidates[0]
+
+    securities = []
+    for flatlot, ticker, ids in zip(flatlots, lot_tickers, lot_ids):
+        security = None
+        for uniqueidtype, uniqueid in ids:
+            security = by_id.get((uniqueidtype, uniqueid))
+            if security is None:
+                #  Without a ticker, only the name tells securities apart.
+                security = match(by_ticker_name.get((ticker, flatlot.secname)))
+                if security is None and ticker is not None:
+                    security = match(by_ticker.get(ticker))
+                if security is None:
+                    security = models.Security(ticker=ticker, name=flatlot.secname)
+                    session.add(security)
+                    register(security)
+                session.add(
+                    models.SecurityId(
+                        security=security, uniqueidtype=uniqueidtype, uniqueid=uniqueid
+                    )
+                )
+                by_id[(uniqueidtype, uniqueid)] = security
+        assert security is not None
+        securities.append(security)
+
+    return securities
+
+
 def consolidate_lots(
     account: models.FiAccount,
     security: models.Security,
@@ -277,6 +443,27 @@ def unflatten_lot(
     account = models.FiAccount.merge(
         session, brokerid=flatlot.brokerid, number=flatlot.acctid
     )
+    for uniqueidtype in ("CUSIP", "ISIN", "CONID", "TICKER"):
+        uniqueid = getattr(flatlot, uniqueidtype)
+        if uniqueid:
+            security = models.Security.merge(
+                session,
+                uniqueidtype=uniqueidtype,
+                uniqueid=uniqueid,
+                ticker=flatlot.ticker,
+                name=flatlot.secname,
+            )
+
+    return account, security, _make_lot(flatlot)
+
+
+def _make_lot(flatlot: FlatLot) -> inventory.types.Lot:
+    """Construct a Lot (with mock opening Transaction) from a FlatLot.
+
+    Args:
+        flatlot: FlatLot instance holding the import()ed Lot data
+                 (already type-converted from strings).
+    """
     assert flatlot.opentxid is not None
     assert flatlot.opendt is not None
 
@@ -289,19 +476,8 @@ def unflatten_lot(
         type=models.TransactionType.TRADE,
     )
 
-    for uniqueidtype in ("CUSIP", "ISIN", "CONID", "TICKER"):
-        uniqueid = getattr(flatlot, uniqueidtype)
-        if uniqueid:
-            security = models.Security.merge(
-                session,
-                uniqueidtype=uniqueidtype,
-                uniqueid=uniqueid,
-                ticker=flatlot.ticker,
-                name=flatlot.secname,
-            )
-
     assert isinstance(flatlot.currency, models.Currency)
-    lot = inventory.types.Lot(
+    return inventory.types.Lot(
         units=flatlot.units,
         price=flatlot.cost / flatlot.units,
         opentransaction=opentransaction,
@@ -309,8 +485,6 @@ def unflatten_lot(
         currency=flatlot.currency,
     )
 
-    return account, security, lot
-
 
 def export_flatlot(flatlot: FlatLot) -> Tuple:
     """Convert FlatLot into a row (tuple) ready for serialization.
@@ -388,6 +562,18 @@ def flatten_gains(
     else:
         flatgains = (flatten_gain(session, gain) for gain in gains)
 
+    return export_flatgains(flatgains)
+
+
+def export_flatgains(flatgains: Iterable[FlatGain]) -> tablib.Dataset:
+    """Export FlatGains into tablib.Dataset prepared for serialization.
+
+    Columns are the fields of FlatGain; FlatGains with zero units (after rounding)
+    are omitted.
+
+    Args:
+        flatgains: sequence of fully-populated FlatGain instances.
+    """
     rows = (export_flatgain(flatgain) for flatgain in flatgains)
 
     data = tablib.Dataset(headers=FlatGain._fields)
@@ -537,6 +723,225 @@ def export_flatgain(flatgain: FlatGain) -> Tuple:
     return row
 
 
+class FlatUnrealizedGain(NamedTuple):
+    """Un-nested container for unrealized Gain data, suitable for serialization.
+
+    Order of attributes defines column order of serialized data.
+
+    Attributes:
+        brokerid: OFX <FI><BROKERID>.
+        acctid: brokerage account #.
+        ticker: security symbol.
+        secname: security description.
+        opendt: date/time of Lot's opening transaction.
+        opentxid: uniqueid of Lot's opening transaction.
+        units: amount of security comprising the Lot.
+        value: market value of Lot as of the valuation date.
+        cost: cost basis of Lot.
+        gain: unrealized gain (value - cost).
+        currency: denomination of cost basis and market value.
+        longterm: if True, Lot would receive long-term treatment if sold on the
+                  valuation date.
+    """
+
+    brokerid: Optional[str]
+    acctid: Optional[str]
+    ticker: Optional[str]
+    secname: Optional[str]
+    opendt: Optional[_datetime.datetime]
+    opentxid: Optional[str]
+    units: Optional[Decimal]
+    value: Decimal
+    cost: Decimal
+    gain: Decimal
+    currency: models.Currency
+    longterm: Optional[bool]
+
+
+def flatten_unrealized(
+    session: sqlalchemy.orm.Session,
+    portfolio: inventory.api.PortfolioType,
+    asof: date,
+    *,
+    consolidate: Optional[str] = None,
+) -> tablib.Dataset:
+    """Mark a Portfolio to market; return tablib.Dataset prepared for serialization.
+
+    Columns are the fields of FlatUnrealizedGain.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        portfolio: a mapping of (FiAccount, Security) to a sequence of Lot instances.
+        asof: valuation date.
+        consolidate: if None, report each Lot.  If "pocket", sum Lots for each
+                     (account, security) position.  If "character", sum Lots by
+                     holding period (long-term vs. short-term).
+    """
+    flatgains = mark_to_market(session, portfolio, asof)
+    if consolidate:
+        flatgains = consolidate_unrealized(flatgains, by=consolidate)
+
+    data = tablib.Dataset(headers=FlatUnrealizedGain._fields)
+    for flatgain in flatgains:
+        data.append(export_flatunrealized(flatgain))
+    return data
+
+
+def mark_to_market(
+    session: sqlalchemy.orm.Session,
+    portfolio: inventory.api.PortfolioType,
+    asof: date,
+) -> List[FlatUnrealizedGain]:
+    """Compute unrealized gain for every open Lot in a Portfolio.
+
+    Prices for all Securities are fetched by a single as-of query.  Lot data is then
+    gathered into columns and the arithmetic performed column-wise over the whole
+    Portfolio, rather than by walking nested Lot/Transaction references per Lot.
+
+    Lots for which no price is available as of the valuation date are omitted, with
+    a warning.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        portfolio: a mapping of (FiAccount, Security) to a sequence of Lot instances.
+        asof: valuation date.
+    """
+    prices = models.SecurityPrice.as_of(session, asof)
+
+    pockets: List[Tuple[models.FiAccount, models.Security]] = []
+    lots: List[inventory.types.Lot] = []
+    marks: List[models.SecurityPrice] = []
+    unpriced = set()
+    for (account, security), position in portfolio.items():
+        if not position:
+            continue
+        mark = prices.get(security.id)
+        if mark is None:
+            unpriced.add(security)
+            continue
+        for lot in position:
+            pockets.append((account, security))
+            lots.append(lot)
+            marks.append(mark)
+
+    if unpriced:
+        warnings.warn(f"No price as of {asof} for {sorted(unpriced, key=repr)}")
+
+    rates: MutableMapping[Tuple[models.Currency, models.Currency], Decimal] = {}
+
+    def mark_price(mark: models.SecurityPrice, currency: models.Currency) -> Decimal:
+        if mark.currency == currency:
+            return mark.price
+        key = (mark.currency, currency)
+        if key not in rates:
+            rates[key] = models.CurrencyRate.get_rate(
+                session, fromcurrency=mark.currency, tocurrency=currency, date=asof
+            )
+        return mark.price * rates[key]
+
+    currencies = [lot.currency for lot in lots]
+    units = [lot.units for lot in lots]
+    opendts = [lot.opentransaction.datetime for lot in lots]
+    costs = list(map(operator.mul, units, (lot.price for lot in lots)))
+    values = list(map(operator.mul, units, map(mark_price, marks, currencies)))
+    gains = list(map(operator.sub, values, costs))
+    longterms = list(
+        map(utils.realize_longterm, units, opendts, itertools.repeat(asof))
+    )
+
+    return [
+        FlatUnrealizedGain(
+            brokerid=account.fi.brokerid,
+            acctid=account.number,
+            ticker=security.ticker,
+            secname=security.name,
+            opendt=opendt,
+            opentxid=lot.opentransaction.uniqueid,
+            units=units_,
+            value=value,
+            cost=cost,
+            gain=gain,
+            currency=currency,
+            longterm=longterm,
+        )
+        for (account, security), lot, opendt, units_, value, cost, gain, currency,
+        longterm in zip(
+            pockets, lots, opendts, units, values, costs, gains, currencies, longterms
+        )
+    ]
+
+
+def consolidate_unrealized(
+    flatgains: Iterable[FlatUnrealizedGain], by: str = "pocket"
+) -> List[FlatUnrealizedGain]:
+    """Sum unrealized Gains by (account, security) position or by holding period.
+
+    Args:
+        flatgains: sequence of FlatUnrealizedGain instances, one per Lot.
+        by: "pocket" to sum by (account, security); "character" to sum by
+            long-term vs. short-term treatment.
+
+    Raises:
+        ValueError: if `by` isn't one of the above.
+    """
+    keyfuncs: MutableMapping[str, Callable[[FlatUnrealizedGain], Hashable]] = {
+        "pocket": operator.attrgetter(
+            "brokerid", "acctid", "ticker", "secname", "currency"
+        ),
+        "character": operator.attrgetter("longterm", "currency"),
+    }
+    blanks = {
+        "pocket": {"opendt": None, "opentxid": None, "longterm": None},
+        "character": {
+            "brokerid": None,
+            "acctid": None,
+            "ticker": None,
+            "secname": None,
+            "opendt": None,
+            "opentxid": None,
+            "units": None,
+        },
+    }
+    if by not in keyfuncs:
+        raise ValueError(f"Can't consolidate unrealized gains by '{by}'")
+    keyfunc = keyfuncs[by]
+
+    totals: MutableMapping[Hashable, FlatUnrealizedGain] = {}
+    for flatgain in flatgains:
+        key = keyfunc(flatgain)
+        total = totals.get(key)
+        if total is None:
+            totals[key] = flatgain._replace(**blanks[by])
+        else:
+            totals[key] = total._replace(
+                units=None if total.units is None else total.units + flatgain.units,
+                value=total.value + flatgain.value,
+                cost=total.cost + flatgain.cost,
+                gain=total.gain + flatgain.gain,
+            )
+    return list(totals.values())
+
+
+def export_flatunrealized(flatgain: FlatUnrealizedGain) -> Tuple:
+    """Convert FlatUnrealizedGain into a row (tuple) ready for serialization.
+
+    Args:
+        flatgain: fully-populated FlatUnrealizedGain instance.
+    """
+    attrs = flatgain._asdict()
+    units = attrs["units"]
+    attrs.update(
+        {
+            "units": None if units is None else utils.round_decimal(units, power=-2),
+            "value": utils.round_decimal(attrs["value"], power=-2),
+            "cost": utils.round_decimal(attrs["cost"], power=-2),
+            "gain": utils.round_decimal(attrs["gain"], power=-2),
+            "currency": attrs["currency"].name,
+        }
+    )
+    return tuple(attrs.values())
+
+
 FUNCTIONAL_CURRENCY = getattr(models.Currency, CONFIG["books"]["functional_currency"])
 
 
@@ -585,9 +990,10 @@ def translate_gain(
             currency=FUNCTIONAL_CURRENCY,
         )
 
-    gaintx_currency = gaintx.currency or lot.currency
+    # Transaction NamedTuples (e.g. inventory.Exercise) may lack these attributes.
+    gaintx_currency = getattr(gaintx, "currency", None) or lot.currency
     if gaintx_currency != FUNCTIONAL_CURRENCY:
-        dtsettle = gaintx.dtsettle or gaintx.datetime
+        dtsettle = getattr(gaintx, "dtsettle", None) or gaintx.datetime
         date_settle = date(dtsettle.year, dtsettle.month, dtsettle.day)
         exchange_rate = models.CurrencyRate.get_rate(
             session,
@@ -1,31 +1,41 @@
 # coding: utf-8
 """ """
 # stdlib imports
+from collections import defaultdict
+from contextlib import contextmanager
+import datetime as datetime_
 import enum
 import logging
+import warnings
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
 
 # 3rd party imports
+import sqlalchemy
 from sqlalchemy import (
     Column,
     Integer,
+    BigInteger,
     String,
     Text,
     DateTime,
     Date,
-    Numeric,
+    Boolean,
     ForeignKey,
     Enum,
-    and_
+    Index,
+    and_,
+    func,
+    tuple_,
 )
-from sqlalchemy.orm import relationship
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.orm import relationship, joinedload, selectinload
+from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from sqlalchemy.sql.schema import UniqueConstraint, CheckConstraint
 from ofxtools.models.i18n import CURRENCY_CODES
 
 
 # Local imports
-from capgains.database import Base
+from capgains.database import Base, Numeric
 
 
 @enum.unique
@@ -81,8 +91,198 @@ class Mergeable(object):
         session.add(instance)
         return instance
 
+    @classmethod
+    def merge_all(cls, session, records: Sequence[Mapping[str, Any]]) -> List:
+        """Batch version of merge().
+
+        Existing instances are found with one query (per chunk) on the signature
+        columns; the rest are inserted with multi-row INSERT statements, ignoring
+        conflicts with rows inserted concurrently.  Unlike merge(), records sharing
+        a signature within the batch resolve to a single instance.
+
+        Args:
+            session: a sqlalchemy.Session instance bound to a database engine.
+            records: mappings of attributes, as would be passed to merge() as kwargs.
+                     Relationship attributes (e.g. Transaction.fiaccount) may be
+                     given as ORM instances.
+
+        Returns:
+            Persisted instances, in the same order as the input records.
+        """
+        if cls.signature is NotImplemented:
+            raise NotImplementedError
+        if not records:
+            return []
+
+        #  Related instances need primary keys; pending instances must be visible.
+        session.flush()
+
+        mapper = sqlalchemy.inspect(cls)
+        sigkeys = _column_keys(mapper, cls.signature)
+        rows = [_column_values(mapper, record) for record in records]
+        sigs = [tuple(row.get(key) for key in sigkeys) for row in rows]
+
+        found = _lookup_signatures(session, cls, sigkeys, dict.fromkeys(sigs))
+        new = {sig: row for sig, row in zip(sigs, rows) if sig not in found}
+        if new:
+            _insert_ignore(session, cls.__table__, mapper, list(new.values()))
+            #  Rows inserted outside the ORM may reuse primary keys of stale instances
+            #  left in the identity map (e.g. after a SAVEPOINT rollback).
+            found.update(
+                _lookup_signatures(session, cls, sigkeys, new, populate_existing=True)
+            )
+
+        logging.info(
+            "Merged %d %s (%d created)", len(records), cls.__name__, len(new)
+        )
+
+        missing = [sig for sig in sigs if sig not in found]
+        if missing:
+            raise NoResultFound(
+                f"{cls.__name__}.merge_all(): can't find/insert {missing}"
+            )
+        return [found[sig] for sig in sigs]
+
+
+class Tracked(object):
+    """Mixin stamping rows with the date/time they were last inserted or updated.
+
+    Report caches (cf. script.fingerprint_report()) detect changes to a table from
+    its row count, max(id) and max(modified).
+    """
+
+    modified = Column(
+        DateTime,
+        nullable=False,
+        default=datetime_.datetime.now,
+        onupdate=datetime_.datetime.now,
+        comment="Date/time row was last inserted or updated",
+    )
+
+
+#  Bound parameters per statement; SQLite's limit (before v3.32) is the lowest.
+MAX_BOUND_PARAMETERS = 999
+
+
+def _column_keys(mapper, attrs: Sequence[str]) -> Tuple[str, ...]:
+    """Map attribute names to column attribute names, replacing relationships
+    with their local foreign key columns.
+    """
+    keys: List[str] = []
+    for attr in attrs:
+        if attr in mapper.relationships:
+            keys.extend(
+                mapper.get_property_by_column(local).key
+                for local, remote in mapper.relationships[attr].local_remote_pairs
+            )
+        else:
+            keys.append(attr)
+    return tuple(keys)
+
+
+def _column_values(mapper, record: Mapping[str, Any]) -> Dict[str, Any]:
+    """Convert merge() kwargs to column attribute values.
+    """
+    values: Dict[str, Any] = {}
+    for attr, value in record.items():
+        if attr in mapper.relationships:
+            relationship_ = mapper.relationships[attr]
+            for local, remote in relationship_.local_remote_pairs:
+                key = mapper.get_property_by_column(local).key
+                values[key] = (
+                    None
+                    if value is None
+                    else getattr(
+                        value, relationship_.mapper.get_property_by_column(remote).key
+                    )
+                )
+        else:
+            column = mapper.columns[attr]
+            enum_class = getattr(column.type, "enum_class", None)
+            #  Enum columns accept member names; compare signatures as members.
+            if enum_class is not None and isinstance(value, str):
+                value = enum_class.__members__.get(value, value)
+            values[attr] = value
+    return values
+
+
+def _chunks(items: Sequence, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _lookup_signatures(
+    session,
+    cls,
+    sigkeys: Tuple[str, ...],
+    sigs: Mapping[Tuple, Any],
+    populate_existing: bool = False,
+) -> Dict[Tuple, Any]:
+    """Query persisted instances of cls by signature column values.
+    """
+    columns = [getattr(cls, key) for key in sigkeys]
+    found = {}
+    for chunk in _chunks(list(sigs), MAX_BOUND_PARAMETERS // len(columns)):
+        if len(columns) == 1:
+            clause = columns[0].in_([sig[0] for sig in chunk])
+        else:
+            clause = tuple_(*columns).in_(chunk)
+        query = session.query(cls).filter(clause)
+        if populate_existing:
+            query = query.populate_existing()
+        for instance in query:
+            found[tuple(getattr(instance, key) for key in sigkeys)] = instance
+    return found
+
+
+def _column_default(column: sqlalchemy.Column) -> Any:
+    """Evaluate a scalar or (context-free) callable Python-side column default.
+    """
+    default = column.default
+    if default is None:
+        return None
+    if default.is_scalar:
+        return default.arg
+    if default.is_callable:
+        #  sqlalchemy wraps callables to take an execution context.
+        return default.arg(None)
+    return None
+
+
+def _insert_ignore(session, table, mapper, rows: List[Dict[str, Any]]) -> None:
+    """Multi-row INSERT, skipping rows that violate a unique constraint.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING on PostgreSQL and SQLite; other
+    databases get a plain INSERT.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
 
-class Fi(Base, Mergeable):
+        stmt = insert(table).on_conflict_do_nothing()
+    else:
+        stmt = table.insert()
+
+    #  Every row of a multi-row INSERT must bind the same columns; fill in
+    #  column defaults for attributes missing from a row.
+    columns = [column for column in table.columns if not column.primary_key]
+    keys = [mapper.get_property_by_column(column).key for column in columns]
+    values = [
+        {
+            column.key: row[key] if key in row else _column_default(column)
+            for column, key in zip(columns, keys)
+        }
+        for row in rows
+    ]
+    for chunk in _chunks(values, max(MAX_BOUND_PARAMETERS // len(columns), 1)):
+        session.execute(stmt.values(chunk))
+
+
+class Fi(Base, Mergeable, Tracked):
     """A financial institution (e.g. brokerage).
     """
 
@@ -98,8 +298,15 @@ class Fi(Base, Mergeable):
 
     signature = ("brokerid",)
 
+    @classmethod
+    def merge(cls, session, **kwargs):
+        resolver = session.info.get(Resolver.INFO_KEY)
+        if resolver is not None:
+            return resolver.merge_fi(**kwargs)
+        return super(Fi, cls).merge(session, **kwargs)
+
 
-class FiAccount(Base, Mergeable):
+class FiAccount(Base, Mergeable, Tracked):
     """A financial institution (e.g. brokerage) account.
     """
 
@@ -119,6 +326,9 @@ class FiAccount(Base, Mergeable):
 
     @classmethod
     def merge(cls, session, **kwargs):
+        resolver = session.info.get(Resolver.INFO_KEY)
+        if resolver is not None:
+            return resolver.merge_account(**kwargs)
         if "fi" not in kwargs:
             brokerid = kwargs.pop("brokerid")
             kwargs["fi"] = Fi.merge(session, brokerid=brokerid)
@@ -126,7 +336,7 @@ class FiAccount(Base, Mergeable):
         return instance
 
 
-class Security(Base):
+class Security(Base, Tracked):
     """Market-traded security.
     """
 
@@ -148,6 +358,10 @@ class Security(Base):
 
     @classmethod
     def merge(cls, session, uniqueidtype, uniqueid, name=None, ticker=None):
+        resolver = session.info.get(Resolver.INFO_KEY)
+        if resolver is not None:
+            return resolver.merge_security(uniqueidtype, uniqueid, name, ticker)
+
         def matchTickerName(ticker, name):
             sec = (
                 session.query(Security)
@@ -198,7 +412,7 @@ class Security(Base):
         return repr.format(self.id, self.name, self.ticker)
 
 
-class SecurityId(Base):
+class SecurityId(Base, Tracked):
     """Unique identifier for security.
     """
 
@@ -223,6 +437,170 @@ class SecurityId(Base):
         return rp.format(self.id, self.uniqueidtype, self.uniqueid, self.security)
 
 
+class Resolver:
+    """In-memory lookup of Fi/FiAccount/Security instances for an import run.
+
+    All existing rows are loaded once; thereafter Fi.merge(), FiAccount.merge() and
+    Security.merge() are answered from dicts, only touching the DB to insert new
+    instances.  Install it on a session with resolving().
+
+    N.B. the resolver doesn't see rows written by other sessions after it's loaded.
+    """
+
+    INFO_KEY = "capgains.resolver"
+
+    def __init__(self, session):
+        self.session = session
+
+        self.fis = {fi.brokerid: fi for fi in session.query(Fi)}
+        self.accounts = {
+            (account.fi.brokerid, account.number): account
+            for account in session.query(FiAccount).options(joinedload(FiAccount.fi))
+        }
+
+        self.securities_by_id = {}
+        self.securities_by_ticker_name = defaultdict(list)
+        self.securities_by_ticker = defaultdict(list)
+        for security in session.query(Security).options(selectinload(Security.ids)):
+            self._register_security(security)
+            for secid in security.ids:
+                self.securities_by_id[(secid.uniqueidtype, secid.uniqueid)] = security
+
+    def _register_security(self, security):
+        self.securities_by_ticker_name[(security.ticker, security.name)].append(
+            security
+        )
+        self.securities_by_ticker[security.ticker].append(security)
+
+    def merge_fi(self, **kwargs):
+        """Same as Mergeable.merge() for Fi, without querying the DB.
+        """
+        fi = self.fis.get(kwargs["brokerid"])
+        if fi is None:
+            fi = self.fis[kwargs["brokerid"]] = Fi(**kwargs)
+            self.session.add(fi)
+        return fi
+
+    def merge_account(self, **kwargs):
+        """Same as FiAccount.merge(), without querying the DB.
+        """
+        if "fi" not in kwargs:
+            kwargs["fi"] = self.merge_fi(brokerid=kwargs.pop("brokerid"))
+        key = (kwargs["fi"].brokerid, kwargs["number"])
+        account = self.accounts.get(key)
+        if account is None:
+            account = self.accounts[key] = FiAccount(**kwargs)
+            self.session.add(account)
+        return account
+
+    def merge_security(self, uniqueidtype, uniqueid, name=None, ticker=None):
+        """Same as Security.merge(), without querying the DB.
+
+        Raises:
+            MultipleResultsFound: if the security isn't known by uniqueid, and more
+                                  than one security matches by ticker (and name).
+        """
+        security = self.securities_by_id.get((uniqueidtype, uniqueid))
+        if security is not None:
+            return security
+
+        # Matching ticker/name, or else ticker, but different uniqueid
+        # => probably same security.
+        security = self._match(
+            self.securities_by_ticker_name.get((ticker, name))
+        ) or self._match(self.securities_by_ticker.get(ticker))
+        if security is None:
+            security = Security(name=name, ticker=ticker)
+            self.session.add(security)
+            self._register_security(security)
+
+        # Insert a new SecurityId holding the alternate id
+        self.session.add(
+            SecurityId(security=security, uniqueidtype=uniqueidtype, uniqueid=uniqueid)
+        )
+        self.securities_by_id[(uniqueidtype, uniqueid)] = security
+        return security
+
+    @staticmethod
+    def _match(securities):
+        if not securities:
+            return None
+        if len(securities) > 1:
+            raise MultipleResultsFound(f"Multiple securities match: {securities}")
+        return securities[0]
+
+
+@contextmanager
+def resolving(session):
+    """Install a Resolver on the session for the duration of the context.
+
+    If one is already installed (e.g. by an enclosing import run), it's reused.
+    """
+    resolver = session.info.get(Resolver.INFO_KEY)
+    if resolver is not None:
+        yield resolver
+        return
+
+    resolver = session.info[Resolver.INFO_KEY] = Resolver(session)
+    try:
+        yield resolver
+    finally:
+        del session.info[Resolver.INFO_KEY]
+
+
+class SecurityPrice(Base, Mergeable):
+    """Market price for a security on a date.
+    """
+
+    id = Column(Integer, primary_key=True)
+    security_id = Column(
+        Integer,
+        ForeignKey("security.id", onupdate="CASCADE"),
+        nullable=False,
+        comment="FK security.id",
+    )
+    security = relationship("Security", backref="prices")
+    date = Column(Date, nullable=False)
+    price = Column(
+        Numeric,
+        CheckConstraint("price >= 0", name="price_not_negative"),
+        nullable=False,
+        comment="Unit price of security",
+    )
+    currency = Column(
+        CurrencyType, nullable=False, comment="Currency denomination of price"
+    )
+
+    __table_args__ = (
+        UniqueConstraint("security_id", "date"),
+        {"comment": "Market Prices for Securities"},
+    )
+
+    signature = ("security", "date")
+
+    @classmethod
+    def as_of(cls, session, date):
+        """Look up the most recent price on or before a date for every Security.
+
+        All prices are fetched with a single as-of join, rather than a query
+        per Security.
+
+        Returns:
+            Mapping of security_id to SecurityPrice instance.
+        """
+        latest = (
+            session.query(cls.security_id, func.max(cls.date).label("date"))
+            .filter(cls.date <= date)
+            .group_by(cls.security_id)
+            .subquery()
+        )
+        prices = session.query(cls).join(
+            latest,
+            and_(cls.security_id == latest.c.security_id, cls.date == latest.c.date),
+        )
+        return {price.security_id: price for price in prices}
+
+
 #  This unholy mess of a check constraint mimics the API of invventory.types.
 #  The several securities transaction subtypes don't cleanly map even to SQLAlchemy
 #  single-table inheritance scheme, as far as I can tell.  Instead we encode the
@@ -313,7 +691,7 @@ TRANSACTION_CONSTRAINT = (
 )
 
 
-class Transaction(Base, Mergeable):
+class Transaction(Base, Mergeable, Tracked):
     """Securities transaction.
     """
 
@@ -434,9 +812,34 @@ class Transaction(Base, Mergeable):
         CheckConstraint("fromsecurityprice >= 0", name="fromsecurityprice_not_negative"),
         comment="For spinoffs: unit price used to fair-value source security",
     )
+    booked = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=sqlalchemy.false(),
+        comment="Applied to persisted inventory (lot & gain tables)",
+    )
 
     __table_args__ = (
         CheckConstraint(TRANSACTION_CONSTRAINT, name="enforce_subtype_nulls"),
+        #  between(): range filter on datetime, ordered by (datetime, type, uniqueid).
+        Index("ix_transaction_datetime_type_uniqueid", "datetime", "type", "uniqueid"),
+        #  Position history for a pocket.  N.B. merge() signature lookups on
+        #  (fiaccount, uniqueid) are already served by the unique index on uniqueid.
+        Index(
+            "ix_transaction_fiaccount_id_security_id_datetime",
+            "fiaccount_id",
+            "security_id",
+            "datetime",
+        ),
+        #  Transactions not yet booked by inventory.ledger, in booking order.
+        Index(
+            "ix_transaction_booked_datetime_type_uniqueid",
+            "booked",
+            "datetime",
+            "type",
+            "uniqueid",
+        ),
         {"comment": "Securities Transactions"}
     )
 
@@ -445,6 +848,13 @@ class Transaction(Base, Mergeable):
     @classmethod
     def between(cls, session, dtstart, dtend):
         """Convenience method for common query.
+
+        Note:
+            This ORM Query holds every Transaction it returns in the session.  For
+            booking, use inventory.loader.Loader.load_transactions(), which streams
+            the same rows in chunks as inventory NamedTuples.  (It superseded
+            Transaction.stream(), which streamed this Query in chunks of ORM
+            instances.)
         """
         transactions = (
             session.query(cls)
@@ -463,7 +873,97 @@ class Transaction(Base, Mergeable):
         return transactions
 
 
-class CurrencyRate(Base, Mergeable):
+class Lot(Base):
+    """Persisted inventory.types.Lot, booked by inventory.ledger.
+
+    Lots are immutable; a Lot changed by booking a Transaction is replaced by a new
+    row.  Rows realized by a Gain are kept for reference by the Gain; rows no longer
+    held and not referenced by any Gain are deleted.  So the open Lots are exactly
+    the rows that no Gain references.
+    """
+
+    id = Column(Integer, primary_key=True)
+    fiaccount_id = Column(
+        Integer,
+        ForeignKey("fiaccount.id", onupdate="CASCADE"),
+        nullable=False,
+        comment="Pocket FI account - FK fiaccount.id",
+    )
+    fiaccount = relationship("FiAccount", backref="lots")
+    security_id = Column(
+        Integer,
+        ForeignKey("security.id", onupdate="CASCADE"),
+        nullable=False,
+        comment="Pocket security - FK security.id",
+    )
+    security = relationship("Security", backref="lots")
+    opentransaction_id = Column(
+        Integer,
+        ForeignKey("transaction.id", onupdate="CASCADE"),
+        nullable=False,
+        comment="Transaction beginning holding period - FK transaction.id",
+    )
+    opentransaction = relationship("Transaction", foreign_keys=[opentransaction_id])
+    createtransaction_id = Column(
+        Integer,
+        ForeignKey("transaction.id", onupdate="CASCADE"),
+        nullable=False,
+        comment="Transaction booking Lot into its pocket - FK transaction.id",
+    )
+    createtransaction = relationship(
+        "Transaction", foreign_keys=[createtransaction_id]
+    )
+    units = Column(
+        Numeric,
+        CheckConstraint("units <> 0", name="units_nonzero"),
+        nullable=False,
+        comment="Amount of security comprising the Lot",
+    )
+    price = Column(
+        Numeric,
+        CheckConstraint("price >= 0", name="price_not_negative"),
+        nullable=False,
+        comment="Per-unit cost basis",
+    )
+    currency = Column(
+        CurrencyType, nullable=False, comment="Currency denomination of price"
+    )
+
+    __table_args__ = (
+        Index("ix_lot_fiaccount_id_security_id", "fiaccount_id", "security_id"),
+        {"comment": "Inventory Lots"},
+    )
+
+
+class Gain(Base):
+    """Persisted inventory.types.Gain, booked by inventory.ledger.
+    """
+
+    id = Column(Integer, primary_key=True)
+    lot_id = Column(
+        Integer,
+        ForeignKey("lot.id", onupdate="CASCADE"),
+        nullable=False,
+        index=True,
+        comment="Lot realized - FK lot.id",
+    )
+    lot = relationship("Lot", backref="gains")
+    transaction_id = Column(
+        Integer,
+        ForeignKey("transaction.id", onupdate="CASCADE"),
+        nullable=False,
+        index=True,
+        comment="Transaction realizing gain - FK transaction.id",
+    )
+    transaction = relationship("Transaction", backref="gains")
+    price = Column(
+        Numeric, nullable=False, comment="Per-unit cash amount of realizing Transaction"
+    )
+
+    __table_args__ = ({"comment": "Realized Gains"},)
+
+
+class CurrencyRate(Base, Mergeable, Tracked):
     """Exchange rate for currency pair.
     """
 
@@ -492,6 +992,55 @@ class CurrencyRate(Base, Mergeable):
 
     signature = ("date", "fromcurrency", "tocurrency")
 
+    @classmethod
+    def merge_rates(cls, session, records: Iterable[Mapping[str, Any]]) -> int:
+        """Bulk version of merge() for a batch of exchange rates.
+
+        Rates are deduplicated by signature in memory; existing rows are found with
+        one query (per chunk), and the rest are inserted with multi-row INSERT
+        statements.  Where a rate disagrees with an earlier rate in the batch or
+        with the persisted rate for the same (date, fromcurrency, tocurrency), the
+        earlier/persisted rate is kept and the conflict is reported with
+        warnings.warn().
+
+        Args:
+            session: a sqlalchemy.Session instance bound to a database engine.
+            records: mappings of `date`, `fromcurrency`, `tocurrency`, `rate`, as
+                     would be passed to merge() as kwargs.  Currencies may be given
+                     as ISO 4217 codes.
+
+        Returns:
+            # of rates inserted.
+        """
+        mapper = sqlalchemy.inspect(cls)
+        rates: Dict[Tuple, Dict[str, Any]] = {}
+        conflicts = []
+        for record in records:
+            row = _column_values(mapper, record)
+            sig = tuple(row[key] for key in cls.signature)
+            kept = rates.setdefault(sig, row)
+            if kept["rate"] != row["rate"]:
+                conflicts.append((sig, kept["rate"], row["rate"]))
+        if not rates:
+            return 0
+
+        #  Pending instances must be visible.
+        session.flush()
+        existing = _lookup_signatures(session, cls, cls.signature, rates)
+        for sig, instance in existing.items():
+            if instance.rate != rates[sig]["rate"]:
+                conflicts.append((sig, instance.rate, rates[sig]["rate"]))
+
+        new = [row for sig, row in rates.items() if sig not in existing]
+        _insert_ignore(session, cls.__table__, mapper, new)
+
+        for (date, fromcurrency, tocurrency), kept, rejected in conflicts:
+            warnings.warn(
+                f"Conflicting {fromcurrency}/{tocurrency} rates for {date}: "
+                f"kept {kept}, ignored {rejected}"
+            )
+        return len(new)
+
     @classmethod
     def get_rate(cls, session, fromcurrency, tocurrency, date):
         """
@@ -529,3 +1078,80 @@ class CurrencyRate(Base, Mergeable):
             rate = 1 / instance.rate
 
         return rate
+
+
+class ImportFile(Base):
+    """Data file imported by script.import_transactions().
+
+    Files are identified by a hash of their contents, so a file that's already been
+    imported can be skipped (under whatever name) without parsing it again.
+    """
+
+    __tablename__ = "import_file"
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(
+        String, nullable=False, unique=True, comment="SHA-256 hex digest of contents"
+    )
+    size = Column(BigInteger, nullable=False, comment="File size in bytes")
+    format = Column(
+        String, nullable=False, comment="Import format (file extension e.g. ofx, xml)"
+    )
+    brokerid = Column(
+        String, comment="OFX <INVACCTFROM><BROKERID> of imported transactions' FIs"
+    )
+    path = Column(String, comment="Filesystem path as last imported")
+    transactions = Column(
+        Integer, nullable=False, comment="# of transactions read from file"
+    )
+    dtimported = Column(DateTime, nullable=False, comment="Date/time of last import")
+
+    __table_args__ = ({"comment": "Imported Data Files"},)
+
+    @classmethod
+    def imported(cls, session, digests: Iterable[str]) -> Dict[str, "ImportFile"]:
+        """Look up files already imported, by SHA-256 hex digest.
+
+        Returns:
+            Map of digest to persisted ImportFile, for those digests found.
+        """
+        found = _lookup_signatures(
+            session, cls, ("sha256",), dict.fromkeys((digest,) for digest in digests)
+        )
+        return {digest: instance for (digest,), instance in found.items()}
+
+    @classmethod
+    def record(
+        cls,
+        session,
+        sha256: str,
+        size: int,
+        format: str,
+        path: str,
+        transactions: Sequence["Transaction"],
+    ) -> "ImportFile":
+        """Record a file as imported, replacing any previous record of it.
+
+        Args:
+            session: a sqlalchemy.Session instance bound to a database engine.
+            sha256: hex digest of file contents.
+            size: file size in bytes.
+            format: import format (file extension).
+            path: filesystem path.
+            transactions: Transactions read from the file.
+        """
+        brokerids = {
+            tx.fiaccount.fi.brokerid for tx in transactions if tx.fiaccount is not None
+        }
+        brokerid: Optional[str] = ",".join(sorted(brokerids)) or None
+        instance = session.query(cls).filter_by(sha256=sha256).one_or_none()
+        if instance is None:
+            instance = cls(sha256=sha256)
+            session.add(instance)
+        instance.size = size
+        instance.format = format
+        instance.brokerid = brokerid
+        instance.path = path
+        instance.transactions = len(transactions)
+        instance.dtimported = datetime_.datetime.now()
+        return instance
@@ -1,9 +1,62 @@
+import copyreg
+
 import ofxtools
 
 from . import reader
 
 
+def _rebuild_aggregate(cls, items, state):
+    """Unpickle an ofxtools ``Aggregate`` without calling its ``__init__()``.
+    """
+    aggregate = cls.__new__(cls)
+    if items:
+        list.extend(aggregate, items)
+    aggregate.__dict__.update(state)
+    return aggregate
+
+
+def _reduce_aggregate(aggregate):
+    items = list(aggregate) if isinstance(aggregate, list) else None
+    return _rebuild_aggregate, (type(aggregate), items, vars(aggregate))
+
+
+def _register_aggregates(cls):
+    """Make ``Aggregate`` subclasses picklable.
+
+    By default, pickle looks up ``__reduce_ex__`` & ``__setstate__`` on the
+    instance, which ``Aggregate.__getattr__()`` proxies to subaggregates until it
+    recurses out of stack.  copyreg takes precedence for exact types, so each
+    subclass needs its own registration.
+    """
+    copyreg.pickle(cls, _reduce_aggregate)
+    for subclass in cls.__subclasses__():
+        _register_aggregates(subclass)
+
+
+_register_aggregates(ofxtools.models.base.Aggregate)
+
+
+def parse(source):
+    """Parse & convert an OFX file into an ofxtools ``OFX`` aggregate.
+
+    Doesn't touch the DB, so it's safe to run in a worker process; the converted
+    aggregate pickles (cf. _register_aggregates()) & may be returned from there.
+    """
+    ofxtree = ofxtools.OFXTree()
+    ofxtree.parse(source)
+    return ofxtree.convert()
+
+
 def read(session, source):
+    return read_statements(session, parse(source))
+
+
+def read_statements(session, ofx):
+    """Read/merge an ``OFX`` aggregate returned by ``parse()``.
+
+    Returns:
+        Transactions read from the OFX INVSTMTRS.
+    """
     # Avoid import loop by delaying import until after module initialization
     from capgains.ofx.reader import OfxStatementReader
     from capgains.ofx import ibkr, amtd, etfc, scottrade
@@ -15,10 +68,6 @@ def read(session, source):
         scottrade.BROKERID: scottrade.OfxStatementReader,
     }
 
-    ofxtree = ofxtools.OFXTree()
-    ofxtree.parse(source)
-    ofx = ofxtree.convert()
-
     transactions = []
     for stmt in ofx.statements:
         # We only want INVSTMTRS
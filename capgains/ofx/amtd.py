@@ -9,6 +9,7 @@ import ofxtools
 
 from capgains import ofx, flex, models
 from capgains.containers import GroupedList
+from capgains.instrument import stage
 
 
 BROKERID = "ameritrade.com"
@@ -21,6 +22,7 @@ class OfxStatementReader(ofx.reader.OfxStatementReader):
         """
         return "TRADE CORRECTION" not in transaction.memo
 
+    @stage("doTransfers", rows="transactions")
     def doTransfers(
         self,
         transactions: Iterable[ofx.reader.Transaction],
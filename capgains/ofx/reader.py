@@ -3,6 +3,8 @@
 Creates model instances from OFX downloads.
 """
 # stdlib imports
+from collections import defaultdict, deque
+from contextlib import contextmanager
 from datetime import datetime
 from decimal import Decimal
 import functools
@@ -16,11 +18,14 @@ from typing import (
     Tuple,
     List,
     MutableMapping,
+    Mapping,
     Callable,
     Optional,
     Any,
     Union,
     Iterable,
+    Deque,
+    Dict,
 )
 
 
@@ -31,7 +36,8 @@ import ofxtools
 
 # Local imports
 from capgains import flex, models, utils
-from capgains.containers import GroupedList
+from capgains.containers import LazyGroupedList
+from capgains.instrument import stage
 from capgains.database import Base, sessionmanager
 
 if TYPE_CHECKING:
@@ -95,7 +101,7 @@ class OfxStatementReader(object):
     TRANSACTION_DISPATCHER to group transactions by type and dispatch them to
     appropriate 'do' handler functions - doTrades(), doCashTransactions(), etc.
 
-    The 'do' handlers use containers.GroupedList to define a standard
+    The 'do' handlers use containers.LazyGroupedList to define a standard
     functional processing pipeline.  Cf. containers module for the interface.
     Generally the pipelines filter out noise, then net remaining transactions
     for reversals, cancellations, etc.
@@ -166,6 +172,7 @@ class OfxStatementReader(object):
         self.securities: SecuritiesMap = {}
         self.transactions: List[models.Transaction] = []
 
+    @stage("read")
     def read(
         self,
         session: sqlalchemy.orm.session.Session,
@@ -174,20 +181,21 @@ class OfxStatementReader(object):
         self.session = session
         assert self.statement is not None
 
-        # Set up the rest of the instance attributes needed globally.
-        self.default_currency = self.read_default_currency(self.statement)
-        self.account = self.read_account(self.statement, self.session)
-        self.securities = self.read_securities(self.session)
-
-        if doTransactions:
-            transactions = self.read_transactions(
-                self.statement,
-                session=session,
-                securities=self.securities,
-                account=self.account,
-                default_currency=self.default_currency,
-            )
-            self.transactions.extend(transactions)
+        with models.resolving(session):
+            # Set up the rest of the instance attributes needed globally.
+            self.default_currency = self.read_default_currency(self.statement)
+            self.account = self.read_account(self.statement, self.session)
+            self.securities = self.read_securities(self.session)
+
+            if doTransactions:
+                transactions = self.read_transactions(
+                    self.statement,
+                    session=session,
+                    securities=self.securities,
+                    account=self.account,
+                    default_currency=self.default_currency,
+                )
+                self.transactions.extend(transactions)
 
         return self.transactions
 
@@ -248,6 +256,7 @@ class OfxStatementReader(object):
 
         return securities
 
+    @stage("read_transactions")
     def read_transactions(
         self,
         statement: Statement,
@@ -259,6 +268,12 @@ class OfxStatementReader(object):
         """
         Group parsed statement transaction instances and dispatch groups to
         relevant handler functions
+
+        Each handler runs inside a merge_batch(), so the Transactions it persists
+        via merge_transaction() are merged together once it returns.  The
+        PendingMerge placeholders it gets back from merge_transaction() must
+        only be returned, not inspected; they're replaced with models.Transaction
+        instances before the next handler is dispatched.
         """
         assert statement is not None
 
@@ -274,14 +289,17 @@ class OfxStatementReader(object):
         for handler, transactions_ in itertools.groupby(
             statement.transactions, key=self.dispatch_transaction
         ):
-            txs = handler(
-                transactions_,
-                session,
-                securities,
-                account,
-                default_currency,
-            ) if handler else []
-            transactions.extend(txs)
+            if handler is None:
+                continue
+            with merge_batch(session) as batch:
+                txs = handler(
+                    transactions_,
+                    session,
+                    securities,
+                    account,
+                    default_currency,
+                )
+            transactions.extend(batch.resolve(session, txs))
 
         return transactions
 
@@ -314,6 +332,7 @@ class OfxStatementReader(object):
     ###########################################################################
     # TRADES
     ###########################################################################
+    @stage("doTrades", rows="transactions")
     def doTrades(
         self,
         transactions: Iterable[Trade],
@@ -331,6 +350,8 @@ class OfxStatementReader(object):
             filterfunc=self.is_trade_cancel,
             matchfunc=self.are_trade_cancel_pair,
             sortfunc=self.sort_trades_to_cancel,
+            cancelkey=self.trade_cancel_key,
+            originalkeys=self.trade_cancel_original_keys,
         )
 
         _merge_trade = functools.partial(
@@ -343,7 +364,7 @@ class OfxStatementReader(object):
         )
 
         transactions = (
-            GroupedList(transactions)
+            LazyGroupedList(transactions)
             .filter(self.is_security_trade)
             .groupby(self.fingerprint_trade)
             .bind(apply_cancels)
@@ -384,9 +405,26 @@ class OfxStatementReader(object):
     @staticmethod
     def are_trade_cancel_pair(transaction0: Trade, transaction1: Trade) -> bool:
         """Does one of these trades cancel the other?
+
+        Subclasses overriding this must override trade_cancel_key() and
+        trade_cancel_original_keys() to match.
         """
         return transaction0.units == -1 * transaction1.units
 
+    @staticmethod
+    def trade_cancel_key(transaction: Trade) -> Any:
+        """Hash key for the trade canceled by a trade cancellation; cf.
+        make_canceller().  Must agree with are_trade_cancel_pair().
+        """
+        return ("units", -1 * transaction.units)
+
+    @staticmethod
+    def trade_cancel_original_keys(transaction: Trade) -> Tuple[Any, ...]:
+        """Hash keys by which a trade cancellation may find this trade; cf.
+        make_canceller().  Must agree with are_trade_cancel_pair().
+        """
+        return (("units", transaction.units),)
+
     @staticmethod
     def sort_trades_to_cancel(transaction: Trade) -> Any:
         """Determines order in which trades are canceled.
@@ -407,6 +445,7 @@ class OfxStatementReader(object):
     ###########################################################################
     # CASH TRANSACTIONS
     ###########################################################################
+    @stage("doCashTransactions", rows="transactions")
     def doCashTransactions(
         self,
         transactions: List[CashTransaction],
@@ -432,6 +471,8 @@ class OfxStatementReader(object):
             filterfunc=self.is_cash_cancel,
             matchfunc=lambda x, y: x.total == -1 * y.total,
             sortfunc=self.sort_cash_for_cancel,
+            cancelkey=lambda x: -1 * x.total,
+            originalkeys=lambda y: (y.total,),
         )
 
         _merge_retofcap = functools.partial(
@@ -443,9 +484,10 @@ class OfxStatementReader(object):
         )
 
         transactions_ = (
-            GroupedList(transactions)
+            LazyGroupedList(transactions)
             .filter(self.is_retofcap)
-            .groupby(self.fingerprint_cash)
+            #  Each group is netted independently; order of groups doesn't matter.
+            .groupby(self.fingerprint_cash, sort=False)
             .bind(apply_cancels)
             .reduce(net_cash)
             .filter(operator.attrgetter("total"))  # Removes net $0 transactions
@@ -497,6 +539,7 @@ class OfxStatementReader(object):
     ###########################################################################
     # ACCOUNT TRANSFERS
     ###########################################################################
+    @stage("doTransfers", rows="transactions")
     def doTransfers(
         self,
         transactions: Iterable[Transfer],
@@ -623,6 +666,7 @@ def merge_trade(
     return transaction
 
 
+@stage("merge_transaction")
 def merge_transaction(
     session: sqlalchemy.orm.session.Session,
     **kwargs,
@@ -630,11 +674,78 @@ def merge_transaction(
     """
     Persist a transaction to the database, using merge() logic
     i.e. insert if it doesn't already exist.
+
+    Within a merge_batch() (i.e. when called by a transaction handler dispatched
+    from OfxStatementReader.read_transactions()), the merge is deferred and a
+    PendingMerge placeholder is returned instead of a models.Transaction.
     """
+    batch = session.info.get(MergeBatch.INFO_KEY)
+    if batch is not None and not kwargs["uniqueid"]:
+        #  make_uid() needs primary keys of newly-created accounts/securities.
+        session.flush()
     kwargs["uniqueid"] = kwargs["uniqueid"] or make_uid(**kwargs)
+    if batch is not None:
+        return batch.add(kwargs)
     return models.Transaction.merge(session, **kwargs)
 
 
+class PendingMerge:
+    """Placeholder returned by merge_transaction() while a MergeBatch is active.
+
+    Opaque: it has no models.Transaction attributes.  Pass it along unexamined to
+    MergeBatch.resolve(), which swaps in the merged models.Transaction.
+    """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+class MergeBatch:
+    """Transaction attributes collected for a single models.Transaction.merge_all().
+    """
+
+    INFO_KEY = "capgains.merge_batch"
+
+    def __init__(self) -> None:
+        self.records: List[Mapping[str, Any]] = []
+
+    def add(self, record: Mapping[str, Any]) -> PendingMerge:
+        self.records.append(record)
+        return PendingMerge(len(self.records) - 1)
+
+    @stage("merge_all", rows="transactions")
+    def resolve(
+        self,
+        session: sqlalchemy.orm.session.Session,
+        transactions: Iterable[Any],
+    ) -> List[models.Transaction]:
+        """Merge collected records; replace placeholders with persisted instances.
+        """
+        merged = models.Transaction.merge_all(session, self.records)
+        return [
+            merged[tx.index] if isinstance(tx, PendingMerge) else tx
+            for tx in transactions
+        ]
+
+
+@contextmanager
+def merge_batch(session: sqlalchemy.orm.session.Session):
+    """Defer merge_transaction() calls within this context to a MergeBatch.
+
+    Calls to merge_transaction() return PendingMerge placeholders; the caller
+    passes the processed results through MergeBatch.resolve() on leaving the
+    context, before handing them to any other code.
+    """
+    batch = MergeBatch()
+    session.info[MergeBatch.INFO_KEY] = batch
+    try:
+        yield batch
+    finally:
+        del session.info[MergeBatch.INFO_KEY]
+
+
 ###############################################################################
 # HELPER FUNCTIONS
 ###############################################################################
@@ -642,6 +753,8 @@ def make_canceller(
     filterfunc: Callable[[Any], bool],
     matchfunc: Callable[[Any, Any], bool],
     sortfunc: Callable[[Any], Any],
+    cancelkey: Optional[Callable[[Any], Any]] = None,
+    originalkeys: Optional[Callable[[Any], Iterable[Any]]] = None,
 ) -> Callable[[Iterable], Iterable]:
     """Factory for functions that identify and apply cancelling Transactions,
     e.g. trade cancellations or dividened reversals/reclassifications.
@@ -651,27 +764,61 @@ def make_canceller(
           sortfunc - function consuming Transaction and returning sort key.
                      Used to sort original Transactions, against which matching
                      cancelling transacions will be applied in order.
+          cancelkey - optional function consuming cancelling Transaction and
+                      returning a hashable key, equal to one of the keys from
+                      `originalkeys` of exactly those original Transactions that
+                      `matchfunc` would match.  Cancels are then matched through a
+                      hash lookup instead of a scan of the originals.  Returns None
+                      where no key applies, to fall back to `matchfunc`.
+          originalkeys - function consuming original Transaction and returning
+                         its keys.  Required with `cancelkey`.
     """
+    assert (cancelkey is None) == (originalkeys is None)
 
     def cancel_transactions(transactions):
         originals, cancels = utils.partition(filterfunc, transactions)
         originals = sorted(originals, key=sortfunc)
+        # N.B. must remove canceled transaction from further iterations
+        # to avoid multiple cancels matching the same original, thereby
+        # leaving subsequent original(s) uncanceled when they should be
+        canceled = [False] * len(originals)
+
+        #  FIFO queues of originals' indices per key; canceled originals are
+        #  skipped lazily when they come up in queues for their other keys.
+        queues: Dict[Any, Deque[int]] = defaultdict(deque)
+        if originalkeys is not None:
+            for index, original in enumerate(originals):
+                for key in originalkeys(original):
+                    queues[key].append(index)
+
+        def find_canceled(cancel) -> Optional[int]:
+            key = None if cancelkey is None else cancelkey(cancel)
+            if key is None:
+                return utils.first_true(
+                    (index for index in range(len(originals)) if not canceled[index]),
+                    default=None,
+                    pred=lambda index: matchfunc(cancel, originals[index]),
+                )
 
-        cancels = list(cancels)
+            queue = queues.get(key, deque())
+            while queue:
+                index = queue.popleft()
+                if not canceled[index]:
+                    return index
+            return None
 
         for cancel in cancels:
-            predicate = functools.partial(matchfunc, cancel)
-            canceled = utils.first_true(originals, pred=predicate)
-            if canceled is False:  # first_true() default
+            index = find_canceled(cancel)
+            if index is None:
                 raise ValueError(
                     f"Can't find Transaction canceled by {cancel}"
                     f"\n in {originals}"
                 )
-            # N.B. must remove canceled transaction from further iterations
-            # to avoid multiple cancels matching the same original, thereby
-            # leaving subsequent original(s) uncanceled when they should be
-            originals.remove(canceled)
-        return originals
+            canceled[index] = True
+
+        return [
+            original for original, cancel in zip(originals, canceled) if not cancel
+        ]
 
     return cancel_transactions
 
@@ -5,8 +5,9 @@
 INSTALL
 -------
 q.v. package README.  The package requires Python v3.7+, SQLAlchemy, the Psycopg2
-database adapter, and a running PostgreSQL server.  To import OFX data files, ofxtools
-is required; to import Interactive Brokers Flex XML data files, ibflex is required.
+database adapter, and a running PostgreSQL server (or instead just a SQLite database
+file; see below).  To import OFX data files, ofxtools is required; to import
+Interactive Brokers Flex XML data files, ibflex is required.
 
 CONFIGURE
 ---------
@@ -26,6 +27,21 @@ installation):
     [books]
     functional_currency = USD
 
+To run without a database server, use a SQLite database file instead:
+
+    [db]
+    dialect = sqlite
+    database = /path/to/capgains.db
+
+SQLite connections are tuned by the PRAGMAs in the optional [sqlite] section
+(defaults shown):
+
+    [sqlite]
+    journal_mode = WAL
+    synchronous = NORMAL
+    mmap_size = 268435456
+    cache_size = -65536
+
 PREPARATION
 -----------
 To use this program to report capital gains & ending lots for a period, you will need
@@ -40,6 +56,50 @@ Import the transaction data for the current period, e.g.
 
     python script.py import /path/to/transaction/files/*.ofx
 
+Files are parsed in parallel by a pool of worker processes (one per CPU by default;
+set the number with --jobs/-j), then merged into the database in the order given.
+Workers stream Flex XML files element by element, so memory use is bounded by the
+converted transactions of the largest statement rather than by the whole file.
+
+Imported files are recorded by a hash of their contents, so rerunning the import over
+a directory skips files already imported (even if renamed) without parsing them.
+Pass --force to reimport them anyway.
+
+With --staged/-s, files are read into an in-memory SQLite database preloaded with the
+known accounts & securities, and the new rows are copied into the database in one
+transaction at the end (with COPY on PostgreSQL).  This saves a network round trip per
+query against a remote database, and keeps its locks short; but if any file fails to
+import, none of them are.
+
+Pass --stats to print a summary of where the import spent its time: calls, wall time,
+rows in/out and DB queries for each stage (parse, read, the do* handlers, merge,
+commit).  Stages nest, so e.g. the time for read includes that of doTrades.  Use
+--stats-json for machine-readable output.
+
+Parse results of OFX & Flex XML files (converted ofxtools aggregates & flex.Types
+statements, respectively) are cached under ~/.cache/capgains/parse (size limit set
+by parse_maxsize in the [cache] section of the config file), keyed by file contents
+and parser version; reimporting the same files, e.g. to rebuild the database from
+raw statements, skips parsing them.  Pass --no-cache to reparse.
+
+BOOK
+----
+Book imported transactions into inventory persisted in the database (the lot & gain
+tables), e.g. after each import:
+
+    python script.py book
+
+Only transactions not yet booked are applied, against the stored open lots.  If newly
+imported transactions predate ones already booked, the stored inventory is rebuilt
+from the beginning; pass --rebuild to force this (e.g. after editing transactions).
+
+Pass --ledger to the gains and lots commands to report from the stored inventory
+instead of replaying transactions, e.g.
+
+    python script.py gains --ledger -c -b <first day of period> -e <first day of next period> /path/to/desired/dumpfile.csv
+
+With --consolidate, the totals are summed by the database.
+
 REPORT
 ------
 With a complete transaction database, reporting capital gains looks like:
@@ -54,6 +114,27 @@ If loading from prior period position CSV file:
 
 Instead of granular reporting at the level of individual lots, the above reports can
 be consolidated by security/account by passing the --consolidate/-c option to the CLI.
+
+Gains and lots reports are cached under ~/.cache/capgains (configurable in the [cache]
+section of the config file); rerunning a report whose inputs haven't changed serves
+the cached output.  Pass --no-cache to force recomputation.
+
+To report several consecutive periods (e.g. each month of a year) from a single pass
+over the transaction database, pass the period boundaries to the report command:
+    python script.py report /path/to/output/dir 2018-01-01 2018-02-01 ... 2019-01-01
+
+This writes a gains file and an ending lots file for each period into the directory.
+
+To value open lots at market, first load security prices from CSV files with columns
+date,uniqueidtype,uniqueid,ticker,secname,price,currency:
+    python script.py prices /path/to/price/files/*.csv
+
+then report unrealized gains as of a date, by lot (the default), by pocket
+(account/security) or by character (long-term vs. short-term):
+    python script.py unrealized -d <valuation date> --by pocket /path/to/desired/dumpfile.csv
+
+SUGGESTED REPORTS
+-----------------
 Probably you want a set of reports including:
 
     1) Capital gains by lot
@@ -62,28 +143,46 @@ Probably you want a set of reports including:
 """
 # stdlib imports
 import argparse
+import contextlib
+import functools
+import hashlib
+import importlib.metadata
+import os
+import pickle
 from argparse import ArgumentParser, _SubParsersAction
-from datetime import datetime
-from typing import Tuple, Sequence, Optional
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import (
+    Any, Callable, Deque, Tuple, Sequence, Mapping, Optional, Iterator
+)
 
 # 3rd party imports
 import sqlalchemy
+from sqlalchemy import func
 import tablib
 
 
 # Local imports
-from capgains import models, flex, ofx, CSV, CONFIG
+from capgains import models, flex, ofx, CSV, CONFIG, database
 from capgains.inventory import report
+from capgains.inventory.ledger import Ledger
 from capgains.inventory.api import Portfolio
-from capgains.database import Base, sessionmanager
+from capgains.inventory.loader import Loader
+from capgains.inventory.types import TransactionType
+from capgains.database import sessionmanager, snapshot
+from capgains.staging import staging
+from capgains import instrument
+from capgains.instrument import stage, measure, collected
+from capgains.cache import DiskCache, fingerprint
 
 
 def create_engine():
     """
     """
-    engine = sqlalchemy.create_engine(CONFIG.db_uri)
+    engine = database.make_engine(CONFIG.db_uri, pragmas=CONFIG.sqlite_pragmas)
     # Create table metadata here too
-    Base.metadata.create_all(bind=engine)
+    database.create_schema(engine)
     return engine
 
 
@@ -93,35 +192,301 @@ def drop_all_tables(args):
     Args:
         args: argparse.Namespace instance populated with parsed CLI arguments.
     """
-    engine = sqlalchemy.create_engine(CONFIG.db_uri)
+    engine = database.make_engine(CONFIG.db_uri)
     print("Dropping all tables on {}...".format(CONFIG.db_uri), end=" ")
-    Base.metadata.drop_all(bind=engine)
+    database.drop_schema(engine)
     print("finished.")
 
 
+#: Import stages by file extension: (parse, read).  ``parse(path)`` doesn't touch
+#: the DB & returns something picklable, so it can run in a worker process;
+#: ``read(session, parsed)`` merges the parsed data into the DB.
+IMPORTERS = {
+    "ofx": (ofx.parse, ofx.read_statements),
+    "qfx": (ofx.parse, ofx.read_statements),
+    "xml": (flex.parse, flex.read_statements),
+    "csv": (CSV.parse, CSV.read),
+}
+
+
+def get_importer(path: str) -> Tuple[Callable, Callable]:
+    """Dispatch file according to file extension.
+    """
+    ext = path.split(".")[-1].lower()
+    importer = IMPORTERS.get(ext, None)
+    if importer is None:
+        raise ValueError("Can't import {}: unknown file extension".format(path))
+    return importer
+
+
+@stage("parse")
+def parse_file(
+    path: str, cache: Optional[DiskCache] = None, key: Optional[str] = None
+) -> Any:
+    """Run the parse stage of importing a datafile.  Module-level for pickling.
+
+    Args:
+        path: filesystem path to datafile.
+        cache: if set, DiskCache instance holding pickled parse results.
+        key: cache key for the file (from parse_cache_key()); None skips the cache.
+
+    Returns:
+        Parsed data.
+    """
+    parse, read = get_importer(path)
+    if cache is not None and key is not None:
+        data = cache.get(key)
+        if data is not None:
+            return pickle.loads(data)
+
+    parsed = parse(path)
+
+    if cache is not None and key is not None:
+        cache.set(key, pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL))
+    return parsed
+
+
+def parse_files(
+    paths: Sequence[str],
+    jobs: Optional[int] = None,
+    cache: Optional[DiskCache] = None,
+    keys: Optional[Mapping[str, Optional[str]]] = None,
+) -> Iterator[Any]:
+    """Parse datafiles in a process pool, yielding the results in order of `paths`.
+
+    At most 2 * `jobs` files are parsed ahead of the consumer, so memory stays
+    bounded however many files are passed.
+
+    Args:
+        paths: filesystem paths to datafiles.
+        jobs: number of worker processes (default: CPU count); 1 parses in-process.
+        cache: if set, DiskCache instance holding pickled parse results.
+        keys: map of path to cache key (from parse_cache_key()).
+    """
+    keys = keys or {}
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        for path in paths:
+            yield parse_file(path, cache, keys.get(path))
+        return
+
+    #  Workers measure their parse stage & report back to our Collector.
+    collector = instrument.current()
+
+    def submit(path):
+        if collector is None:
+            return executor.submit(parse_file, path, cache, keys.get(path))
+        return executor.submit(collected, parse_file, path, cache, keys.get(path))
+
+    def result(future):
+        if collector is None:
+            return future.result()
+        parsed, stages = future.result()
+        collector.merge(stages)
+        return parsed
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: Deque[Future] = deque()
+        for path in paths:
+            pending.append(submit(path))
+            if len(pending) >= 2 * jobs:
+                yield result(pending.popleft())
+        while pending:
+            yield result(pending.popleft())
+
+
+#  Bump to invalidate cached parse results when a parse stage's output changes.
+PARSE_CACHE_VERSION = 2
+
+#: Parser distributions by file extension, for file formats whose parse results are
+#: worth caching.  CSV files are read directly from disk at the read stage.
+PARSE_CACHE_PARSERS = {"ofx": "ofxtools", "qfx": "ofxtools", "xml": "ibflex"}
+
+
+def parse_cache(args: argparse.Namespace) -> Optional[DiskCache]:
+    """Return the datafile parse result cache, unless disabled by CLI args.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    if args.nocache:
+        return None
+    return DiskCache(
+        os.path.join(CONFIG.cache_dir, "parse"), CONFIG.parse_cache_maxsize
+    )
+
+
+def parse_cache_key(path: str, sha256: str) -> Optional[str]:
+    """Compute a cache key for a datafile's parse results.
+
+    The key covers the file contents, its format, and the versions of the parser
+    library & of our parse stage.  Returns None for formats that aren't cached.
+
+    Args:
+        path: filesystem path to datafile.
+        sha256: hex digest of the file contents (from hash_file()).
+    """
+    ext = path.split(".")[-1].lower()
+    parser = PARSE_CACHE_PARSERS.get(ext, None)
+    if parser is None:
+        return None
+    return fingerprint(
+        [sha256, ext],
+        [PARSE_CACHE_VERSION, parser, importlib.metadata.version(parser)],
+    )
+
+
+def hash_file(path: str) -> Tuple[str, int]:
+    """Return SHA-256 hex digest & size in bytes of a file's contents.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b""):
+            hasher.update(block)
+            size += len(block)
+    return hasher.hexdigest(), size
+
+
 def import_transactions(args: argparse.Namespace) -> Sequence[models.Transaction]:
     """Import securities transactions from OFX/XML/CSV datafile; persist to DB.
 
+    Datafiles are parsed in parallel worker processes; this process is the single
+    writer, reading/merging the parsed statements into the DB in the order the
+    files were given.
+
+    Each imported file is recorded (by hash of its contents) in the import_file
+    table.  Files already recorded there are skipped without parsing, unless
+    `args.force` is set.
+
+    If `args.staged` is set, datafiles are read into an in-memory staging database
+    (see capgains.staging) instead, and the new rows are copied to the database in a
+    single transaction at the end.
+
+    Parse results of OFX/Flex files are cached on disk by hash of the file contents,
+    so reimporting them (e.g. rebuilding the database) skips parsing; unless
+    `args.nocache` is set.
+
     Args:
         args: argparse.Namespace instance populated with parsed CLI arguments.
     """
+    # Fail fast on unknown file extensions, before spinning up workers.
+    for path in args.file:
+        get_importer(path)
+
     engine = create_engine()
 
+    collector = instrument.Collector() if args.stats else contextlib.nullcontext()
+    with collector:
+        output = _import_transactions(engine, args)
+    if args.stats == "json":
+        print(collector.json())
+    elif args.stats:
+        print(collector.table())
+    return output
+
+
+def _import_transactions(
+    engine: sqlalchemy.engine.Engine, args: argparse.Namespace
+) -> Sequence[models.Transaction]:
     output: list = []
-    EXTMAP = {"ofx": ofx.read, "qfx": ofx.read, "xml": flex.read, "csv": CSV.read}
+    with sessionmanager(bind=engine) as session:
+        digests = {path: hash_file(path) for path in args.file}
+        imported = {} if args.force else models.ImportFile.imported(
+            session, (sha256 for sha256, size in digests.values())
+        )
+        first: dict = {}
+        for path, (sha256, size) in digests.items():
+            if sha256 in imported:
+                print(f"{path} already imported from {imported[sha256].path}; skipping")
+            elif sha256 in first:
+                print(f"{path} is a copy of {first[sha256]}; skipping")
+            else:
+                first[sha256] = path
+        paths = list(first.values())
+
+        cache = parse_cache(args)
+        keys = {path: parse_cache_key(path, digests[path][0]) for path in paths}
+        parsed_files = zip(paths, parse_files(paths, args.jobs, cache, keys))
+
+        if args.staged:
+            with staging(session) as staging_db, models.resolving(staging_db.session):
+                for path, parsed in parsed_files:
+                    parse, read = get_importer(path)
+                    print(path)
+                    transactions = read(staging_db.session, parsed)
+                    staging_db.session.add_all(transactions)
+                    record_import(session, path, digests[path], transactions)
+                with measure("copy"):
+                    output = staging_db.copy()
+            with measure("commit"):
+                session.commit()
+            return output
+
+        with models.resolving(session):
+            for path, parsed in parsed_files:
+                parse, read = get_importer(path)
+                print(path)
+                transactions = read(session, parsed)
+                session.add_all(transactions)
+                record_import(session, path, digests[path], transactions)
+                output.extend(transactions)
+                with measure("commit"):
+                    session.commit()
+    return output
+
+
+def record_import(
+    session: sqlalchemy.orm.session.Session,
+    path: str,
+    digest: Tuple[str, int],
+    transactions: Sequence[models.Transaction],
+) -> models.ImportFile:
+    """Record a datafile in the import_file table.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        path: filesystem path to datafile.
+        digest: (SHA-256 hex digest, size) of file contents, from hash_file().
+        transactions: Transactions read from the datafile.
+    """
+    sha256, size = digest
+    return models.ImportFile.record(
+        session,
+        sha256=sha256,
+        size=size,
+        format=path.split(".")[-1].lower(),
+        path=path,
+        transactions=transactions,
+    )
+
+
+def import_prices(args: argparse.Namespace) -> None:
+    """Import security prices from local CSV price files; persist to DB.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    engine = create_engine()
+
     with sessionmanager(bind=engine) as session:
         for path in args.file:
-            # Dispatch file according to file extension
-            ext = path.split(".")[-1].lower()
-            readfn = EXTMAP.get(ext, None)
-            if readfn is None:
-                raise ValueError("")
             print(path)
-            transactions = readfn(session, path)
-            session.add_all(transactions)
-            output.extend(transactions)
+            with open(path) as csvfile:
+                CSV.local.CsvPriceReader(session, csvfile).read()
             session.commit()
-    return output
+
+
+def book_transactions(args: argparse.Namespace) -> None:
+    """Book unbooked DB transactions into the persisted lot & gain tables.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    engine = create_engine()
+    with sessionmanager(bind=engine) as session:
+        count = Ledger(session).book(rebuild=args.rebuild)
+    print(f"Booked {count} transactions.")
 
 
 def dump_lots(args: argparse.Namespace) -> None:
@@ -131,6 +496,13 @@ def dump_lots(args: argparse.Namespace) -> None:
         args: argparse.Namespace instance populated with parsed CLI arguments.
     """
     engine = create_engine()
+    if args.ledger:
+        if args.dtend:
+            msg = "--ledger reports Lots open after all booked transactions; no --dtend"
+            raise ValueError(msg)
+        dump_ledger(engine, consolidate=args.consolidate, lotdumpfile=args.file)
+        return
+
     dump_csv(
         engine,
         dtstart=args.dtstart,
@@ -139,6 +511,7 @@ def dump_lots(args: argparse.Namespace) -> None:
         consolidate=args.consolidate,
         lotloadfile=args.loadcsv,
         lotdumpfile=args.file,
+        cache=report_cache(args),
     )
 
 
@@ -149,6 +522,16 @@ def dump_gains(args: argparse.Namespace) -> None:
         args: argparse.Namespace instance populated with parsed CLI arguments.
     """
     engine = create_engine()
+    if args.ledger:
+        dump_ledger(
+            engine,
+            dtstart_gains=args.begin,
+            dtend=args.dtend,
+            consolidate=args.consolidate,
+            gaindumpfile=args.file,
+        )
+        return
+
     dump_csv(
         engine,
         dtstart=args.dtstart,
@@ -157,6 +540,7 @@ def dump_gains(args: argparse.Namespace) -> None:
         consolidate=args.consolidate,
         lotloadfile=args.loadcsv,
         gaindumpfile=args.file,
+        cache=report_cache(args),
     )
 
 
@@ -169,8 +553,18 @@ def dump_csv(
     lotloadfile: Optional[str] = None,
     lotdumpfile: Optional[str] = None,
     gaindumpfile: Optional[str] = None,
+    cache: Optional[DiskCache] = None,
 ) -> None:
-    """
+    """Book Transactions to inventory; write Gains and/or ending Lots to disk.
+
+    If a cache is given, outputs are served from it when a previous run had identical
+    inputs (cf. fingerprint_report()); otherwise they're computed and stored there.
+
+    The database is read from a snapshot (cf. database.snapshot()), so concurrent
+    imports neither wait on nor disturb the report.  Accounts/securities created
+    while loading `lotloadfile` aren't persisted.  The snapshot is only opened on a
+    cache miss; the cache is looked up in a separate short read transaction.
+
     Args:
         engine: a sqlalchemy.engine.Engine instance representing a database connection.
         dtstart: book Transactions occurring on/after this date/time
@@ -184,37 +578,346 @@ def dump_csv(
         lotloadfile: if set, path to file holding serialized begin portfolio positions.
         lotdumpfile: if set, path to write file of serialized end portfolio positions.
         gaindumpfile: if set, path to write file of seralized realized gains.
+        cache: if set, DiskCache instance holding report results.
     """
+    dtstart = dtstart or datetime.min
+    dtend = dtend or datetime.max
     dtstart_gains = dtstart_gains or datetime.min
 
-    with sessionmanager(bind=engine) as session:
-        portfolio = load_portfolio(session, lotloadfile)
+    outputs = {"gains": gaindumpfile, "lots": lotdumpfile}
+    outputs = {kind: path for kind, path in outputs.items() if path}
+    fingerprint = functools.partial(
+        fingerprint_report,
+        dtstart=dtstart,
+        dtend=dtend,
+        lotloadfile=lotloadfile,
+        dtstart_gains=dtstart_gains,
+        consolidate=consolidate,
+    )
+
+    if cache is not None:
+        #  Look up the cache in a short read transaction, so a hit never opens
+        #  the (possibly copied) snapshot below.
+        with snapshot(engine) as session:
+            key = fingerprint(session)
+        cached = {kind: cache.get(f"{key}-{kind}") for kind in outputs}
+        if all(data is not None for data in cached.values()):
+            for kind, data in cached.items():
+                with open(outputs[kind], "w") as csvfile:
+                    csvfile.write(data.decode())
+            return
 
-        transactions = models.Transaction.between(
-            session, dtstart=dtstart or datetime.min, dtend=dtend or datetime.max
+    with snapshot(engine, readonly=not lotloadfile) as session:
+        if cache is not None:
+            #  Store results under the key of the data they're computed from, in
+            #  case an import landed since the lookup.
+            key = fingerprint(session)
+
+        portfolio, transactions = load_books(
+            session, lotloadfile, dtstart=dtstart, dtend=dtend
         )
 
-        gains = [portfolio.book(tx) for tx in transactions]
+        # Only keep gains during reporting period
+        gains = []
+        for tx in transactions:
+            gs = portfolio.book(tx)
+            if gaindumpfile and tx.datetime >= dtstart_gains:
+                gains.extend(gs)
 
+        results = {}
         if gaindumpfile:
-            # Flatten nested list; filter for gains during reporting period
-            gains_ = [
-                gain
-                for gs in gains
-                for gain in gs
-                if gain.transaction.datetime >= dtstart_gains
-            ]
-            gains_dataset = report.flatten_gains(session, gains_, consolidate=consolidate)
-            with open(gaindumpfile, "w") as csvfile:
-                csvfile.write(gains_dataset.csv)
+            gains_dataset = report.flatten_gains(session, gains, consolidate=consolidate)
+            results["gains"] = gains_dataset.csv
 
         if lotdumpfile:
             lots_dataset = report.flatten_portfolio(
                 portfolio, consolidate=consolidate
             )
+            results["lots"] = lots_dataset.csv
+
+        for kind, data in results.items():
+            with open(outputs[kind], "w") as csvfile:
+                csvfile.write(data)
+            if cache is not None:
+                cache.set(f"{key}-{kind}", data.encode())
+
+
+def dump_ledger(
+    engine: sqlalchemy.engine,
+    dtstart_gains: Optional[datetime] = None,
+    dtend: Optional[datetime] = None,
+    consolidate: Optional[bool] = False,
+    lotdumpfile: Optional[str] = None,
+    gaindumpfile: Optional[str] = None,
+) -> None:
+    """Write Gains and/or open Lots persisted by the `book` command to disk.
+
+    Nothing is replayed; consolidated reports are summed by the database.
+
+    Args:
+        engine: a sqlalchemy.engine.Engine instance representing a database connection.
+        dtstart_gains: report Gains occurring on or after this date/time
+                       (if None, report all Gains).
+        dtend: report Gains occurring before this date/time
+               (if None, report through end of Gains).
+        consolidate: if True, consolidate output Lots by (FiAccount, Security);
+                     consolidate output Gains by (Security).
+        lotdumpfile: if set, path to write file of serialized open Lots.
+        gaindumpfile: if set, path to write file of seralized realized gains.
+    """
+    dtstart_gains = dtstart_gains or datetime.min
+    dtend = dtend or datetime.max
+
+    with snapshot(engine) as session:
+        ledger = Ledger(session)
+        if gaindumpfile:
+            if consolidate:
+                dataset = report.export_flatgains(
+                    ledger.consolidate_gains(dtstart_gains, dtend)
+                )
+            else:
+                dataset = report.flatten_gains(
+                    session, ledger.gains(dtstart_gains, dtend)
+                )
+            with open(gaindumpfile, "w") as csvfile:
+                csvfile.write(dataset.csv)
+
+        if lotdumpfile:
+            if consolidate:
+                dataset = report.export_flatlots(ledger.consolidate_lots())
+            else:
+                dataset = report.flatten_portfolio(ledger.portfolio())
             with open(lotdumpfile, "w") as csvfile:
+                csvfile.write(dataset.csv)
+
+
+#  Bump to invalidate cached reports when report output changes.
+REPORT_CACHE_VERSION = 1
+
+
+def report_cache(args: argparse.Namespace) -> Optional[DiskCache]:
+    """Return the report result cache, unless disabled by CLI args.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    if args.nocache:
+        return None
+    return DiskCache(
+        os.path.join(CONFIG.cache_dir, "reports"), CONFIG.report_cache_maxsize
+    )
+
+
+def fingerprint_report(
+    session: sqlalchemy.orm.session.Session,
+    dtstart: datetime,
+    dtend: datetime,
+    lotloadfile: Optional[str],
+    **settings,
+) -> str:
+    """Compute a cache key covering every input to a report.
+
+    Inputs are the Transactions in range, the reference data used to
+    flatten/translate Lots & Gains (accounts, securities, currency rates), the
+    contents of the loaded Lot file, the report settings, and FUNCTIONAL_CURRENCY.
+    Tables are summarized by the database (cf. summarize_table()), so no rows are
+    read.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        dtstart: book Transactions occurring on/after this date/time.
+        dtend: book Transactions occurring before this date/time.
+        lotloadfile: if set, path to file holding serialized begin portfolio positions.
+        settings: any other report parameters affecting output.
+    """
+    Transaction = models.Transaction
+    summaries = [
+        summarize_table(
+            session,
+            Transaction,
+            Transaction.datetime >= dtstart,
+            Transaction.datetime < dtend,
+        )
+    ]
+    for model in (
+        models.Fi,
+        models.FiAccount,
+        models.Security,
+        models.SecurityId,
+        models.CurrencyRate,
+    ):
+        summaries.append(summarize_table(session, model))
+
+    def read_lotfile():
+        if lotloadfile:
+            with open(lotloadfile, "rb") as f:
+                yield from iter(functools.partial(f.read, 1024 ** 2), b"")
+
+    params = [
+        REPORT_CACHE_VERSION,
+        report.FUNCTIONAL_CURRENCY,
+        dtstart,
+        dtend,
+        *sorted(settings.items()),
+    ]
+
+    return fingerprint(params, summaries, read_lotfile())
+
+
+def summarize_table(
+    session: sqlalchemy.orm.session.Session, model: Any, *criteria
+) -> Tuple[int, Optional[int], Optional[datetime]]:
+    """Summarize a table's rows as (count, max(id), max(modified)).
+
+    Inserting, deleting or updating rows changes the summary (cf. models.Tracked).
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        model: models.Tracked subclass.
+        criteria: SQL filter criteria selecting rows to summarize.
+    """
+    summary = session.query(
+        func.count(model.id), func.max(model.id), func.max(model.modified)
+    )
+    return tuple(summary.filter(*criteria).one())
+
+
+def dump_reports(args: argparse.Namespace) -> None:
+    """Book DB transactions once; write Gains & ending Lots for each period to disk.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    engine = create_engine()
+    dump_csv_periods(
+        engine,
+        boundaries=args.boundaries,
+        directory=args.dir,
+        dtstart=args.dtstart,
+        consolidate=args.consolidate,
+        lotloadfile=args.loadcsv,
+    )
+
+
+def dump_csv_periods(
+    engine: sqlalchemy.engine,
+    boundaries: Sequence[datetime],
+    directory: str,
+    dtstart: Optional[datetime] = None,
+    consolidate: Optional[bool] = False,
+    lotloadfile: Optional[str] = None,
+) -> None:
+    """Report a series of consecutive periods from a single replay of Transactions.
+
+    Each pair of adjacent boundaries defines a period, which includes its start and
+    excludes its end.  For each period, the Gains realized during the period are
+    written to "gains_<start>_<end>.csv", and the Lots open at the end of the
+    period are written to "lots_<end>.csv", both within the output directory.
+
+    Args:
+        engine: a sqlalchemy.engine.Engine instance representing a database connection.
+        boundaries: period boundary date/times (at least two).
+        directory: path to directory where output files will be written.
+        dtstart: book Transactions occurring on/after this date/time
+                 (if None, book from beginning of Transactions).
+        consolidate: if True, consolidate output Lots by (FiAccount, Security);
+                     consolidate output Gains by (Security).
+        lotloadfile: if set, path to file holding serialized begin portfolio positions.
+
+    Raises:
+        ValueError: if fewer than two boundaries are given.
+    """
+    boundaries = sorted(boundaries)
+    if len(boundaries) < 2:
+        raise ValueError("Need at least 2 boundaries to define a period")
+
+    periods = iter(zip(boundaries[:-1], boundaries[1:]))
+
+    with snapshot(engine, readonly=not lotloadfile) as session:
+        portfolio, transactions = load_books(
+            session, lotloadfile, dtstart=dtstart or datetime.min, dtend=boundaries[-1]
+        )
+
+        def write_period(start: datetime, end: datetime, gains: list) -> None:
+            gains_dataset = report.flatten_gains(session, gains, consolidate=consolidate)
+            path = os.path.join(
+                directory, "gains_{:%Y-%m-%d}_{:%Y-%m-%d}.csv".format(start, end)
+            )
+            with open(path, "w") as csvfile:
+                csvfile.write(gains_dataset.csv)
+
+            lots_dataset = report.flatten_portfolio(portfolio, consolidate=consolidate)
+            path = os.path.join(directory, "lots_{:%Y-%m-%d}.csv".format(end))
+            with open(path, "w") as csvfile:
                 csvfile.write(lots_dataset.csv)
 
+        start, end = next(periods)
+        gains: list = []
+        for transaction in transactions:
+            # Snapshot each period as soon as booking moves past its end.
+            while transaction.datetime >= end:
+                write_period(start, end, gains)
+                gains = []
+                start, end = next(periods)
+
+            gs = portfolio.book(transaction)
+            if transaction.datetime >= start:
+                gains.extend(gs)
+
+        # Periods at the end with no further Transactions
+        write_period(start, end, gains)
+        for start, end in periods:
+            write_period(start, end, [])
+
+
+def dump_unrealized(args: argparse.Namespace) -> None:
+    """Book DB transactions through CLI date; write unrealized Gains to disk.
+
+    Args:
+        args: argparse.Namespace instance populated with parsed CLI arguments.
+    """
+    engine = create_engine()
+    with snapshot(engine, readonly=not args.loadcsv) as session:
+        portfolio, transactions = load_books(
+            session,
+            args.loadcsv,
+            dtstart=args.dtstart or datetime.min,
+            dtend=args.asof + timedelta(days=1),
+        )
+        for transaction in transactions:
+            portfolio.book(transaction)
+
+        dataset = report.flatten_unrealized(
+            session,
+            portfolio,
+            args.asof.date(),
+            consolidate=None if args.by == "lot" else args.by,
+        )
+        with open(args.file, "w") as csvfile:
+            csvfile.write(dataset.csv)
+
+
+def load_books(
+    session: sqlalchemy.orm.session.Session,
+    path: Optional[str],
+    dtstart: datetime,
+    dtend: datetime,
+) -> Tuple[Portfolio, Iterator[TransactionType]]:
+    """Load starting portfolio positions and the Transactions to book against them.
+
+    Transactions are loaded as inventory NamedTuples (no ORM instances), with
+    accounts/securities interned as lightweight keys; cf. inventory.loader.
+
+    Args:
+        session: a sqlalchemy.Session instance bound to a database engine.
+        path: if set, filesystem path to Lot dumpfile.
+        dtstart: book Transactions occurring on/after this date/time.
+        dtend: book Transactions occurring before this date/time.
+    """
+    loader = Loader(session)
+    portfolio = loader.intern_portfolio(load_portfolio(session, path))
+    return portfolio, loader.load_transactions(dtstart, dtend)
+
 
 def load_portfolio(
     session: sqlalchemy.orm.session.Session, path: Optional[str]
@@ -251,8 +954,56 @@ def make_argparser() -> Tuple[ArgumentParser, _SubParsersAction]:
 
     import_parser = subparsers.add_parser("import", help="Import OFX/Flex/CSV data")
     import_parser.add_argument("file", nargs="+", help="Broker data file(s)")
+    import_parser.add_argument(
+        "--force",
+        "-f",
+        action="store_true",
+        help="Import files even if they've been imported before",
+    )
+    import_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        help="Number of processes parsing data files (default: CPU count)",
+    )
+    import_parser.add_argument(
+        "--no-cache",
+        dest="nocache",
+        action="store_true",
+        help="Parse data files even if their parse results are cached",
+    )
+    import_parser.add_argument(
+        "--staged",
+        "-s",
+        action="store_true",
+        help="Read data files into an in-memory database; copy new rows at the end",
+    )
+    import_parser.add_argument(
+        "--stats",
+        action="store_const",
+        const="table",
+        help="Print time, rows & DB queries per import stage",
+    )
+    import_parser.add_argument(
+        "--stats-json",
+        dest="stats",
+        action="store_const",
+        const="json",
+        help="Same as --stats, formatted as JSON",
+    )
     import_parser.set_defaults(func=import_transactions)
 
+    book_parser = subparsers.add_parser(
+        "book", help="Book imported transactions into the DB inventory"
+    )
+    book_parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Discard DB inventory and book all transactions from the beginning",
+    )
+    book_parser.set_defaults(func=book_transactions)
+
     dump_parser = subparsers.add_parser(
         "lots", aliases=["dump"], help="Dump Lots to CSV file"
     )
@@ -273,6 +1024,14 @@ def make_argparser() -> Tuple[ArgumentParser, _SubParsersAction]:
         "-l", "--loadcsv", default=None, help="CSV dump file of Lots to load"
     )
     dump_parser.add_argument("-c", "--consolidate", action="store_true")
+    dump_parser.add_argument(
+        "--no-cache", dest="nocache", action="store_true", help="Ignore cached reports"
+    )
+    dump_parser.add_argument(
+        "--ledger",
+        action="store_true",
+        help="Report from inventory persisted by the `book` command",
+    )
     dump_parser.set_defaults(func=dump_lots, loadcsv=None)
 
     gain_parser = subparsers.add_parser("gains", help="Dump Gains to CSV file")
@@ -299,8 +1058,67 @@ def make_argparser() -> Tuple[ArgumentParser, _SubParsersAction]:
         "-l", "--loadcsv", default=None, help="CSV dump file of Lots to load"
     )
     gain_parser.add_argument("-c", "--consolidate", action="store_true")
+    gain_parser.add_argument(
+        "--no-cache", dest="nocache", action="store_true", help="Ignore cached reports"
+    )
+    gain_parser.add_argument(
+        "--ledger",
+        action="store_true",
+        help="Report from inventory persisted by the `book` command",
+    )
     gain_parser.set_defaults(func=dump_gains)
 
+    report_parser = subparsers.add_parser(
+        "report", help="Dump Gains and ending Lots for consecutive periods to CSV files"
+    )
+    report_parser.add_argument("dir", help="Output directory")
+    report_parser.add_argument(
+        "boundaries",
+        nargs="+",
+        help="Period boundary dates, e.g. first day of each month and of the next",
+    )
+    report_parser.add_argument(
+        "-s",
+        "--dtstart",
+        default=None,
+        help=("Start date for Transactions processed " "for report (included)"),
+    )
+    report_parser.add_argument(
+        "-l", "--loadcsv", default=None, help="CSV dump file of Lots to load"
+    )
+    report_parser.add_argument("-c", "--consolidate", action="store_true")
+    report_parser.set_defaults(func=dump_reports)
+
+    price_parser = subparsers.add_parser(
+        "prices", help="Import security prices from CSV data"
+    )
+    price_parser.add_argument("file", nargs="+", help="CSV price file(s)")
+    price_parser.set_defaults(func=import_prices)
+
+    unrealized_parser = subparsers.add_parser(
+        "unrealized", help="Dump unrealized Gains (mark to market) to CSV file"
+    )
+    unrealized_parser.add_argument("file", help="CSV file")
+    unrealized_parser.add_argument(
+        "-d", "--date", dest="asof", required=True, help="Valuation date"
+    )
+    unrealized_parser.add_argument(
+        "-s",
+        "--dtstart",
+        default=None,
+        help=("Start date for Transactions processed " "for report (included)"),
+    )
+    unrealized_parser.add_argument(
+        "-l", "--loadcsv", default=None, help="CSV dump file of Lots to load"
+    )
+    unrealized_parser.add_argument(
+        "--by",
+        choices=("lot", "pocket", "character"),
+        default="lot",
+        help="Report each Lot, or sum by (account, security) or by holding period",
+    )
+    unrealized_parser.set_defaults(func=dump_unrealized)
+
     return argparser, subparsers
 
 
@@ -324,6 +1142,14 @@ def run(argparser: ArgumentParser) -> None:
     if getattr(args, "begin", None):
         args.begin = datetime.strptime(args.begin, "%Y-%m-%d")
 
+    if getattr(args, "asof", None):
+        args.asof = datetime.strptime(args.asof, "%Y-%m-%d")
+
+    if getattr(args, "boundaries", None):
+        args.boundaries = [
+            datetime.strptime(boundary, "%Y-%m-%d") for boundary in args.boundaries
+        ]
+
     # Execute selected function
     if args.func:
         args.func(args)
@@ -0,0 +1,210 @@
+# coding: utf-8
+"""In-memory SQLite staging database for imports.
+
+Reading a datafile issues a stream of small queries & inserts (merging accounts,
+securities and transactions), interleaved with autoflushes.  Run against a remote
+database, each of those is a network round trip made while holding the import's
+locks.  Instead, the readers can run against a Staging database: an in-memory SQLite
+database preloaded with the target database's Fi, FiAccount, Security and SecurityId
+rows (under their original primary keys).  Afterward the rows created in staging
+are copied to the target database in bulk, in the target session's transaction.
+
+Reference rows created in staging are inserted one at a time (there are few of them),
+to learn the primary keys the target database assigns them; foreign keys of the
+copied rows are translated accordingly.  Transactions already present in the target
+database (by merge() signature) aren't copied again.  On PostgreSQL via psycopg2 the
+new Transactions are written with COPY; other databases get multi-row INSERTs.
+"""
+
+__all__ = ["Staging", "staging"]
+
+
+# stdlib imports
+from contextlib import contextmanager
+import enum
+import io
+from typing import Any, Dict, List, Mapping, Sequence
+
+
+# 3rd party imports
+import sqlalchemy
+from sqlalchemy import select
+from sqlalchemy.pool import StaticPool
+
+
+# local imports
+from capgains import database, models
+
+
+#: Models whose existing rows are preloaded into the staging database.  Order matters:
+#: a table's foreign keys may only refer to tables listed before it.
+REFERENCE_MODELS = (models.Fi, models.FiAccount, models.Security, models.SecurityId)
+
+
+class Staging:
+    """In-memory SQLite database holding a working copy of reference data.
+
+    Read datafiles with `session`, then call copy() to write the results to the
+    target database.
+
+    Args:
+        target: a sqlalchemy.Session instance bound to the target database.
+    """
+
+    def __init__(self, target: sqlalchemy.orm.session.Session):
+        self.target = target
+        #  Every checkout must get the same connection, or the in-memory DB vanishes.
+        self.engine = database.make_engine("sqlite://", poolclass=StaticPool)
+        database.create_schema(self.engine)
+
+        #  Highest preloaded primary key by table; rows above it are new in staging.
+        self.maxids: Dict[sqlalchemy.Table, int] = {}
+        with self.engine.begin() as connection:
+            for model in REFERENCE_MODELS:
+                table = model.__table__
+                rows = [dict(row) for row in target.execute(select(table)).mappings()]
+                if rows:
+                    connection.execute(table.insert(), rows)
+                self.maxids[table] = max((row["id"] for row in rows), default=0)
+
+        self.session = database.Session(bind=self.engine)
+
+    def close(self) -> None:
+        self.session.close()
+        self.engine.dispose()
+
+    def copy(self) -> List[models.Transaction]:
+        """Copy rows created in staging to the target database.
+
+        Nothing is committed; that's up to the caller's target session.
+
+        Returns:
+            Target database Transactions corresponding to the staged Transactions,
+            in order of creation.
+        """
+        self.session.flush()
+
+        #  Map of table to {staging primary key: target primary key}.
+        idmaps: Dict[sqlalchemy.Table, Dict[int, int]] = {}
+        for model in REFERENCE_MODELS:
+            table = model.__table__
+            idmap = idmaps[table] = {}
+            new = select(table).where(table.c.id > self.maxids[table])
+            for row in self.session.execute(new.order_by(table.c.id)).mappings():
+                values = _translate(table, row, idmaps)
+                stagingid = values.pop("id")
+                result = self.target.execute(table.insert().values(**values))
+                idmap[stagingid] = result.inserted_primary_key[0]
+
+        table = models.Transaction.__table__
+        staged = self.session.execute(select(table).order_by(table.c.id)).mappings()
+        rows = [_translate(table, row, idmaps) for row in staged]
+        for row in rows:
+            del row["id"]
+        if not rows:
+            return []
+
+        bind = self.target.get_bind()
+        if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+            existing = _existing_signatures(self.target, rows)
+            _copy_from(
+                self.target,
+                table,
+                [
+                    row
+                    for row in rows
+                    if (row["fiaccount_id"], row["uniqueid"]) not in existing
+                ],
+            )
+        #  Inserts whatever COPY hasn't; loads target instances of all rows.
+        return models.Transaction.merge_all(self.target, rows)
+
+
+@contextmanager
+def staging(target: sqlalchemy.orm.session.Session):
+    """Provide a Staging database for the duration of the context.
+
+    Args:
+        target: a sqlalchemy.Session instance bound to the target database.
+    """
+    stage = Staging(target)
+    try:
+        yield stage
+    finally:
+        stage.close()
+
+
+def _translate(
+    table: sqlalchemy.Table,
+    row: Mapping[str, Any],
+    idmaps: Mapping[sqlalchemy.Table, Mapping[int, int]],
+) -> Dict[str, Any]:
+    """Replace foreign keys to rows created in staging with their target keys.
+    """
+    values = dict(row)
+    for column in table.columns:
+        for fk in column.foreign_keys:
+            idmap = idmaps.get(fk.column.table, {})
+            value = values[column.key]
+            values[column.key] = idmap.get(value, value)
+    return values
+
+
+def _existing_signatures(
+    session: sqlalchemy.orm.session.Session, rows: Sequence[Mapping[str, Any]]
+) -> set:
+    """Find (fiaccount_id, uniqueid) of rows already in the transaction table.
+    """
+    tx = models.Transaction.__table__
+    uniqueids = [row["uniqueid"] for row in rows]
+    existing = set()
+    for start in range(0, len(uniqueids), models.MAX_BOUND_PARAMETERS):
+        chunk = uniqueids[start:start + models.MAX_BOUND_PARAMETERS]
+        query = select(tx.c.fiaccount_id, tx.c.uniqueid)
+        existing.update(
+            tuple(sig) for sig in session.execute(query.where(tx.c.uniqueid.in_(chunk)))
+        )
+    return existing
+
+
+#  PostgreSQL COPY text format escapes.
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_text(value: Any) -> str:
+    """Format a column value for PostgreSQL COPY text format.
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, enum.Enum):
+        #  sqlalchemy.Enum stores member names.
+        value = value.name
+    return str(value).translate(COPY_ESCAPES)
+
+
+def _copy_from(
+    session: sqlalchemy.orm.session.Session,
+    table: sqlalchemy.Table,
+    rows: Sequence[Mapping[str, Any]],
+) -> None:
+    """Bulk load rows into a PostgreSQL table with COPY ... FROM STDIN.
+
+    Runs on the session's connection, i.e. within its transaction.
+    """
+    if not rows:
+        return
+    columns = [column for column in table.columns if column.key in rows[0]]
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_text(row[column.key]) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    statement = 'COPY "{}" ({}) FROM STDIN'.format(
+        table.name, ", ".join(f'"{column.name}"' for column in columns)
+    )
+    cursor = session.connection().connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
@@ -10,7 +10,6 @@ from mypy_extensions import TypedDict
 
 # 3rd party imports
 #  import sqlalchemy
-from sqlalchemy import create_engine
 import ofxtools
 
 
@@ -21,7 +20,7 @@ from capgains import database, flex, ofx, models
 
 DB_URI = CONFIG.test_db_uri
 DB_STATE = {
-    "engine": create_engine(DB_URI),
+    "engine": database.make_engine(DB_URI),
     "connection": None,
     "transaction": None,
     "session": None,
@@ -0,0 +1,149 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+import os
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+
+# 3rd party imports
+import ofxtools
+
+
+# local imports
+from capgains import flex, script
+from capgains.cache import DiskCache, fingerprint
+
+
+class DiskCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.tmpdir.name, "cache"), maxsize=25)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def age(self, key, mtime):
+        os.utime(self.cache.path(key), (mtime, mtime))
+
+    def testGetSet(self):
+        self.assertIsNone(self.cache.get("foo"))
+        self.cache.set("foo", b"bar")
+        self.assertEqual(self.cache.get("foo"), b"bar")
+        self.cache.set("foo", b"baz")
+        self.assertEqual(self.cache.get("foo"), b"baz")
+
+    def testEvictLeastRecentlyUsed(self):
+        self.cache.set("a", b"0123456789")
+        self.age("a", 1000)
+        self.cache.set("b", b"0123456789")
+        self.age("b", 2000)
+
+        # Reading "a" makes "b" the least recently used entry
+        self.assertEqual(self.cache.get("a"), b"0123456789")
+
+        self.cache.set("c", b"0123456789")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), b"0123456789")
+        self.assertEqual(self.cache.get("c"), b"0123456789")
+
+
+class FingerprintTestCase(unittest.TestCase):
+    def testFingerprint(self):
+        rows = [(1, "abc", Decimal("1.5")), (2, "def", None)]
+        key = fingerprint(["USD"], rows)
+        self.assertEqual(key, fingerprint(["USD"], list(rows)))
+        self.assertNotEqual(key, fingerprint(["EUR"], rows))
+        self.assertNotEqual(key, fingerprint(["USD"], rows[:1]))
+        self.assertNotEqual(key, fingerprint(["USD"], [rows[1], rows[0]]))
+        # Boundaries between parts are significant
+        self.assertNotEqual(fingerprint([1, 2], [3]), fingerprint([1], [2, 3]))
+
+
+class ParseCacheTestCase(unittest.TestCase):
+    ofx = (
+        "OFXHEADER:100\nDATA:OFXSGML\nVERSION:102\nSECURITY:NONE\n"
+        "ENCODING:USASCII\nCHARSET:1252\nCOMPRESSION:NONE\nOLDFILEUID:NONE\n"
+        "NEWFILEUID:NONE\n\n"
+        "<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS>"
+        "<DTSERVER>20160104<LANGUAGE>ENG</SONRS></SIGNONMSGSRSV1></OFX>"
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.tmpdir.name, "cache"), maxsize=2 ** 20)
+        self.path = os.path.join(self.tmpdir.name, "statement.ofx")
+        with open(self.path, "w") as f:
+            f.write(self.ofx)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def testParseCacheKey(self):
+        sha256, size = script.hash_file(self.path)
+        key = script.parse_cache_key(self.path, sha256)
+        self.assertEqual(key, script.parse_cache_key("renamed.OFX", sha256))
+        self.assertNotEqual(key, script.parse_cache_key(self.path, "0" * 64))
+        self.assertNotEqual(key, script.parse_cache_key("statement.qfx", sha256))
+        with patch.object(script, "PARSE_CACHE_VERSION", 0):
+            self.assertNotEqual(key, script.parse_cache_key(self.path, sha256))
+        self.assertNotEqual(key, script.parse_cache_key("statement.xml", sha256))
+        #  CSV files aren't parsed ahead of reading; nothing to cache.
+        self.assertIsNone(script.parse_cache_key("statement.csv", sha256))
+
+    def testParseFile(self):
+        key = script.parse_cache_key(self.path, script.hash_file(self.path)[0])
+        parsed = script.parse_file(self.path, self.cache, key)
+        self.assertIsInstance(parsed, ofxtools.models.OFX)
+        self.assertIsNotNone(self.cache.get(key))
+
+        def fail(path):
+            raise AssertionError(f"{path} parsed again")
+
+        with patch.dict(script.IMPORTERS, {"ofx": (fail, None)}):
+            cached = script.parse_file(self.path, self.cache, key)
+            self.assertEqual(cached, parsed)
+            parsed_files = script.parse_files(
+                [self.path], cache=self.cache, keys={self.path: key}
+            )
+            self.assertEqual(list(parsed_files), [parsed])
+            with self.assertRaises(AssertionError):
+                script.parse_file(self.path, self.cache, None)
+
+    def testParseFileFlex(self):
+        path = os.path.join(self.tmpdir.name, "statement.xml")
+        with open(path, "w") as f:
+            f.write(
+                '<FlexQueryResponse queryName="Test" type="AF">'
+                '<FlexStatements count="1">'
+                '<FlexStatement accountId="U1" fromDate="20110801" '
+                'toDate="20110831" period="Foobar" whenGenerated="20110901">'
+                '<AccountInformation accountId="U1" currency="USD" />'
+                "</FlexStatement></FlexStatements></FlexQueryResponse>"
+            )
+        key = script.parse_cache_key(path, script.hash_file(path)[0])
+        (statement,) = script.parse_file(path, self.cache, key)
+        self.assertIsInstance(statement, flex.Types.FlexStatement)
+        self.assertEqual(statement.account.acctid, "U1")
+
+        def fail(path):
+            raise AssertionError(f"{path} parsed again")
+
+        with patch.dict(script.IMPORTERS, {"xml": (fail, None)}):
+            self.assertEqual(script.parse_file(path, self.cache, key), [statement])
+
+    def testParseFilesWorkers(self):
+        #  Converted OFX survives the trip back from worker processes.
+        paths = [self.path, os.path.join(self.tmpdir.name, "statement.qfx")]
+        with open(paths[1], "w") as f:
+            f.write(self.ofx)
+        parsed = list(script.parse_files(paths, jobs=2))
+        self.assertEqual(parsed, [script.parse_file(path) for path in paths])
+        self.assertEqual(parsed[0].sonrs.language, "ENG")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
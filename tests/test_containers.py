@@ -9,7 +9,7 @@ from decimal import Decimal
 
 
 # local imports
-from capgains.containers import GroupedList
+from capgains.containers import GroupedList, LazyGroupedList
 from capgains.flex.Types import Trade
 from capgains.ofx.reader import make_canceller
 
@@ -368,5 +368,87 @@ class GroupedListTestCase(unittest.TestCase):
         self.assertEqual(list(subcont2), [15])
 
 
+class LazyGroupedListTestCase(unittest.TestCase):
+    def pipeline(self, cls):
+        return (
+            cls(range(20))
+            .filter(lambda x: x % 5)
+            .groupby(lambda x: x % 3)
+            .groupby(lambda x: x >= 10)
+            .map(lambda x: x * 2)
+            .bind(lambda items: list(items) + [100])
+            .reduce(operator.add)
+            .filter(lambda x: x > 110)
+            .flatten()
+            .groupby(lambda x: x % 3)
+            .sort(operator.neg)
+        )
+
+    def testCollect(self):
+        lazy = self.pipeline(LazyGroupedList)
+        self.assertIsInstance(lazy, LazyGroupedList)
+        result = lazy.collect()
+        self.assertIsInstance(result, GroupedList)
+        self.assertEqual(result, self.pipeline(GroupedList))
+        self.assertEqual(
+            [(group.key, group.grouped) for group in result], [(0, False), (1, False)]
+        )
+        self.assertEqual(lazy[:], result[:])
+        self.assertEqual(len(lazy), 2)
+
+    def testFused(self):
+        calls = []
+
+        def record(x):
+            calls.append(x)
+            return x
+
+        lazy = LazyGroupedList(range(6)).map(record).filter(lambda x: x % 2).map(record)
+        self.assertEqual(calls, [])
+        self.assertEqual(lazy[:], [1, 3, 5])
+        #  Each item runs through the whole chain before the next one starts.
+        self.assertEqual(calls, [0, 1, 1, 2, 3, 3, 4, 5, 5])
+
+    def testCollectOnce(self):
+        calls = []
+
+        def record(x):
+            calls.append(x)
+            return x
+
+        lazy = LazyGroupedList(x for x in range(3)).map(record)
+        self.assertEqual(list(lazy), [0, 1, 2])
+        self.assertEqual(list(lazy), [0, 1, 2])
+        self.assertEqual(len(lazy), 3)
+        self.assertEqual(lazy[1], 1)
+        self.assertIs(lazy.collect(), lazy.collect())
+        self.assertEqual(calls, [0, 1, 2])
+
+    def testGroupbyHash(self):
+        items = ["b1", "a1", "b2", "c1", "a2"]
+        grouped = LazyGroupedList(items).groupby(operator.itemgetter(0), sort=False)
+        self.assertEqual(
+            [(group.key, list(group)) for group in grouped],
+            [("b", ["b1", "b2"]), ("a", ["a1", "a2"]), ("c", ["c1"])],
+        )
+        self.assertEqual(
+            GroupedList(items).groupby(operator.itemgetter(0), sort=False),
+            grouped.collect(),
+        )
+        #  Sorted by default
+        self.assertEqual(
+            [group.key for group in LazyGroupedList(items).groupby(
+                operator.itemgetter(0)
+            )],
+            ["a", "b", "c"],
+        )
+
+    def testReduceEmpty(self):
+        grouped = LazyGroupedList([1, 2]).groupby(lambda x: x).filter(lambda x: x > 1)
+        self.assertEqual(
+            [list(group) for group in grouped.reduce(operator.add)], [[], [2]]
+        )
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=3)
@@ -0,0 +1,69 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+import os
+import tempfile
+from decimal import Decimal
+
+
+# local imports
+from capgains import models, CSV
+from capgains.CSV import etfc, local
+from common import setUpModule, tearDownModule, RollbackMixin
+
+
+ETFC = (
+    "For Account:,####-1234\n"
+    "\n"
+    "TransactionDate,TransactionType,SecurityType,Symbol,Quantity,Amount,Price,"
+    "Commission,Description\n"
+    "01/05/17,Sold,EQ,ABC,-50,749.95,15,0.05,ABC INC COM\n"
+    "01/04/17,Bought,EQ,ABC,100,-1000.05,10,0.05,ABC INC COM\n"
+)
+
+
+class CsvReadTestCase(RollbackMixin, unittest.TestCase):
+    def setUp(self):
+        super(CsvReadTestCase, self).setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super(CsvReadTestCase, self).tearDown()
+
+    def write(self, text):
+        path = os.path.join(self.tmpdir.name, "transactions.csv")
+        with open(path, "w") as csvfile:
+            csvfile.write(text)
+        return path
+
+    def testSniff(self):
+        self.assertIs(CSV.sniff("For Account:,####-1234\n"), etfc.CsvTransactionReader)
+        header = ",".join(local.CsvTransactionWriter.csvFields) + "\r\n"
+        self.assertIs(CSV.sniff(header), local.CsvTransactionReader)
+        self.assertIsNone(CSV.sniff("date,uniqueidtype,uniqueid\n"))
+        self.assertIsNone(CSV.sniff(""))
+
+    def testReadEtfc(self):
+        transactions = CSV.read(self.session, self.write(ETFC))
+        self.assertEqual(len(transactions), 2)
+        buy, sell = sorted(transactions, key=lambda tx: tx.datetime)
+        self.assertEqual(buy.fiaccount.number, "####-1234")
+        self.assertEqual(buy.fiaccount.fi.brokerid, "etrade.com")
+        self.assertEqual(buy.security.ticker, "ABC")
+        self.assertEqual(buy.units, Decimal("100"))
+        self.assertEqual(sell.units, Decimal("-50"))
+
+    def testReadUnrecognized(self):
+        path = self.write("foo,bar\n1,2\n")
+        with self.assertRaises(ValueError):
+            CSV.read(self.session, path)
+        #  Nothing was merged while trying to identify the file.
+        self.assertEqual(self.session.query(models.Fi).count(), 0)
+        self.assertEqual(self.session.query(models.Transaction).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
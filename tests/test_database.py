@@ -0,0 +1,245 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+from unittest.mock import patch
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+
+# 3rd party imports
+import sqlalchemy
+from sqlalchemy import select
+
+
+# local imports
+from capgains import database, models
+from capgains.config import SQLITE_PRAGMAS
+
+
+class SqliteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = database.make_engine(
+            "sqlite:///" + os.path.join(self.tmpdir.name, "test.db"),
+            pragmas=SQLITE_PRAGMAS,
+        )
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def testPragmas(self):
+        with self.engine.connect() as connection:
+            pragma = connection.exec_driver_sql
+            self.assertEqual(pragma("PRAGMA journal_mode").scalar(), "wal")
+            #  NORMAL
+            self.assertEqual(pragma("PRAGMA synchronous").scalar(), 1)
+            self.assertEqual(pragma("PRAGMA mmap_size").scalar(), 256 * 1024 ** 2)
+            self.assertEqual(pragma("PRAGMA cache_size").scalar(), -64 * 1024)
+
+    def testCreateSchema(self):
+        database.create_schema(self.engine)
+        with self.engine.connect() as connection:
+            version = connection.exec_driver_sql("PRAGMA user_version").scalar()
+        self.assertEqual(version, database.schema_version())
+
+        with patch.object(database.Base.metadata, "create_all") as create_all:
+            database.create_schema(self.engine)
+        create_all.assert_not_called()
+
+        database.drop_schema(self.engine)
+        database.create_schema(self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.execute(select(models.CurrencyRate.__table__)).all(), []
+            )
+
+    def testNumeric(self):
+        database.create_schema(self.engine)
+        rate = Decimal("1.234567890123456789012345678901")
+        table = models.CurrencyRate.__table__
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.insert(),
+                {
+                    "date": date(2016, 1, 4),
+                    "fromcurrency": models.Currency.EUR,
+                    "tocurrency": models.Currency.USD,
+                    "rate": rate,
+                },
+            )
+            self.assertEqual(connection.execute(select(table.c.rate)).scalar(), rate)
+
+    def testNumericOrder(self):
+        #  Across sign, digit-length & exponent boundaries, where text comparison of
+        #  the plain string representation would get them wrong.
+        values = [
+            Decimal(value)
+            for value in (
+                "-100", "-10", "-9.99", "-9.5", "-9", "-1.23", "-1.2", "-0.001",
+                "0", "0.001", "0.5", "1.2", "1.23", "9", "9.5", "9.99", "10", "10.5",
+                "100", "123456789.123456789123456789", "1E+20",
+            )
+        ]
+        metadata = sqlalchemy.MetaData()
+        table = sqlalchemy.Table(
+            "number",
+            metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("value", database.Numeric),
+        )
+        metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.insert(), [{"value": value} for value in reversed(values)]
+            )
+
+            def query(*criteria):
+                statement = select(table.c.value).where(*criteria)
+                return connection.execute(statement.order_by(table.c.value)).scalars()
+
+            self.assertEqual(list(query()), values)
+            self.assertEqual(
+                list(query(table.c.value > 9)), [value for value in values if value > 9]
+            )
+            self.assertEqual(
+                list(query(table.c.value <= Decimal("-1.2"))),
+                [value for value in values if value <= Decimal("-1.2")],
+            )
+            #  Equal values compare equal whatever their exponent.
+            self.assertEqual(list(query(table.c.value == Decimal("10.00"))), [10])
+            self.assertEqual(
+                connection.execute(
+                    select(
+                        sqlalchemy.func.min(table.c.value),
+                        sqlalchemy.func.max(table.c.value),
+                        database.numeric_sum(table.c.value),
+                    )
+                ).one(),
+                (values[0], values[-1], sum(values)),
+            )
+
+    def testNumericConstraints(self):
+        database.create_schema(self.engine)
+        table = models.SecurityPrice.__table__
+        with self.engine.connect() as connection:
+            for day, price in enumerate(("0", "0.00", "9", "10"), start=1):
+                connection.execute(
+                    table.insert(),
+                    {
+                        "security_id": 1,
+                        "date": date(2016, 1, day),
+                        "price": Decimal(price),
+                        "currency": models.Currency.USD,
+                    },
+                )
+            with self.assertRaisesRegex(
+                sqlalchemy.exc.IntegrityError, "price_not_negative"
+            ):
+                connection.execute(
+                    table.insert(),
+                    {
+                        "security_id": 1,
+                        "date": date(2016, 2, 1),
+                        "price": Decimal("-0.01"),
+                        "currency": models.Currency.USD,
+                    },
+                )
+            connection.rollback()
+
+        table = models.Lot.__table__
+        with self.engine.connect() as connection:
+            with self.assertRaisesRegex(sqlalchemy.exc.IntegrityError, "units_nonzero"):
+                connection.execute(
+                    table.insert(),
+                    {
+                        "fiaccount_id": 1,
+                        "security_id": 1,
+                        "opentransaction_id": 1,
+                        "createtransaction_id": 1,
+                        "units": Decimal("0.00"),
+                        "price": Decimal("10"),
+                        "currency": models.Currency.USD,
+                    },
+                )
+
+    def testSnapshot(self):
+        database.create_schema(self.engine)
+        table = models.CurrencyRate.__table__
+
+        def insert(connection, day):
+            connection.execute(
+                table.insert(),
+                {
+                    "date": date(2016, 1, day),
+                    "fromcurrency": models.Currency.EUR,
+                    "tocurrency": models.Currency.USD,
+                    "rate": Decimal("1.1"),
+                },
+            )
+
+        with self.engine.begin() as connection:
+            insert(connection, 4)
+
+        def rate(day):
+            return models.CurrencyRate(
+                date=date(2016, 1, day),
+                fromcurrency=models.Currency.EUR,
+                tocurrency=models.Currency.USD,
+                rate=Decimal("1.1"),
+            )
+
+        with database.snapshot(self.engine) as session:
+            #  Concurrent writes don't wait on the snapshot, and aren't visible in it.
+            with self.engine.begin() as connection:
+                insert(connection, 5)
+            self.assertEqual(session.query(models.CurrencyRate).count(), 1)
+
+            #  A read-only snapshot reads the live file, and can't write to it.
+            session.add(rate(6))
+            with self.assertRaises(sqlalchemy.exc.OperationalError):
+                session.flush()
+
+        with database.snapshot(self.engine, readonly=False) as session:
+            with self.engine.begin() as connection:
+                insert(connection, 7)
+            self.assertEqual(session.query(models.CurrencyRate).count(), 2)
+
+            #  Nothing written to a writable snapshot is persisted.
+            session.add(rate(8))
+            session.flush()
+
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                [row.date for row in connection.execute(select(table.c.date))],
+                [date(2016, 1, 4), date(2016, 1, 5), date(2016, 1, 7)],
+            )
+
+    def testSnapshotRollbackJournal(self):
+        #  Without WAL, a reader would block writers; read a copy instead.
+        engine = database.make_engine(
+            "sqlite:///" + os.path.join(self.tmpdir.name, "journal.db"),
+            pragmas={"journal_mode": "DELETE"},
+        )
+        self.addCleanup(engine.dispose)
+        database.create_schema(engine)
+        with database.snapshot(engine) as session:
+            self.assertEqual(session.query(models.CurrencyRate).count(), 0)
+            with engine.begin() as connection:
+                connection.execute(
+                    models.CurrencyRate.__table__.insert(),
+                    {
+                        "date": date(2016, 1, 4),
+                        "fromcurrency": models.Currency.EUR,
+                        "tocurrency": models.Currency.USD,
+                        "rate": Decimal("1.1"),
+                    },
+                )
+            self.assertEqual(session.query(models.CurrencyRate).count(), 0)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
@@ -7,6 +7,8 @@ import datetime
 from decimal import Decimal
 import xml.etree.ElementTree as ET
 import os
+import dataclasses
+import pickle
 
 import ibflex
 
@@ -336,6 +338,34 @@ class OptionsExerciseTestCase(XmlSnippetMixin, unittest.TestCase):
         },
     ]
 
+    def testOptionEAEValidation(self):
+        response = ibflex.parser.parse(
+            (
+                '<FlexQueryResponse queryName="Test" type="AF">'
+                '<FlexStatements count="1">'
+                '<FlexStatement accountId="U12345" fromDate="20110801" '
+                'toDate="20110831" period="Foobar" whenGenerated="20110901">'
+                + "".join(self.stmt_sections)
+                + '</FlexStatement></FlexStatements></FlexQueryResponse>'
+            ).encode()
+        )
+        (stmt,) = response.FlexStatements
+        option, underlying = stmt.OptionEAE
+
+        #  A Trade can only be paired once.
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            parser.parse_optionEAE(
+                [option, underlying, option, underlying],
+                parser.parse_trades(stmt.Trades),
+            )
+
+        #  Paired Trade must agree with the OptionEAE.
+        with self.assertRaises(AssertionError):
+            parser.parse_optionEAE(
+                [option, dataclasses.replace(underlying, quantity=Decimal("-1000"))],
+                parser.parse_trades(stmt.Trades),
+            )
+
     def testOptionEAE(self):
         #  2 Trades and 2 OptionEAEs for 1 assignment
         #  Assign 20 VXX 05AUG11 20.0 C
@@ -362,6 +392,131 @@ class OptionsExerciseTestCase(XmlSnippetMixin, unittest.TestCase):
             )
         )
 
+    def testOptionEAEWindow(self):
+        response = ibflex.parser.parse(
+            (
+                '<FlexQueryResponse queryName="Test" type="AF">'
+                '<FlexStatements count="1">'
+                '<FlexStatement accountId="U12345" fromDate="20110801" '
+                'toDate="20110831" period="Foobar" whenGenerated="20110901">'
+                + "".join(self.stmt_sections)
+                + '</FlexStatement></FlexStatements></FlexQueryResponse>'
+            ).encode()
+        )
+        (stmt,) = response.FlexStatements
+        option, underlying = stmt.OptionEAE
+        optionTrade, underlyingTrade = parser.parse_trades(stmt.Trades)
+        (exercise,) = self.statement.transactions
+
+        #  Legs may arrive before their Trades.
+        window = parser.OptionEAEWindow()
+        self.assertEqual(window.add_optionEAE(option), [])
+        self.assertEqual(window.add_optionEAE(underlying), [])
+        self.assertEqual(window.add_trade(underlyingTrade), [])
+        self.assertEqual(window.add_trade(optionTrade), [exercise])
+        self.assertEqual(window.flush(), [])
+
+        #  Trades not booking options exercise pass straight through.
+        trade = underlyingTrade._replace(fitid="1", notes=())
+        self.assertEqual(window.add_trade(trade), [trade])
+
+        #  Unpaired Trades are flushed as they fall out of the window, and so are
+        #  legs whose Trades have fallen out.
+        window = parser.OptionEAEWindow(size=1)
+        self.assertEqual(window.add_trade(optionTrade), [])
+        self.assertEqual(window.add_trade(underlyingTrade), [optionTrade])
+        self.assertEqual(window.add_optionEAE(option), [])
+        with self.assertWarns(UserWarning):
+            self.assertEqual(window.add_optionEAE(underlying), [underlyingTrade])
+        self.assertEqual(window.flush(), [])
+
+        #  Unpaired legs are flushed as they fall out of the window.
+        window = parser.OptionEAEWindow(size=1)
+        window.add_optionEAE(option)
+        window.add_optionEAE(underlying)
+        window.add_optionEAE(dataclasses.replace(option, tradeID="1"))
+        with self.assertWarns(UserWarning):
+            window.add_optionEAE(dataclasses.replace(underlying, tradeID="2"))
+        self.assertEqual(window.add_trade(optionTrade), [optionTrade])
+        self.assertEqual(window.add_trade(underlyingTrade), [underlyingTrade])
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            window.flush()
+
+        #  Legs still unpaired at the end of the statement are an error.
+        window = parser.OptionEAEWindow()
+        window.add_optionEAE(option)
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            window.flush()
+
+        #  Each tradeID is only paired once.
+        window = parser.OptionEAEWindow()
+        window.add_optionEAE(option)
+        window.add_optionEAE(underlying)
+        window.add_optionEAE(option)
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            window.add_optionEAE(underlying)
+
+    def testPickle(self):
+        #  Parsed statements are returned from worker processes
+        self.assertEqual(pickle.loads(pickle.dumps(self.statement)), self.statement)
+
+
+class IterparseTestCase(unittest.TestCase):
+    def makeResponse(self, count=2):
+        statements = "".join(
+            f'<FlexStatement accountId="U{n}" fromDate="20110801" '
+            'toDate="20110831" period="Foobar" whenGenerated="20110901">'
+            f'<AccountInformation accountId="U{n}" currency="USD" />'
+            '<OpenPositions><OpenPosition conid="80789235" /></OpenPositions>'
+            + "".join(OptionsExerciseTestCase.stmt_sections)
+            + '<SecuritiesInfo>'
+            '<SecurityInfo conid="91900358" symbol="VXX   110805C00020000" />'
+            '<SecurityInfo conid="80789235" symbol="VXX" />'
+            '</SecuritiesInfo>'
+            '</FlexStatement>'
+            for n in range(2)
+        )
+        return (
+            '<FlexQueryResponse queryName="Test" type="AF">'
+            f'<FlexStatements count="{count}">{statements}</FlexStatements>'
+            '</FlexQueryResponse>'
+        ).encode()
+
+    def testIterparse(self):
+        source = self.makeResponse()
+        statements = parser.iterparse(source)
+        self.assertNotIsInstance(statements, list)
+
+        response = ibflex.parser.parse(source)
+        expected = [parser.parse_statement(stmt) for stmt in response.FlexStatements]
+        statements = list(statements)
+        self.assertEqual(len(statements), 2)
+        for stmt, expect in zip(statements, expected):
+            self.assertEqual(stmt, expect)
+        self.assertEqual(statements[1].account.acctid, "U1")
+        #  OptionEAE paired with its Trades, which are removed.
+        self.assertEqual(
+            [type(tx) for tx in statements[0].transactions], [flex.Types.Exercise]
+        )
+
+    def testIterparseOptionEAEFirst(self):
+        #  OptionEAE legs are paired with Trades from a later section.
+        trades, optionEAE = OptionsExerciseTestCase.stmt_sections
+        source = self.makeResponse().replace(
+            (trades + optionEAE).encode(), (optionEAE + trades).encode()
+        )
+        self.assertEqual(
+            list(parser.iterparse(source)), parser.parse(self.makeResponse())
+        )
+
+    def testIterparseWrongCount(self):
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            list(parser.iterparse(self.makeResponse(count=3)))
+
+    def testIterparseNotFlex(self):
+        with self.assertRaises(ibflex.parser.FlexParserError):
+            list(parser.iterparse(b"<OFX />"))
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=3)
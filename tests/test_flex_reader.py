@@ -104,7 +104,39 @@ class ReadTestCase(RollbackMixin, unittest.TestCase):
         self.assertEqual(divs[(sentinel.conid1, sentinel.payDate1)], div1)
 
     def testReadCurrencyRates(self):
-        pass
+        rate0 = ibflex.Types.ConversionRate(
+            reportDate=date(2010, 6, 1),
+            fromCurrency="EUR",
+            toCurrency="USD",
+            rate=Decimal("1.2"),
+        )
+        rate1 = ibflex.Types.ConversionRate(
+            reportDate=date(2010, 6, 1),
+            fromCurrency="GBP",
+            toCurrency="USD",
+            rate=Decimal("1.4"),
+        )
+        statement = flex.Types.FlexStatement(
+            account=None,
+            securities=None,
+            transactions=None,
+            changeInDividendAccruals=None,
+            conversionRates=[rate0, rate1, rate0],
+        )
+        self.reader.read_currency_rates(statement, self.session)
+        self.assertEqual(
+            models.CurrencyRate.get_rate(
+                self.session, models.Currency.EUR, models.Currency.USD, date(2010, 6, 1)
+            ),
+            Decimal("1.2"),
+        )
+        self.assertEqual(
+            models.CurrencyRate.get_rate(
+                self.session, models.Currency.GBP, models.Currency.USD, date(2010, 6, 1)
+            ),
+            Decimal("1.4"),
+        )
+        self.assertEqual(self.session.query(models.CurrencyRate).count(), 2)
 
     @patch.object(models.Security, "merge", wraps=lambda session, **sec: sec)
     def testReadSecurities(self, mock_security_merge_method):
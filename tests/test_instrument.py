@@ -0,0 +1,140 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+import json
+
+
+# 3rd party imports
+import sqlalchemy
+
+
+# local imports
+from capgains import instrument
+from capgains.instrument import Collector, StageStats, stage, measure, collected
+
+
+@stage("outer", rows="items")
+def outer(items, engine):
+    with engine.connect() as connection:
+        connection.exec_driver_sql("SELECT 1")
+    return [inner(item) for item in items]
+
+
+@stage("inner")
+def inner(item):
+    return item * 2
+
+
+@stage("recurse", rows="items")
+def recurse(items):
+    items = list(items)
+    if len(items) > 1:
+        recurse(items[1:])
+    return items
+
+
+class StageTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine("sqlite://")
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def testInactive(self):
+        self.assertIsNone(instrument.current())
+        self.assertEqual(outer(iter([1, 2]), self.engine), [2, 4])
+        with measure("block") as call:
+            self.assertIsNone(call)
+
+    def testCollect(self):
+        with Collector() as collector:
+            self.assertIs(instrument.current(), collector)
+            #  Iterators passed as rows are counted (and still processed).
+            self.assertEqual(outer(iter([1, 2, 3]), self.engine), [2, 4, 6])
+            with measure("block", rows_in=5) as call:
+                call.rows_out = 4
+        self.assertIsNone(instrument.current())
+
+        self.assertEqual(list(collector.stages), ["outer", "inner", "block"])
+        outer_ = collector.stages["outer"]
+        self.assertEqual(
+            (outer_.calls, outer_.rows_in, outer_.rows_out, outer_.queries),
+            (1, 3, 3, 1),
+        )
+        self.assertGreater(outer_.seconds, 0)
+        inner_ = collector.stages["inner"]
+        self.assertEqual(
+            (inner_.calls, inner_.rows_in, inner_.rows_out, inner_.queries),
+            (3, 0, 3, 0),
+        )
+        block = collector.stages["block"]
+        self.assertEqual((block.rows_in, block.rows_out), (5, 4))
+
+        #  Queries aren't counted once the Collector is done.
+        with self.engine.connect() as connection:
+            connection.exec_driver_sql("SELECT 1")
+        self.assertEqual(collector.queries, 1)
+
+    def testCountIterator(self):
+        #  Iterators passed as rows are counted as they're read, not read up front.
+        read = []
+
+        def items():
+            for item in range(3):
+                read.append(item)
+                yield item
+
+        @stage("first", rows="items")
+        def first(items):
+            return next(items)
+
+        with Collector() as collector:
+            self.assertEqual(first(items()), 0)
+        self.assertEqual(read, [0])
+        self.assertEqual(collector.stages["first"].rows_in, 1)
+
+    def testReentrant(self):
+        with Collector() as collector:
+            recurse([1, 2, 3])
+        stats = collector.stages["recurse"]
+        self.assertEqual((stats.calls, stats.rows_in, stats.rows_out), (1, 3, 3))
+
+    def testCollected(self):
+        result, stages = collected(inner, 21)
+        self.assertEqual(result, 42)
+        self.assertEqual(list(stages), ["inner"])
+        self.assertIsNone(instrument.current())
+
+        collector = Collector()
+        collector.merge(stages)
+        collector.merge({"inner": StageStats(calls=2, seconds=1.0, rows_out=2)})
+        self.assertEqual(collector.stages["inner"].calls, 3)
+        self.assertEqual(collector.stages["inner"].rows_out, 3)
+
+    def testFormat(self):
+        collector = Collector()
+        collector.merge(
+            {
+                "parse": StageStats(calls=2, seconds=1.5, rows_out=2),
+                "merge_transaction": StageStats(calls=10, rows_out=10, queries=3),
+            }
+        )
+        self.assertEqual(
+            collector.table().splitlines(),
+            [
+                "stage              calls  seconds  rows in  rows out  queries",
+                "-----------------  -----  -------  -------  --------  -------",
+                "parse                  2    1.500        0         2        0",
+                "merge_transaction     10    0.000        0        10        3",
+            ],
+        )
+        self.assertEqual(
+            json.loads(collector.json())["merge_transaction"],
+            {"calls": 10, "seconds": 0.0, "rows_in": 0, "rows_out": 10, "queries": 3},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
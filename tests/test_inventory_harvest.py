@@ -0,0 +1,108 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+from decimal import Decimal
+from datetime import datetime
+
+
+# local imports
+from capgains.inventory import Lot, Portfolio, Trade, scan_losses
+
+
+class ScanLossesTestCase(unittest.TestCase):
+    def makeLot(self, account, security, opendt, units, price):
+        tx = Trade(
+            uniqueid=f"{account}{security}{opendt}",
+            datetime=opendt,
+            fiaccount=account,
+            security=security,
+            units=units,
+            cash=-units * price,
+            currency="USD",
+        )
+        return Lot(
+            opentransaction=tx,
+            createtransaction=tx,
+            units=units,
+            price=price,
+            currency="USD",
+        )
+
+    def setUp(self):
+        self.asof = datetime(2017, 6, 30)
+        self.portfolio = Portfolio()
+        self.portfolio[("acct0", "ABC")] = [
+            #  Long-term loss of 400
+            self.makeLot(
+                "acct0", "ABC", datetime(2015, 1, 2), Decimal("100"), Decimal("14")
+            ),
+            #  Short-term loss of 50
+            self.makeLot(
+                "acct0", "ABC", datetime(2017, 3, 1), Decimal("50"), Decimal("11")
+            ),
+            #  Gain
+            self.makeLot(
+                "acct0", "ABC", datetime(2016, 1, 4), Decimal("10"), Decimal("5")
+            ),
+        ]
+        self.portfolio[("acct1", "DEF")] = [
+            #  Short-term loss of 300
+            self.makeLot(
+                "acct1", "DEF", datetime(2017, 1, 3), Decimal("100"), Decimal("23")
+            ),
+        ]
+        self.portfolio[("acct1", "ABC")] = [
+            #  Short-term loss of 10, recent acquisition
+            self.makeLot(
+                "acct1", "ABC", datetime(2017, 6, 15), Decimal("10"), Decimal("11")
+            ),
+        ]
+        self.portfolio[("acct1", "GHI")] = [
+            #  No price available
+            self.makeLot(
+                "acct1", "GHI", datetime(2017, 1, 3), Decimal("100"), Decimal("23")
+            ),
+        ]
+        self.prices = {"ABC": Decimal("10"), "DEF": Decimal("20")}
+
+    def testScanLosses(self):
+        harvest = scan_losses(self.portfolio, self.prices, self.asof)
+
+        self.assertEqual(len(harvest.longterm), 1)
+        candidate = harvest.longterm[0]
+        self.assertEqual(candidate.pocket, ("acct0", "ABC"))
+        self.assertEqual(candidate.loss, Decimal("400"))
+        self.assertEqual(candidate.longterm, True)
+        #  acct1 acquired ABC within 30 days
+        self.assertEqual(candidate.washsale, True)
+
+        self.assertEqual(
+            [(c.pocket, c.loss) for c in harvest.shortterm],
+            [
+                (("acct1", "DEF"), Decimal("300")),
+                (("acct0", "ABC"), Decimal("50")),
+                (("acct1", "ABC"), Decimal("10")),
+            ],
+        )
+        self.assertEqual(
+            [c.washsale for c in harvest.shortterm], [False, True, False]
+        )
+        self.assertTrue(all(not c.longterm for c in harvest.shortterm))
+
+    def testScanLossesLimit(self):
+        harvest = scan_losses(self.portfolio, self.prices, self.asof, limit=2)
+        self.assertEqual(len(harvest.longterm), 1)
+        self.assertEqual(
+            [c.loss for c in harvest.shortterm], [Decimal("300"), Decimal("50")]
+        )
+
+    def testScanLossesEmpty(self):
+        harvest = scan_losses(Portfolio(), self.prices, self.asof)
+        self.assertEqual(harvest.shortterm, [])
+        self.assertEqual(harvest.longterm, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
@@ -0,0 +1,198 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+from decimal import Decimal
+from datetime import date, datetime
+
+
+# local imports
+from capgains import models
+from capgains.inventory import Portfolio, report
+from capgains.inventory.ledger import Ledger
+from common import setUpModule, tearDownModule, RollbackMixin
+
+
+class LedgerTestCase(RollbackMixin, unittest.TestCase):
+    def setUp(self):
+        super(LedgerTestCase, self).setUp()
+        self.account = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="1"
+        )
+        self.security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+
+    def trade(self, uniqueid, dt, units, cash, security=None, currency="USD"):
+        transaction = models.Transaction(
+            type=models.TransactionType.TRADE,
+            uniqueid=uniqueid,
+            datetime=dt,
+            fiaccount=self.account,
+            security=security or self.security,
+            units=Decimal(units),
+            currency=getattr(models.Currency, currency),
+            cash=Decimal(cash),
+        )
+        self.session.add(transaction)
+        self.session.flush()
+        return transaction
+
+    def replay(self):
+        portfolio = Portfolio()
+        gains = []
+        for transaction in models.Transaction.between(
+            self.session, datetime.min, datetime.max
+        ):
+            gains.extend(portfolio.book(transaction))
+        return portfolio, gains
+
+    def assertBooksMatch(self, ledger):
+        portfolio, gains = self.replay()
+
+        persisted = ledger.portfolio()
+        self.assertEqual(list(persisted.keys()), [(self.account, self.security)])
+        self.assertEqual(
+            [
+                (lot.opentransaction.uniqueid, lot.units, lot.price)
+                for lot in persisted[(self.account, self.security)]
+            ],
+            [
+                (lot.opentransaction.uniqueid, lot.units, lot.price)
+                for lot in portfolio[(self.account, self.security)]
+            ],
+        )
+        self.assertEqual(
+            [
+                (
+                    gain.transaction.uniqueid,
+                    gain.lot.opentransaction.uniqueid,
+                    gain.lot.units,
+                    gain.lot.price,
+                    gain.price,
+                )
+                for gain in ledger.gains(datetime.min, datetime.max)
+            ],
+            [
+                (
+                    gain.transaction.uniqueid,
+                    gain.lot.opentransaction.uniqueid,
+                    gain.lot.units,
+                    gain.lot.price,
+                    gain.price,
+                )
+                for gain in gains
+            ],
+        )
+
+    def testBook(self):
+        self.trade("0", datetime(2016, 1, 4), "100", "-1000")
+        self.trade("1", datetime(2016, 2, 1), "50", "-600")
+        self.trade("2", datetime(2016, 3, 1), "-120", "1800")
+
+        ledger = Ledger(self.session, chunksize=2)
+        self.assertEqual(ledger.book(), 3)
+        self.assertBooksMatch(ledger)
+        #  1 open Lot; 2 realized Lots.  Superseded Lots aren't kept.
+        self.assertEqual(self.session.query(models.Lot).count(), 3)
+
+        (gain0, gain1) = ledger.gains(datetime(2016, 3, 1), datetime(2016, 4, 1))
+        self.assertEqual(gain0.lot.units, Decimal("100"))
+        self.assertEqual(gain0.lot.price, Decimal("10"))
+        self.assertEqual(gain0.price, Decimal("15"))
+        self.assertEqual(gain1.lot.units, Decimal("20"))
+        self.assertEqual(gain1.lot.price, Decimal("12"))
+        self.assertEqual(ledger.gains(datetime(2016, 1, 1), datetime(2016, 3, 1)), [])
+
+        #  Only newly imported Transactions are booked.
+        self.trade("3", datetime(2016, 4, 1), "-10", "100")
+        self.assertEqual(Ledger(self.session).book(), 1)
+        self.assertBooksMatch(ledger)
+        self.assertEqual(Ledger(self.session).book(), 0)
+
+    def testBookBackdated(self):
+        self.trade("0", datetime(2016, 1, 4), "100", "-1000")
+        self.trade("2", datetime(2016, 3, 1), "-60", "900")
+        ledger = Ledger(self.session)
+        ledger.book()
+
+        self.trade("1", datetime(2016, 2, 1), "50", "-600")
+        self.assertTrue(ledger.backdated())
+        self.assertEqual(ledger.book(), 3)
+        self.assertFalse(ledger.backdated())
+        self.assertBooksMatch(ledger)
+
+        self.assertEqual(ledger.book(rebuild=True), 3)
+        self.assertBooksMatch(ledger)
+
+    def testConsolidate(self):
+        xyz = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="XYZ789", ticker="XYZ"
+        )
+        for day, rate in ((4, "1.08"), (1, "1.10")):
+            models.CurrencyRate.merge(
+                self.session,
+                date=date(2016, 1 if day == 4 else 3, day),
+                fromcurrency=models.Currency.EUR,
+                tocurrency=models.Currency.USD,
+                rate=Decimal(rate),
+            )
+        self.trade("0", datetime(2016, 1, 4), "100", "-1000")
+        self.trade("1", datetime(2016, 1, 4), "10", "-333.33", security=xyz)
+        self.trade("2", datetime(2016, 1, 4), "30", "-250", security=xyz, currency="EUR")
+        self.trade("3", datetime(2016, 2, 1), "50", "-612.34")
+        self.trade("4", datetime(2016, 3, 1), "-120", "1801.01")
+        self.trade("5", datetime(2016, 3, 1), "-35", "450", security=xyz, currency="EUR")
+        ledger = Ledger(self.session)
+        ledger.book()
+
+        portfolio, gains = self.replay()
+
+        def rows(dataset):
+            return sorted(dataset.dict, key=lambda row: row["ticker"])
+
+        self.assertEqual(
+            rows(report.export_flatgains(ledger.consolidate_gains(
+                datetime.min, datetime.max
+            ))),
+            rows(report.flatten_gains(self.session, gains, consolidate=True)),
+        )
+        self.assertEqual(
+            rows(report.export_flatlots(ledger.consolidate_lots())),
+            rows(report.flatten_portfolio(portfolio, consolidate=True)),
+        )
+        self.assertEqual(
+            ledger.consolidate_gains(datetime(2016, 1, 1), datetime(2016, 3, 1)), []
+        )
+
+    def testConsolidateExact(self):
+        #  Sums that floating point gets wrong, e.g. 0.1 + 0.2 + 0.3.
+        self.trade("0", datetime(2016, 1, 4), "0.1", "-1.1")
+        self.trade("1", datetime(2016, 1, 5), "0.2", "-2.3")
+        self.trade("2", datetime(2016, 1, 6), "0.3", "-3.7")
+        self.trade("3", datetime(2016, 1, 7), "0.1", "-1.3")
+        self.trade("4", datetime(2016, 1, 8), "0.2", "-2.9")
+        self.trade("5", datetime(2016, 2, 1), "-0.6", "8.3")
+        ledger = Ledger(self.session)
+        ledger.book()
+
+        portfolio, gains = self.replay()
+
+        position = portfolio[(self.account, self.security)]
+        flatlots = ledger.consolidate_lots()
+        self.assertEqual(flatlots[0].units, Decimal("0.3"))
+        self.assertEqual(
+            flatlots,
+            report.consolidate_lots(self.account, self.security, position),
+        )
+
+        flatgains = ledger.consolidate_gains(datetime.min, datetime.max)
+        self.assertEqual(flatgains[0].units, Decimal("0.6"))
+        self.assertEqual(
+            flatgains, list(report.consolidate_gains(self.session, gains))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
@@ -0,0 +1,149 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+from decimal import Decimal
+from datetime import datetime
+
+
+# local imports
+from capgains import models
+from capgains.inventory import Portfolio, Trade, Split, Transfer, Lot
+from capgains.inventory.loader import Loader
+from common import setUpModule, tearDownModule, RollbackMixin
+
+
+class LoaderTestCase(RollbackMixin, unittest.TestCase):
+    def setUp(self):
+        super(LoaderTestCase, self).setUp()
+        self.account0 = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="1"
+        )
+        self.account1 = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="2"
+        )
+        self.security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        models.Security.merge(
+            self.session, uniqueidtype="ISIN", uniqueid="US0000ABC123", ticker="ABC"
+        )
+        self.session.add_all(
+            [
+                models.Transaction(
+                    type=models.TransactionType.TRADE,
+                    uniqueid="0",
+                    datetime=datetime(2016, 1, 4),
+                    fiaccount=self.account0,
+                    security=self.security,
+                    units=Decimal("100"),
+                    currency=models.Currency.USD,
+                    cash=Decimal("-1000"),
+                ),
+                models.Transaction(
+                    type=models.TransactionType.SPLIT,
+                    uniqueid="1",
+                    datetime=datetime(2016, 1, 5),
+                    fiaccount=self.account0,
+                    security=self.security,
+                    units=Decimal("150"),
+                    numerator=Decimal("2"),
+                    denominator=Decimal("1"),
+                ),
+                models.Transaction(
+                    type=models.TransactionType.TRANSFER,
+                    uniqueid="2",
+                    datetime=datetime(2016, 1, 6),
+                    fiaccount=self.account1,
+                    security=self.security,
+                    units=Decimal("300"),
+                    fromfiaccount=self.account0,
+                    fromsecurity=self.security,
+                    fromunits=Decimal("-300"),
+                ),
+            ]
+        )
+        self.session.flush()
+
+    def testLoadTransactions(self):
+        loader = Loader(self.session)
+        trade, split, transfer = loader.load_transactions(
+            datetime(2016, 1, 1), datetime(2017, 1, 1)
+        )
+
+        self.assertIsInstance(trade, Trade)
+        self.assertEqual(trade.uniqueid, "0")
+        self.assertEqual(trade.units, Decimal("100"))
+        self.assertEqual(trade.currency, models.Currency.USD)
+        self.assertEqual(trade.cash, Decimal("-1000"))
+        self.assertEqual(trade.fiaccount.id, self.account0.id)
+        self.assertEqual(trade.fiaccount.fi.brokerid, "dch.com")
+        self.assertEqual(trade.fiaccount.number, "1")
+        self.assertEqual(trade.security.ticker, "ABC")
+        self.assertEqual(
+            {(secid.uniqueidtype, secid.uniqueid) for secid in trade.security.ids},
+            {("CUSIP", "ABC123"), ("ISIN", "US0000ABC123")},
+        )
+
+        self.assertIsInstance(split, Split)
+        self.assertEqual(split.numerator, Decimal("2"))
+        self.assertEqual(split.denominator, Decimal("1"))
+
+        self.assertIsInstance(transfer, Transfer)
+        self.assertEqual(transfer.fiaccount.number, "2")
+        self.assertEqual(transfer.fromunits, Decimal("-300"))
+
+        #  Accounts & securities are interned
+        self.assertIs(split.fiaccount, trade.fiaccount)
+        self.assertIs(transfer.fromfiaccount, trade.fiaccount)
+        self.assertIs(transfer.security, trade.security)
+        self.assertIs(transfer.fiaccount.fi, trade.fiaccount.fi)
+
+        #  Date range is half-open
+        (trade,) = loader.load_transactions(datetime(2016, 1, 4), datetime(2016, 1, 5))
+        self.assertEqual(trade.uniqueid, "0")
+
+    def testBook(self):
+        loader = Loader(self.session)
+        opentx = Trade(
+            uniqueid="-1",
+            datetime=datetime(2015, 1, 2),
+            fiaccount=None,
+            security=None,
+            units=Decimal("50"),
+            currency=models.Currency.USD,
+            cash=Decimal("-250"),
+        )
+        lot = Lot(
+            opentransaction=opentx,
+            createtransaction=opentx,
+            units=Decimal("50"),
+            price=Decimal("5"),
+            currency=models.Currency.USD,
+        )
+        portfolio = Portfolio()
+        portfolio[(self.account0, self.security)].append(lot)
+        portfolio = loader.intern_portfolio(portfolio)
+
+        for transaction in loader.load_transactions(
+            datetime(2016, 1, 1), datetime(2017, 1, 1)
+        ):
+            portfolio.book(transaction)
+
+        (pocket,) = [pocket for pocket, position in portfolio.items() if position]
+        account, security = pocket
+        self.assertEqual(account.number, "2")
+        self.assertIs(security, loader.securities[self.security.id])
+        position = portfolio[pocket]
+        self.assertEqual(
+            sorted(lot.units for lot in position), [Decimal("100"), Decimal("200")]
+        )
+        self.assertEqual(
+            sorted(lot.units * lot.price for lot in position),
+            [Decimal("250"), Decimal("1000")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
@@ -0,0 +1,267 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+import io
+from decimal import Decimal
+from datetime import datetime, date
+
+
+# local imports
+from capgains import models
+from capgains.inventory import report, Lot, Portfolio, Trade
+from capgains.CSV.local import CsvPriceReader
+from common import setUpModule, tearDownModule, RollbackMixin
+
+
+class MarkToMarketTestCase(RollbackMixin, unittest.TestCase):
+    def setUp(self):
+        super(MarkToMarketTestCase, self).setUp()
+        self.account = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="8675309"
+        )
+        self.security0 = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        self.security1 = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="DEF456", ticker="DEF"
+        )
+        self.session.add_all(
+            [
+                models.SecurityPrice(
+                    security=self.security0,
+                    date=date(2017, 1, 3),
+                    price=Decimal("10"),
+                    currency=models.Currency.USD,
+                ),
+                models.SecurityPrice(
+                    security=self.security0,
+                    date=date(2017, 1, 5),
+                    price=Decimal("11"),
+                    currency=models.Currency.USD,
+                ),
+                models.SecurityPrice(
+                    security=self.security1,
+                    date=date(2017, 1, 4),
+                    price=Decimal("20"),
+                    currency=models.Currency.USD,
+                ),
+            ]
+        )
+        self.session.flush()
+
+    def makeLot(self, opendt, units, price):
+        tx = Trade(
+            uniqueid=str(opendt),
+            datetime=opendt,
+            fiaccount=self.account,
+            security=self.security0,
+            units=units,
+            cash=-units * price,
+            currency=models.Currency.USD,
+        )
+        return Lot(
+            opentransaction=tx,
+            createtransaction=tx,
+            units=units,
+            price=price,
+            currency=models.Currency.USD,
+        )
+
+    def testAsOf(self):
+        prices = models.SecurityPrice.as_of(self.session, date(2017, 1, 4))
+        self.assertEqual(len(prices), 2)
+        self.assertEqual(prices[self.security0.id].price, Decimal("10"))
+        self.assertEqual(prices[self.security1.id].price, Decimal("20"))
+
+        prices = models.SecurityPrice.as_of(self.session, date(2017, 1, 5))
+        self.assertEqual(prices[self.security0.id].price, Decimal("11"))
+
+        prices = models.SecurityPrice.as_of(self.session, date(2017, 1, 2))
+        self.assertEqual(prices, {})
+
+    def testMarkToMarket(self):
+        portfolio = Portfolio()
+        portfolio[(self.account, self.security0)] = [
+            self.makeLot(datetime(2015, 6, 1), Decimal("100"), Decimal("8")),
+            self.makeLot(datetime(2016, 12, 1), Decimal("50"), Decimal("12")),
+        ]
+        portfolio[(self.account, self.security1)] = [
+            self.makeLot(datetime(2016, 12, 15), Decimal("-10"), Decimal("25")),
+        ]
+
+        flatgains = report.mark_to_market(self.session, portfolio, date(2017, 1, 5))
+        self.assertEqual(len(flatgains), 3)
+        lot0, lot1, lot2 = flatgains
+
+        self.assertEqual(lot0.ticker, "ABC")
+        self.assertEqual(lot0.value, Decimal("1100"))
+        self.assertEqual(lot0.cost, Decimal("800"))
+        self.assertEqual(lot0.gain, Decimal("300"))
+        self.assertEqual(lot0.longterm, True)
+
+        self.assertEqual(lot1.gain, Decimal("-50"))
+        self.assertEqual(lot1.longterm, False)
+
+        self.assertEqual(lot2.ticker, "DEF")
+        self.assertEqual(lot2.value, Decimal("-200"))
+        self.assertEqual(lot2.cost, Decimal("-250"))
+        self.assertEqual(lot2.gain, Decimal("50"))
+        self.assertEqual(lot2.longterm, False)
+
+        by_pocket = report.consolidate_unrealized(flatgains, by="pocket")
+        self.assertEqual(len(by_pocket), 2)
+        self.assertEqual(by_pocket[0].units, Decimal("150"))
+        self.assertEqual(by_pocket[0].gain, Decimal("250"))
+        self.assertIsNone(by_pocket[0].opendt)
+
+        by_character = report.consolidate_unrealized(flatgains, by="character")
+        self.assertEqual(len(by_character), 2)
+        longterm, shortterm = by_character
+        self.assertEqual(longterm.longterm, True)
+        self.assertEqual(longterm.gain, Decimal("300"))
+        self.assertEqual(shortterm.longterm, False)
+        self.assertEqual(shortterm.gain, Decimal("0"))
+
+        with self.assertRaises(ValueError):
+            report.consolidate_unrealized(flatgains, by="foobar")
+
+    def testMarkToMarketUnpriced(self):
+        portfolio = Portfolio()
+        portfolio[(self.account, self.security1)] = [
+            self.makeLot(datetime(2016, 12, 15), Decimal("10"), Decimal("25")),
+        ]
+        with self.assertWarns(UserWarning):
+            flatgains = report.mark_to_market(
+                self.session, portfolio, date(2017, 1, 3)
+            )
+        self.assertEqual(flatgains, [])
+
+
+class UnflattenPortfolioTestCase(RollbackMixin, unittest.TestCase):
+    def testUnflattenPortfolio(self):
+        account = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="8675309"
+        )
+        security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        self.session.flush()
+
+        dataset = report.tablib.Dataset(headers=report.FlatLot._fields)
+        for row in [
+            ("dch.com", "8675309", "ABC", "", "2016-01-04 00:00:00", "tx0",
+             "100", "1000", "USD", "ABC123", "", "", ""),
+            #  Known ticker, new CUSIP
+            ("dch.com", "8675309", "ABC", "", "2016-01-05 00:00:00", "tx1",
+             "10", "110", "USD", "ABC999", "", "", ""),
+            #  New account & security, given by two identifiers
+            ("dch.com", "1234", "XYZ", "Xyzzy Corp", "2016-01-06 00:00:00", "tx2",
+             "5", "50", "USD", "", "US0000000XYZ", "12345", ""),
+            ("dch.com", "1234", "XYZ", "Xyzzy Corp", "2016-01-07 00:00:00", "tx3",
+             "5", "60", "USD", "", "US0000000XYZ", "", ""),
+            #  Zero units are skipped
+            ("dch.com", "1234", "XYZ", "Xyzzy Corp", "2016-01-08 00:00:00", "tx4",
+             "0", "0", "USD", "", "US0000000XYZ", "", ""),
+        ]:
+            dataset.append(row)
+
+        portfolio = report.unflatten_portfolio(self.session, dataset)
+        self.assertEqual(len(portfolio), 2)
+
+        lots = portfolio[(account, security)]
+        self.assertEqual([lot.units for lot in lots], [Decimal("100"), Decimal("10")])
+        self.assertEqual(lots[1].price, Decimal("11"))
+        self.assertEqual(lots[1].opentransaction.uniqueid, "tx1")
+        self.assertEqual(
+            {(secid.uniqueidtype, secid.uniqueid) for secid in security.ids},
+            {("CUSIP", "ABC123"), ("CUSIP", "ABC999")},
+        )
+
+        (newaccount, newsecurity), = set(portfolio) - {(account, security)}
+        self.assertEqual(newaccount.fi.brokerid, "dch.com")
+        self.assertEqual(newaccount.number, "1234")
+        self.assertEqual(newsecurity.name, "Xyzzy Corp")
+        self.assertEqual(
+            {(secid.uniqueidtype, secid.uniqueid) for secid in newsecurity.ids},
+            {("ISIN", "US0000000XYZ"), ("CONID", "12345")},
+        )
+        self.assertEqual(len(portfolio[(newaccount, newsecurity)]), 2)
+        self.assertEqual(
+            self.session.query(models.Security).filter_by(ticker="XYZ").count(), 1
+        )
+
+    def testUnflattenPortfolioNoTicker(self):
+        security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", name="Abc Corp"
+        )
+        self.session.flush()
+
+        dataset = report.tablib.Dataset(headers=report.FlatLot._fields)
+        for row in [
+            #  Matched by (NULL) ticker & name
+            ("dch.com", "8675309", "", "Abc Corp", "2016-01-04 00:00:00", "tx0",
+             "100", "1000", "USD", "ABC999", "", "", ""),
+            #  New security
+            ("dch.com", "8675309", "", "Xyzzy Corp", "2016-01-05 00:00:00", "tx1",
+             "10", "110", "USD", "XYZ123", "", "", ""),
+        ]:
+            dataset.append(row)
+
+        portfolio = report.unflatten_portfolio(self.session, dataset)
+        self.assertEqual(len(portfolio), 2)
+        self.assertEqual(
+            {(secid.uniqueidtype, secid.uniqueid) for secid in security.ids},
+            {("CUSIP", "ABC123"), ("CUSIP", "ABC999")},
+        )
+        (newsecurity,) = {sec for acct, sec in portfolio} - {security}
+        self.assertEqual(newsecurity.name, "Xyzzy Corp")
+        self.assertIsNone(newsecurity.ticker)
+
+
+class CsvPriceReaderTestCase(RollbackMixin, unittest.TestCase):
+    def testRead(self):
+        security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        self.session.add(
+            models.SecurityPrice(
+                security=security,
+                date=date(2017, 1, 3),
+                price=Decimal("10"),
+                currency=models.Currency.USD,
+            )
+        )
+        self.session.flush()
+
+        csvfile = io.StringIO(
+            "date,uniqueidtype,uniqueid,ticker,secname,price,currency\n"
+            "2017-01-03,CUSIP,ABC123,ABC,,10.5,USD\n"
+            "2017-01-04,CUSIP,ABC123,ABC,,11,USD\n"
+            "2017-01-04,CUSIP,XYZ789,XYZ,Xyzzy Corp,5,USD\n"
+        )
+        prices = CsvPriceReader(self.session, csvfile).read()
+        self.assertEqual(len(prices), 3)
+        self.session.flush()
+
+        price0, price1, price2 = prices
+        self.assertIs(price0.security, security)
+        self.assertEqual(price0.date, date(2017, 1, 3))
+        self.assertEqual(price0.price, Decimal("10.5"))
+        self.assertIs(price1.security, security)
+        self.assertEqual(price1.price, Decimal("11"))
+        self.assertEqual(price2.security.ticker, "XYZ")
+        self.assertEqual(price2.security.name, "Xyzzy Corp")
+        self.assertEqual(price2.currency, models.Currency.USD)
+
+        count = (
+            self.session.query(models.SecurityPrice)
+            .filter_by(security=security)
+            .count()
+        )
+        self.assertEqual(count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)
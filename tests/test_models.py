@@ -2,12 +2,31 @@
 """
 """
 # stdlib imports
+import functools
 import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+
+# 3rd party imports
+from sqlalchemy import event
+from sqlalchemy.orm.exc import MultipleResultsFound
 
 
 # local imports
 from capgains.config import CONFIG
-from capgains.models import Fi, FiAccount, Security, SecurityId, Transaction
+from capgains.models import (
+    Fi,
+    FiAccount,
+    Security,
+    SecurityId,
+    Transaction,
+    TransactionType,
+    Currency,
+    CurrencyRate,
+    ImportFile,
+    resolving,
+)
 from common import setUpModule, tearDownModule, RollbackMixin
 
 
@@ -45,5 +64,245 @@ class SecurityTestCase(RollbackMixin, unittest.TestCase):
         self.assertIs(secId1, secId0)
 
 
+class ResolverTestCase(RollbackMixin, unittest.TestCase):
+    def setUp(self):
+        super(ResolverTestCase, self).setUp()
+        self.security = Security.merge(
+            self.session,
+            ticker="ABC",
+            name="ABC Corp",
+            uniqueidtype="CUSIP",
+            uniqueid="ABC123",
+        )
+        self.account = FiAccount.merge(self.session, brokerid="dch.com", number="1")
+        self.session.flush()
+
+    def countQueries(self):
+        queries = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            if statement.lstrip().upper().startswith("SELECT"):
+                queries.append(statement)
+
+        engine = self.session.get_bind().engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        self.addCleanup(
+            event.remove, engine, "before_cursor_execute", before_cursor_execute
+        )
+        return queries
+
+    def testMerge(self):
+        with resolving(self.session) as resolver:
+            with resolving(self.session) as nested:
+                self.assertIs(nested, resolver)
+
+            queries = self.countQueries()
+            sec = Security.merge(
+                self.session, ticker="ABC", uniqueidtype="CUSIP", uniqueid="ABC123"
+            )
+            self.assertIs(sec, self.security)
+            #  Matched by ticker & name; alternate id is added.
+            sec = Security.merge(
+                self.session,
+                ticker="ABC",
+                name="ABC Corp",
+                uniqueidtype="ISIN",
+                uniqueid="US0000ABC123",
+            )
+            self.assertIs(sec, self.security)
+            new = Security.merge(
+                self.session, ticker="XYZ", uniqueidtype="CUSIP", uniqueid="XYZ789"
+            )
+            self.assertIsNot(new, self.security)
+            self.assertIs(
+                Security.merge(
+                    self.session, ticker="XYZ", uniqueidtype="CONID", uniqueid="789"
+                ),
+                new,
+            )
+            account = FiAccount.merge(self.session, brokerid="dch.com", number="1")
+            self.assertIs(account, self.account)
+            account = FiAccount.merge(self.session, brokerid="dch.com", number="2")
+            self.assertIs(account.fi, self.account.fi)
+            self.assertEqual(queries, [])
+
+        self.assertEqual(
+            {(secid.uniqueidtype, secid.uniqueid) for secid in self.security.ids},
+            {("CUSIP", "ABC123"), ("ISIN", "US0000ABC123")},
+        )
+        self.assertEqual(len(new.ids), 2)
+        #  Resolver is uninstalled on exit; merges go to the DB again.
+        self.assertIs(
+            Security.merge(
+                self.session, ticker="XYZ", uniqueidtype="CONID", uniqueid="789"
+            ),
+            new,
+        )
+        self.assertEqual(self.session.query(FiAccount).count(), 2)
+
+    def testMergeAmbiguousTicker(self):
+        self.session.add(Security(ticker="ABC", name="ABC Holdings"))
+        with resolving(self.session):
+            with self.assertRaises(MultipleResultsFound):
+                Security.merge(
+                    self.session, ticker="ABC", uniqueidtype="CONID", uniqueid="123"
+                )
+
+
+class MergeAllTestCase(RollbackMixin, unittest.TestCase):
+    def makeRecord(self, uniqueid, cash):
+        return {
+            "type": TransactionType.TRADE,
+            "fiaccount": self.account,
+            "uniqueid": uniqueid,
+            "datetime": datetime(2016, 1, 4),
+            "security": self.security,
+            "units": Decimal("100"),
+            "currency": "USD",
+            "cash": cash,
+        }
+
+    def testMergeAll(self):
+        self.account = FiAccount.merge(self.session, brokerid="dch.com", number="1")
+        self.security = Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        existing = Transaction.merge(self.session, **self.makeRecord("0", -1000))
+        self.session.flush()
+
+        records = [
+            self.makeRecord("1", Decimal("-1100")),
+            self.makeRecord("0", Decimal("-999")),
+            self.makeRecord("2", Decimal("-1200")),
+            self.makeRecord("1", Decimal("-1100")),
+        ]
+        transactions = Transaction.merge_all(self.session, records)
+        self.assertEqual(len(transactions), 4)
+        tx1, tx0, tx2, tx3 = transactions
+
+        #  Existing instance is returned as is
+        self.assertIs(tx0, existing)
+        self.assertEqual(tx0.cash, Decimal("-1000"))
+
+        self.assertIsInstance(tx1, Transaction)
+        self.assertEqual(tx1.uniqueid, "1")
+        self.assertIs(tx1.fiaccount, self.account)
+        self.assertIs(tx1.security, self.security)
+        self.assertEqual(tx1.currency, Currency.USD)
+        self.assertEqual(tx1.cash, Decimal("-1100"))
+        self.assertEqual(tx2.uniqueid, "2")
+        #  Duplicate signatures within the batch resolve to the same instance
+        self.assertIs(tx3, tx1)
+
+        self.assertEqual(self.session.query(Transaction).count(), 3)
+        self.assertEqual(Transaction.merge_all(self.session, records), transactions)
+        self.assertEqual(self.session.query(Transaction).count(), 3)
+
+    def testMergeAllEmpty(self):
+        self.assertEqual(Fi.merge_all(self.session, []), [])
+
+
+class MergeRatesTestCase(RollbackMixin, unittest.TestCase):
+    def testMergeRates(self):
+        CurrencyRate.merge(
+            self.session,
+            date=date(2016, 1, 4),
+            fromcurrency=Currency.EUR,
+            tocurrency=Currency.USD,
+            rate=Decimal("1.08"),
+        )
+        records = [
+            {
+                "date": date(2016, 1, 4),
+                "fromcurrency": "EUR",
+                "tocurrency": "USD",
+                "rate": Decimal("1.09"),
+            },
+            {
+                "date": date(2016, 1, 4),
+                "fromcurrency": "GBP",
+                "tocurrency": "USD",
+                "rate": Decimal("1.47"),
+            },
+            {
+                "date": date(2016, 1, 4),
+                "fromcurrency": "GBP",
+                "tocurrency": "USD",
+                "rate": Decimal("1.47"),
+            },
+            {
+                "date": date(2016, 1, 4),
+                "fromcurrency": "GBP",
+                "tocurrency": "USD",
+                "rate": Decimal("1.46"),
+            },
+        ]
+        with self.assertWarns(UserWarning) as cm:
+            self.assertEqual(CurrencyRate.merge_rates(self.session, records), 1)
+        self.assertEqual(len(cm.warnings), 2)
+
+        #  Earlier/persisted rates are kept
+        get_rate = functools.partial(
+            CurrencyRate.get_rate, self.session, tocurrency=Currency.USD
+        )
+        self.assertEqual(
+            get_rate(fromcurrency=Currency.EUR, date=date(2016, 1, 4)), Decimal("1.08")
+        )
+        self.assertEqual(
+            get_rate(fromcurrency=Currency.GBP, date=date(2016, 1, 4)), Decimal("1.47")
+        )
+        self.assertEqual(self.session.query(CurrencyRate).count(), 2)
+
+        self.assertEqual(CurrencyRate.merge_rates(self.session, records[2:3]), 0)
+        self.assertEqual(CurrencyRate.merge_rates(self.session, []), 0)
+
+
+class ImportFileTestCase(RollbackMixin, unittest.TestCase):
+    def testRecord(self):
+        account = FiAccount.merge(self.session, brokerid="dch.com", number="1")
+        transaction = Transaction(
+            type=TransactionType.RETURNCAP,
+            uniqueid="0",
+            datetime=datetime(2016, 1, 4),
+            fiaccount=account,
+            security=Security.merge(
+                self.session, uniqueidtype="CUSIP", uniqueid="ABC123"
+            ),
+            currency=Currency.USD,
+            cash=Decimal("10"),
+        )
+        self.session.add(transaction)
+        self.assertEqual(ImportFile.imported(self.session, ["abc", "def"]), {})
+
+        instance = ImportFile.record(
+            self.session,
+            sha256="abc",
+            size=1024,
+            format="ofx",
+            path="/tmp/foo.ofx",
+            transactions=[transaction],
+        )
+        self.session.flush()
+        self.assertEqual(instance.brokerid, "dch.com")
+        self.assertEqual(instance.transactions, 1)
+        self.assertEqual(
+            ImportFile.imported(self.session, ["abc", "def"]), {"abc": instance}
+        )
+
+        #  Reimporting replaces the record
+        again = ImportFile.record(
+            self.session,
+            sha256="abc",
+            size=1024,
+            format="ofx",
+            path="/tmp/bar.ofx",
+            transactions=[],
+        )
+        self.assertIs(again, instance)
+        self.assertEqual(instance.path, "/tmp/bar.ofx")
+        self.assertIsNone(instance.brokerid)
+        self.assertEqual(self.session.query(ImportFile).count(), 1)
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=3)
@@ -2,8 +2,13 @@
 """
 """
 # stdlib imports
+import io
+import operator
+import pickle
 import unittest
-from unittest.mock import patch, sentinel
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from unittest.mock import patch, sentinel, Mock
 from datetime import datetime
 from decimal import Decimal
 
@@ -11,6 +16,7 @@ from decimal import Decimal
 # 3rd party imports
 from sqlalchemy import create_engine
 import ofxtools
+from ofxtools.header import make_header
 
 
 # local imports
@@ -33,6 +39,41 @@ class OfxReaderMixin(RollbackMixin):
         self.reader = ofx.reader.OfxStatementReader(self.session)
 
 
+class ParseTestCase(RollbackMixin, unittest.TestCase):
+    def testParse(self):
+        status = ofxtools.models.STATUS(code=0, severity="INFO")
+        sonrs = ofxtools.models.SONRS(
+            status=status, dtserver="20170101000000", language="ENG"
+        )
+        acct = ofxtools.models.INVACCTFROM(acctid="12345", brokerid="foo.bar")
+        tranlist = ofxtools.models.INVTRANLIST(
+            dtstart="20170101000000", dtend="20170101000000"
+        )
+        stmtrs = ofxtools.models.INVSTMTRS(
+            dtasof="20170101000000",
+            curdef="USD",
+            invacctfrom=acct,
+            invtranlist=tranlist,
+        )
+        trnrs = ofxtools.models.INVSTMTTRNRS(
+            trnuid="1", status=status, invstmtrs=stmtrs
+        )
+        response = ofxtools.models.OFX(
+            signonmsgsrsv1=ofxtools.models.SIGNONMSGSRSV1(sonrs=sonrs),
+            invstmtmsgsrsv1=ofxtools.models.INVSTMTMSGSRSV1(trnrs),
+        )
+        source = io.BytesIO(
+            str(make_header(version=220)).encode() + ET.tostring(response.to_etree())
+        )
+
+        #  Parse output survives the trip back from a worker process.
+        parsed = pickle.loads(pickle.dumps(ofx.parse(source)))
+        self.assertEqual(ofx.read_statements(self.session, parsed), [])
+        (fiaccount,) = self.session.query(FiAccount).all()
+        self.assertEqual(fiaccount.fi.brokerid, "foo.bar")
+        self.assertEqual(fiaccount.number, "12345")
+
+
 class ReadTestCase(OfxReaderMixin, unittest.TestCase):
     def setUp(self):
         super(ReadTestCase, self).setUp()
@@ -129,6 +170,68 @@ class ReadTestCase(OfxReaderMixin, unittest.TestCase):
     ):
         pass
 
+    def testReadTransactionsResolvesPendingMerges(self):
+        """
+        OfxStatementReader.read_transactions() merges each handler's Transactions
+        once it returns; PendingMerge placeholders don't escape the handler.
+        """
+        account = self.reader.read_account(self.reader.statement, self.session)
+        secid = ofxtools.models.SECID(uniqueidtype="CUSIP", uniqueid="284CNT995")
+        buys = [
+            ofxtools.models.BUYSTOCK(
+                invbuy=ofxtools.models.INVBUY(
+                    invtran=ofxtools.models.INVTRAN(fitid=fitid, dttrade="20170203"),
+                    secid=secid,
+                    units=Decimal("100"),
+                    unitprice=Decimal("1.2"),
+                    total=Decimal("-120"),
+                    subacctsec="CASH",
+                    subacctfund="CASH",
+                ),
+                buytype="BUY",
+            )
+            for fitid in ("a", "b")
+        ]
+
+        merged = []
+
+        def doBuys(reader, transactions, session, securities, account, currency):
+            txs = [
+                ofx.reader.merge_trade(
+                    tx,
+                    session=session,
+                    securities=securities,
+                    account=account,
+                    default_currency=currency,
+                    get_trade_sort_algo=reader.get_trade_sort_algo,
+                )
+                for tx in transactions
+            ]
+            merged.extend(txs)
+            return txs
+
+        with patch.dict(
+            ofx.reader.OfxStatementReader.TRANSACTION_DISPATCHER,
+            {ofxtools.models.BUYSTOCK: doBuys},
+        ):
+            transactions = self.reader.read_transactions(
+                Mock(transactions=buys),
+                session=self.session,
+                securities=self.reader.securities,
+                account=account,
+                default_currency="USD",
+            )
+
+        self.assertTrue(all(isinstance(tx, ofx.reader.PendingMerge) for tx in merged))
+        self.assertNotIn(ofx.reader.MergeBatch.INFO_KEY, self.session.info)
+        self.assertEqual(len(transactions), 2)
+        for transaction, fitid in zip(transactions, ("a", "b")):
+            self.assertIsInstance(transaction, Transaction)
+            self.assertIsNotNone(transaction.id)
+            self.assertEqual(transaction.uniqueid, fitid)
+            self.assertIs(transaction.fiaccount, account)
+            self.assertEqual(transaction.units, Decimal("100"))
+
 
 class TradesTestCase(OfxReaderMixin, unittest.TestCase):
     def setUp(self):
@@ -349,5 +452,74 @@ class TransactionTestCase(OfxReaderMixin, unittest.TestCase):
         pass
 
 
+
+Fill = namedtuple("Fill", ["fitid", "units", "orig", "cancel"])
+
+
+class MakeCancellerTestCase(unittest.TestCase):
+    fills = [
+        Fill("1", Decimal("100"), None, False),
+        Fill("2", Decimal("100"), None, False),
+        Fill("3", Decimal("50"), None, False),
+        Fill("4", Decimal("100"), None, False),
+        Fill("5", Decimal("-100"), "2", True),
+        Fill("6", Decimal("-100"), None, True),
+        Fill("7", Decimal("-50.0"), None, True),
+    ]
+
+    @staticmethod
+    def matchfunc(cancel, original):
+        if cancel.orig:
+            return cancel.orig == original.fitid
+        return cancel.units == -original.units
+
+    @staticmethod
+    def cancelkey(cancel):
+        return ("fitid", cancel.orig) if cancel.orig else ("units", -cancel.units)
+
+    @staticmethod
+    def originalkeys(original):
+        return (("fitid", original.fitid), ("units", original.units))
+
+    def cancel(self, fills, **kwargs):
+        apply_cancels = ofx.reader.make_canceller(
+            filterfunc=operator.attrgetter("cancel"),
+            matchfunc=self.matchfunc,
+            sortfunc=operator.attrgetter("fitid"),
+            **kwargs
+        )
+        return apply_cancels(fills)
+
+    def testKeyed(self):
+        expected = self.cancel(self.fills)
+        self.assertEqual([fill.fitid for fill in expected], ["4"])
+        self.assertEqual(
+            self.cancel(
+                self.fills, cancelkey=self.cancelkey, originalkeys=self.originalkeys
+            ),
+            expected,
+        )
+
+    def testKeyedFallback(self):
+        #  Cancels without a key are matched by matchfunc.
+        self.assertEqual(
+            self.cancel(
+                self.fills,
+                cancelkey=lambda fill: ("fitid", fill.orig) if fill.orig else None,
+                originalkeys=lambda fill: (("fitid", fill.fitid),),
+            ),
+            self.cancel(self.fills),
+        )
+
+    def testKeyedUnmatched(self):
+        fills = self.fills + [Fill("8", Decimal("-100"), "2", True)]
+        with self.assertRaises(ValueError):
+            self.cancel(fills)
+        with self.assertRaises(ValueError):
+            self.cancel(
+                fills, cancelkey=self.cancelkey, originalkeys=self.originalkeys
+            )
+
+
 if __name__ == "__main__":
     unittest.main(verbosity=3)
@@ -0,0 +1,280 @@
+# coding: utf-8
+"""
+"""
+# stdlib imports
+import unittest
+from unittest.mock import patch, Mock, PropertyMock
+import contextlib
+import csv
+import functools
+import io
+import os
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+
+# 3rd party imports
+import ibflex
+
+
+# local imports
+from capgains import config, database, flex, models, script
+from capgains.cache import DiskCache
+
+
+class ScriptTestCase(unittest.TestCase):
+    """Run CLI commands against a SQLite database file in a temporary directory.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_uri = "sqlite:///" + os.path.join(self.tmpdir.name, "capgains.db")
+        for attr, value in (
+            ("db_uri", self.db_uri),
+            ("cache_dir", os.path.join(self.tmpdir.name, "cache")),
+        ):
+            patcher = patch.object(
+                config.CapgainsConfig,
+                attr,
+                new_callable=PropertyMock,
+                return_value=value,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.engine = database.make_engine(self.db_uri)
+        self.session = database.Session(bind=self.engine)
+
+    def tearDown(self):
+        self.session.close()
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def run_script(self, *argv):
+        """Run a CLI command; return what it printed.
+        """
+        argparser, subparsers = script.make_argparser()
+        args = argparser.parse_args(argv)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            args.func(args)
+        return output.getvalue()
+
+    def write(self, filename, text):
+        path = os.path.join(self.tmpdir.name, filename)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+
+class ImportTestCase(ScriptTestCase):
+    flex = (
+        '<FlexQueryResponse queryName="Test" type="AF"><FlexStatements count="1">'
+        '<FlexStatement accountId="U1" fromDate="20110801" toDate="20110831" '
+        'period="Foobar" whenGenerated="20110901">'
+        '<AccountInformation accountId="U1" currency="USD" />'
+        "</FlexStatement></FlexStatements></FlexQueryResponse>"
+    )
+
+    def testImportFlexStreamed(self):
+        path = self.write("statement.xml", self.flex)
+        #  Parsed by a worker (in-process for a single file), element by element.
+        with patch.object(
+            ibflex.parser, "parse", side_effect=AssertionError("parsed whole file")
+        ), patch.object(
+            flex.parser, "iterparse", wraps=flex.parser.iterparse
+        ) as iterparse:
+            self.run_script("import", path)
+        iterparse.assert_called_once_with(path)
+
+        (account,) = self.session.query(models.FiAccount).all()
+        self.assertEqual(account.number, "U1")
+        self.assertEqual(account.fi.brokerid, flex.BROKERID)
+        (imported,) = self.session.query(models.ImportFile).all()
+        self.assertEqual(imported.path, path)
+
+    def testReimport(self):
+        path = self.write("statement.xml", self.flex)
+        self.run_script("import", path)
+
+        #  Unchanged file, even if renamed, is skipped without reading it.
+        renamed = self.write("renamed.xml", self.flex)
+        read = Mock(wraps=flex.read_statements)
+        with patch.dict(script.IMPORTERS, {"xml": (flex.parse, read)}):
+            output = self.run_script("import", renamed)
+            read.assert_not_called()
+            self.assertIn(f"{renamed} already imported from {path}; skipping", output)
+
+            #  ...unless forced.
+            self.run_script("import", "--force", renamed)
+            read.assert_called_once()
+
+        (imported,) = self.session.query(models.ImportFile).all()
+        self.assertEqual(imported.path, renamed)
+        self.assertEqual(self.session.query(models.FiAccount).count(), 1)
+
+
+class FingerprintReportTestCase(ScriptTestCase):
+    def setUp(self):
+        super(FingerprintReportTestCase, self).setUp()
+        database.create_schema(self.engine)
+        self.account = models.FiAccount.merge(
+            self.session, brokerid="dch.com", number="1"
+        )
+        self.security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        self.transaction = self.trade("0", datetime(2016, 1, 4))
+        self.session.commit()
+
+    def trade(self, uniqueid, dt):
+        transaction = models.Transaction(
+            type=models.TransactionType.TRADE,
+            uniqueid=uniqueid,
+            datetime=dt,
+            fiaccount=self.account,
+            security=self.security,
+            units=Decimal("100"),
+            currency=models.Currency.USD,
+            cash=Decimal("-1000"),
+        )
+        self.session.add(transaction)
+        return transaction
+
+    def fingerprint(self, **settings):
+        self.session.commit()
+        return script.fingerprint_report(
+            self.session,
+            dtstart=datetime(2016, 1, 1),
+            dtend=datetime(2017, 1, 1),
+            lotloadfile=None,
+            **settings,
+        )
+
+    def testFingerprint(self):
+        key = self.fingerprint()
+        self.assertEqual(self.fingerprint(), key)
+        self.assertNotEqual(self.fingerprint(consolidate=True), key)
+
+        #  Transactions out of range don't matter.
+        self.trade("1", datetime(2017, 1, 1))
+        self.assertEqual(self.fingerprint(), key)
+
+        #  Inserting, updating & deleting Transactions in range does.
+        transaction = self.trade("2", datetime(2016, 6, 1))
+        key = self.assertChanged(key)
+        transaction.units = Decimal("200")
+        key = self.assertChanged(key)
+        self.session.delete(self.transaction)
+        key = self.assertChanged(key)
+
+        #  So does changing reference data.
+        self.security.ticker = "DEF"
+        self.assertChanged(key)
+
+    def assertChanged(self, key):
+        newkey = self.fingerprint()
+        self.assertNotEqual(newkey, key)
+        return newkey
+
+
+class DumpCsvPeriodsTestCase(ScriptTestCase):
+    def setUp(self):
+        super(DumpCsvPeriodsTestCase, self).setUp()
+        database.create_schema(self.engine)
+        account = models.FiAccount.merge(self.session, brokerid="dch.com", number="1")
+        security = models.Security.merge(
+            self.session, uniqueidtype="CUSIP", uniqueid="ABC123", ticker="ABC"
+        )
+        #  Transactions falling on period boundaries.
+        for uniqueid, dt, units, cash in (
+            ("0", datetime(2016, 1, 1), "100", "-1000"),
+            ("1", datetime(2016, 2, 1), "-50", "750"),
+            ("2", datetime(2016, 4, 1), "-10", "120"),
+            ("3", datetime(2016, 6, 1), "-40", "400"),
+        ):
+            self.session.add(
+                models.Transaction(
+                    type=models.TransactionType.TRADE,
+                    uniqueid=uniqueid,
+                    datetime=dt,
+                    fiaccount=account,
+                    security=security,
+                    units=Decimal(units),
+                    currency=models.Currency.USD,
+                    cash=Decimal(cash),
+                )
+            )
+        self.session.commit()
+        self.directory = os.path.join(self.tmpdir.name, "reports")
+        os.mkdir(self.directory)
+
+    def read(self, filename):
+        with open(os.path.join(self.directory, filename)) as csvfile:
+            return list(csv.DictReader(csvfile))
+
+    def testDumpCsvPeriods(self):
+        boundaries = [datetime(2016, month, 1) for month in range(1, 7)]
+        #  Order doesn't matter.
+        script.dump_csv_periods(self.engine, boundaries[::-1], self.directory)
+
+        #  A file of each kind for each period, whether or not it's empty...
+        periods = list(zip(boundaries[:-1], boundaries[1:]))
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            sorted(
+                ["gains_{:%Y-%m-%d}_{:%Y-%m-%d}.csv".format(*p) for p in periods]
+                + ["lots_{:%Y-%m-%d}.csv".format(end) for start, end in periods]
+            ),
+        )
+
+        #  ...and Transactions on a boundary land in the period it starts (only).
+        #  The Transaction on the last boundary is outside every period.
+        def units(filename):
+            return [Decimal(row["units"]) for row in self.read(filename)]
+
+        gains = {
+            start.month: units("gains_{:%Y-%m-%d}_{:%Y-%m-%d}.csv".format(start, end))
+            for start, end in periods
+        }
+        self.assertEqual(gains, {1: [], 2: [50], 3: [], 4: [10], 5: []})
+
+        lots = {
+            end.month: units("lots_{:%Y-%m-%d}.csv".format(end))
+            for start, end in periods
+        }
+        self.assertEqual(lots, {2: [100], 3: [50], 4: [50], 5: [40], 6: [40]})
+
+    def testDumpCsvCached(self):
+        cache = DiskCache(os.path.join(self.tmpdir.name, "reports"), maxsize=2 ** 20)
+        path = os.path.join(self.directory, "lots.csv")
+        dump = functools.partial(
+            script.dump_csv,
+            self.engine,
+            dtstart=None,
+            dtend=datetime(2016, 3, 1),
+            lotdumpfile=path,
+            cache=cache,
+        )
+        dump()
+        expected = self.read("lots.csv")
+        os.remove(path)
+
+        #  A hit reads the database once, for the fingerprint, and books nothing.
+        with patch.object(
+            script, "snapshot", wraps=script.snapshot
+        ) as snapshot, patch.object(
+            script, "load_books", side_effect=AssertionError("booked")
+        ):
+            dump()
+        snapshot.assert_called_once_with(self.engine)
+        self.assertEqual(self.read("lots.csv"), expected)
+
+    def testTooFewBoundaries(self):
+        with self.assertRaises(ValueError):
+            script.dump_csv_periods(self.engine, [datetime(2016, 1, 1)], self.directory)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=3)